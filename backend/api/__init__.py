@@ -1,16 +1,22 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from .ocr_routes import ocr
 from .crud_routes_v3 import crud
-from .report_routes_v1 import reports
+from .metrics_routes import monitoring
 from .extensions import db
+from . import json_provider, db_profile
+from .batch_index import batch_index
+from .instrumentation import instrumentation
 import os
 from dotenv import load_dotenv
 
 
 load_dotenv()
 
+# Optional parts of the API, enabled by the FEATURES setting. Their modules
+# are imported only when enabled; the CRUD and metrics routes are always on.
+FEATURES = ('ocr', 'reports', 'exports')
+
 
 def create_app():
     app = Flask(__name__)
@@ -18,20 +24,97 @@ def create_app():
     # App configuration
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite:///db.sqlite')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DB_BUSY_TIMEOUT'] = float(os.getenv('DB_BUSY_TIMEOUT', 10))  # seconds a SQLite writer waits for the lock before "database is locked"
+    app.config['DB_SQLITE_JOURNAL_MODE'] = os.getenv('DB_SQLITE_JOURNAL_MODE', 'WAL')  # WAL lets reads run alongside a write
+    app.config['DB_SQLITE_SYNCHRONOUS'] = os.getenv('DB_SQLITE_SYNCHRONOUS', 'NORMAL')  # fsync at WAL checkpoints rather than every commit
+    app.config['DB_SQLITE_MMAP_SIZE'] = int(os.getenv('DB_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes of the file read through mmap, 0 disables
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 5))  # PostgreSQL connections kept open per worker
+    app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 10))  # extra connections opened under load, closed when returned
+    app.config['DB_POOL_TIMEOUT'] = float(os.getenv('DB_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds before a connection is replaced, -1 keeps them
+    app.config['DB_POOL_PRE_PING'] = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'  # test connections on checkout
+    app.config['DB_STATEMENT_TIMEOUT'] = float(os.getenv('DB_STATEMENT_TIMEOUT', 30))  # seconds a PostgreSQL statement may run, 0 disables
+    app.config['FEATURES'] = [name.strip() for name in os.getenv(
+        'FEATURES', ','.join(FEATURES)).split(',') if name.strip()]  # optional blueprints to register, e.g. "reports" for a reporting-only worker
+    app.config['BULK_CHUNK_SIZE'] = int(os.getenv('BULK_CHUNK_SIZE', 1000))
+    app.config['OCR_WORKERS'] = int(os.getenv('OCR_WORKERS', 2))  # OCR threads per gunicorn worker
+    app.config['OCR_QUEUE_MAX'] = int(os.getenv('OCR_QUEUE_MAX', 32))  # queued jobs before /upload returns 503
+    app.config['OCR_JOB_TTL'] = int(os.getenv('OCR_JOB_TTL', 3600))  # seconds finished jobs are kept
+    app.config['OCR_ENGINE'] = os.getenv('OCR_ENGINE', 'google')  # 'google' (Cloud Vision) or 'tesseract' (local)
+    app.config['OCR_TESSERACT_CONFIG'] = os.getenv('OCR_TESSERACT_CONFIG', '--psm 11')
+    app.config['OCR_MAX_DIMENSION'] = int(os.getenv('OCR_MAX_DIMENSION', 2048))  # longest image side sent to OCR, 0 keeps full size
+    app.config['OCR_CROP_ROI'] = os.getenv('OCR_CROP_ROI', 'false').lower() == 'true'  # crop to the detected text region
+    app.config['OCR_EQUALIZE'] = os.getenv('OCR_EQUALIZE', 'true').lower() == 'true'  # histogram equalization before OCR
+    # Each retry variant is another OCR call: free on tesseract, a billed request on Cloud Vision
+    local_ocr = app.config['OCR_ENGINE'] == 'tesseract'
+    app.config['OCR_RETRY_VARIANTS'] = [name.strip() for name in os.getenv(
+        'OCR_RETRY_VARIANTS', 'clahe,adaptive_threshold,deskew,invert' if local_ocr else ''
+    ).split(',') if name.strip()]  # fallbacks when no serial is read, empty (the google default) disables
+    app.config['OCR_RETRY_CONFIDENCE'] = float(os.getenv(
+        'OCR_RETRY_CONFIDENCE', 0.6 if local_ocr else 0))  # mean block confidence below which fallbacks run, 0 only retries when no serial is read
+    app.config['OCR_SERIAL_PATTERNS'] = os.getenv('OCR_SERIAL_PATTERNS')  # optional JSON file of serial patterns per part number
+    app.config['REPORT_CACHE_DIR'] = os.getenv('REPORT_CACHE_DIR')  # finished report PDFs, defaults to instance/report_cache
+    app.config['REPORT_WORKERS'] = int(os.getenv('REPORT_WORKERS', max(1, (os.cpu_count() or 1) // int(os.getenv(
+        'WEB_CONCURRENCY', 1)))))  # processes rendering report pages per gunicorn worker, 1 renders inline
+    app.config['REPORT_PARALLEL_MIN_LABELS'] = int(os.getenv('REPORT_PARALLEL_MIN_LABELS', 2000))  # smaller reports render in one process
+    app.config['REPORT_ASYNC_MIN_LABELS'] = int(os.getenv('REPORT_ASYNC_MIN_LABELS', 10000))  # larger reports are built in the background
+    app.config['REPORT_LABEL_LAYOUTS'] = os.getenv('REPORT_LABEL_LAYOUTS')  # JSON file of extra label layouts
+    app.config['REPORT_DEFAULT_LAYOUT'] = os.getenv('REPORT_DEFAULT_LAYOUT', 'letter-3x8')  # layout used when a report names none
+    app.config['METRICS_PATH'] = os.getenv('METRICS_PATH')  # SQLite file aggregating metrics across workers, defaults to instance/metrics.sqlite
+    app.config['METRICS_FLUSH_INTERVAL'] = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))  # seconds between a worker's metric flushes
+    app.config['SLOW_REQUEST_SECONDS'] = float(os.getenv('SLOW_REQUEST_SECONDS', 1.0))  # slower requests are logged with their stage breakdown
+    app.config['OCR_BATCH_INDEX_TTL'] = int(os.getenv('OCR_BATCH_INDEX_TTL', 30))  # seconds a batch's serial index is reused
+    app.config['OCR_SPOOL_THRESHOLD'] = int(os.getenv('OCR_SPOOL_THRESHOLD', 1024 * 1024))  # larger uploads wait on disk (mmap)
+    app.config['OCR_CACHE_SIZE'] = int(os.getenv('OCR_CACHE_SIZE', 1024))  # in-memory OCR results per worker, 0 disables
+    app.config['OCR_CACHE_TTL'] = int(os.getenv('OCR_CACHE_TTL', 86400))  # seconds a cached OCR result stays valid
+    app.config['OCR_CACHE_PATH'] = os.getenv('OCR_CACHE_PATH')  # optional SQLite file shared by all workers
+
+    features = app.config['FEATURES']
+    unknown = [name for name in features if name not in FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown FEATURES {', '.join(unknown)}. Expected any of: {', '.join(FEATURES)}")
 
     # Initialize extensions with the app
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_profile.engine_options(app.config)  # Pool and timeouts for the configured database
     db.init_app(app)  # Bind SQLAlchemy to this Flask app
+    db_profile.init_app(app)  # Set the SQLite pragmas on every new connection
+    batch_index.init_app(app)  # Expire per-batch serial indexes
+    json_provider.init_app(app)  # Encode JSON responses with orjson when installed
+    instrumentation.init_app(app)  # Time requests, SQL statements and pipeline stages
+    if 'ocr' in features:
+        from .ocr_jobs import ocr_queue
+        from . import ocr_engines, ocr_variants, serial_extraction
+        from .ocr_cache import ocr_cache
+        ocr_queue.init_app(app)  # Size the background OCR worker pool
+        ocr_engines.init_app(app)  # Select the OCR backend
+        ocr_cache.init_app(app)  # Configure the OCR result cache tiers
+        ocr_variants.init_app(app)  # Check the fallback preprocessing variants
+        serial_extraction.init_app(app)  # Load per-part serial number patterns
+    if 'reports' in features:
+        from .report_cache import report_cache
+        from .label_layouts import label_layouts
+        report_cache.init_app(app)  # Prepare the report cache directory
+        label_layouts.init_app(app)  # Load extra label layouts
 
     # Create database tables within the application context
     with app.app_context():
-        from .models import SerialNumberRecord, BatchInfo, BatchReferences  # Import models
-        db.create_all()  # Create the database tables
+        from .models import SerialNumberRecord, BatchInfo, BatchReferences, OcrJob  # Import models
+        from .migrations import run_migrations
+        run_migrations()  # Create the database tables and bring existing ones up to date (indexes, new columns)
 
     CORS(app)  # Enable Cross-Origin Resource Sharing
 
     # Register blueprints
-    app.register_blueprint(ocr)
     app.register_blueprint(crud)
-    app.register_blueprint(reports)
+    app.register_blueprint(monitoring)
+    if 'ocr' in features:
+        from .ocr_routes import ocr
+        app.register_blueprint(ocr)
+    if 'reports' in features:
+        from .report_routes_v1 import reports
+        app.register_blueprint(reports)
+    if 'exports' in features:
+        from .export_routes import exports
+        app.register_blueprint(exports)
 
     return app
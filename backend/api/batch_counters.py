@@ -0,0 +1,150 @@
+# batch_counters.py
+"""
+Progress counters kept on BatchInfo, so the progress of a batch is one row
+read instead of a query over all of its serial numbers.
+
+Each counter counts the batch's non-deleted SerialNumberRecords, or those
+with one flag set. The CRUD routes add the changes they make to the
+counters with relative UPDATEs in the same transaction as the records, so
+concurrent writers cannot lose each other's changes and a rolled back write
+leaves the counters untouched. Records are matched to batches by
+batch_info_id, as /batch does.
+
+Every write that goes through apply() or recount() also bumps the batch's
+records_version, which versions its cached label reports.
+
+recount() rebuilds the counters from the records: the migration that adds
+them uses it, and so must anything that writes records around the API.
+"""
+from collections import Counter, defaultdict
+from sqlalchemy import bindparam, case, func, select, update
+from .extensions import db
+from .models import BatchInfo, SerialNumberRecord
+
+# BatchInfo counter -> the SerialNumberRecord flag it counts; None counts every record
+COUNTERS = {
+    'scanned_count': None,
+    'verified_count': 'is_verified',
+    'recorded_count': 'recorded_sn',
+    'voided_count': 'voided',
+    'testing_selected_count': 'testing_selected',
+    'testing_passed_count': 'testing_passed',
+}
+
+# Record fields that decide which counters a record adds to
+FIELDS = ('batch_info_id', 'is_deleted') + tuple(flag for flag in COUNTERS.values() if flag)
+
+
+def contribution(values):
+    """
+    Returns the counters one record adds to its batch, from a mapping of
+    its FIELDS. Missing flags count as unset.
+    """
+    if values.get('is_deleted'):
+        return Counter()
+    return Counter({counter: 1 for counter, flag in COUNTERS.items() if flag is None or values.get(flag)})
+
+
+def record_values(record):
+    """
+    The FIELDS of a SerialNumberRecord, e.g. before it is changed.
+    """
+    return {field: getattr(record, field) for field in FIELDS}
+
+
+def inserted(rows):
+    """
+    Returns the counter changes, by batch_info_id, for inserting rows
+    (mappings of column values).
+    """
+    deltas = defaultdict(Counter)
+    for row in rows:
+        deltas[row.get('batch_info_id')].update(contribution(row))
+    return deltas
+
+
+def changed(before, after):
+    """
+    Returns the counter changes for one record whose FIELDS went from
+    before to after, which may move it to another batch.
+    """
+    deltas = defaultdict(Counter)
+    deltas[after['batch_info_id']].update(contribution(after))
+    deltas[before['batch_info_id']].subtract(contribution(before))
+    return deltas
+
+
+def bulk_updated(conditions, values):
+    """
+    Returns the counter changes for UPDATE ... SET values WHERE conditions,
+    from the records it will change. Must run before that UPDATE, in the
+    same transaction; on databases that support it the records stay locked
+    until the transaction ends.
+    """
+    flags = [flag for flag in COUNTERS.values() if flag in values]
+    if not flags:
+        return {}
+    names = ('batch_info_id', 'is_deleted', *flags)
+    # Records with the same batch and flags change the counters alike
+    groups = Counter(tuple(row) for row in db.session.execute(
+        db.select(*[getattr(SerialNumberRecord, name) for name in names]).where(*conditions).with_for_update()
+    ))
+    deltas = defaultdict(Counter)
+    for row, count in groups.items():
+        before = dict(zip(names, row))
+        batch_deltas = deltas[before['batch_info_id']]
+        for counter, delta in changed(before, {**before, **values})[before['batch_info_id']].items():
+            batch_deltas[counter] += delta * count
+    return deltas
+
+
+def apply(deltas):
+    """
+    Adds deltas ({batch_info_id: Counter}) to the batches' counters in the
+    current transaction and bumps the records_version of every batch in
+    deltas, including those whose counters do not change. Records without a
+    batch are skipped.
+    """
+    for batch_info_id, counts in deltas.items():
+        if batch_info_id is None:
+            continue
+        values = {counter: getattr(BatchInfo, counter) + delta for counter, delta in counts.items() if delta}
+        values['records_version'] = BatchInfo.records_version + 1
+        db.session.execute(update(BatchInfo).where(BatchInfo.id == batch_info_id).values(**values))
+
+
+def recount(connection, batch_ids=None):
+    """
+    Rebuilds the counters of batch_ids (every batch for None) from their
+    records with one grouped query. connection may be a Connection or a
+    Session.
+    """
+    records = SerialNumberRecord.__table__.c
+    batches = BatchInfo.__table__
+    totals = select(
+        records.batch_info_id,
+        *[(func.count() if flag is None else func.sum(case((records[flag] == True, 1), else_=0))).label(counter)
+          for counter, flag in COUNTERS.items()]
+    ).where(records.is_deleted == False, records.batch_info_id.isnot(None)).group_by(records.batch_info_id)
+    reset = update(batches).values({**{counter: 0 for counter in COUNTERS},
+                                    'records_version': batches.c.records_version + 1})
+    if batch_ids is not None:
+        totals = totals.where(records.batch_info_id.in_(batch_ids))
+        reset = reset.where(batches.c.id.in_(batch_ids))
+
+    rows = connection.execute(totals).mappings().all()
+    connection.execute(reset)
+    if rows:
+        connection.execute(
+            update(batches).where(batches.c.id == bindparam('batch'))
+            .values({counter: bindparam(f'new_{counter}') for counter in COUNTERS}),
+            [{'batch': row['batch_info_id'], **{f'new_{counter}': row[counter] for counter in COUNTERS}}
+             for row in rows]
+        )
+
+
+def summary(batch):
+    """
+    The counters of a BatchInfo, keyed without the _count suffix.
+    """
+    return {counter[:-len('_count')]: getattr(batch, counter) or 0 for counter in COUNTERS}
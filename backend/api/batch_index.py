@@ -0,0 +1,161 @@
+# batch_index.py
+"""
+In-memory index of the serial numbers already recorded in each batch, used
+to check OCR results against the batch without a query per scan.
+
+An entry is built with one query the first time a batch is checked and
+dropped when the CRUD routes write serial numbers to that batch. Other
+gunicorn workers do not see those writes, so entries also expire after
+OCR_BATCH_INDEX_TTL seconds.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from .extensions import db
+from .models import BatchInfo, SerialNumberRecord
+
+# Splits a serial into its prefix and numeric suffix, e.g. CV1025 + 00042
+SERIAL_PARTS = re.compile(r'^(.*?)(\d+)$')
+
+
+def split_serial(serial):
+    """
+    Returns (prefix, number, digits) for a serial ending in digits, else None.
+    """
+    match = SERIAL_PARTS.match(serial or '')
+    if not match:
+        return None
+    return match.group(1), int(match.group(2)), len(match.group(2))
+
+
+class BatchSerials:
+    """
+    The serials recorded in one batch. Numbered serials sharing the batch's
+    most common prefix and width are kept as a sorted array of numbers.
+    """
+
+    def __init__(self, batch, serials):
+        self.batch_id = batch.id
+        self.batch_number = batch.batch_number
+        self.part_number = batch.part_number
+        self.number_of_items = batch.number_of_items
+        self.last_scanned_item = batch.last_scanned_item
+        self.serials = set(serials)
+
+        parts = [split_serial(serial) for serial in self.serials]
+        shapes = Counter((part[0], part[2]) for part in parts if part)
+        self.prefix, self.digits = shapes.most_common(1)[0][0] if shapes else (None, None)
+        self.numbers = sorted(part[1] for part in parts if part and (part[0], part[2]) == (self.prefix, self.digits))
+
+    def format(self, number):
+        return f"{self.prefix}{number:0{self.digits}d}"
+
+    def expected_range(self):
+        """
+        The (first, last) numbers the batch can still span: a run of
+        number_of_items consecutive serials that includes every serial seen
+        so far. None until a numbered serial has been recorded.
+        """
+        if not self.numbers:
+            return None
+        size = max(self.number_of_items or 0, len(self.numbers))
+        return max(0, self.numbers[-1] - size + 1), self.numbers[0] + size - 1
+
+    def next_expected(self):
+        """
+        The serial after the last scanned item that is not recorded yet.
+        """
+        if not self.numbers:
+            return None
+        last = split_serial(self.last_scanned_item)
+        number = last[1] + 1 if last and (last[0], last[2]) == (self.prefix, self.digits) else self.numbers[-1] + 1
+        index = bisect_left(self.numbers, number)
+        while index < len(self.numbers) and self.numbers[index] == number:
+            number += 1
+            index += 1
+        return self.format(number)
+
+    def check(self, serial):
+        """
+        Returns the hints shown to the operator for an OCR result.
+        """
+        expected = self.expected_range()
+        in_range = None
+        if serial and expected:
+            part = split_serial(serial)
+            in_range = bool(part) and (part[0], part[2]) == (self.prefix, self.digits) \
+                and expected[0] <= part[1] <= expected[1]
+        return {
+            "batch_number": self.batch_number,
+            "serial": serial,
+            "duplicate": serial in self.serials if serial else False,
+            "in_range": in_range,
+            "expected_range": {"first": self.format(expected[0]), "last": self.format(expected[1])} if expected else None,
+            "next_expected": self.next_expected(),
+            "recorded_count": len(self.serials),
+            "batch_quantity": self.number_of_items,
+        }
+
+
+class BatchSerialIndex:
+    def __init__(self):
+        self.ttl = 30
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generation = 0
+        self.counters = {"hits": 0, "builds": 0, "invalidations": 0}
+
+    def init_app(self, app):
+        self.ttl = app.config['OCR_BATCH_INDEX_TTL']
+
+    def get(self, batch_number):
+        """
+        Returns the BatchSerials for batch_number, or None if there is no
+        such batch. Needs an app context to build a missing entry.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(batch_number)
+            if entry is not None and entry[1] > now:
+                self.counters["hits"] += 1
+                return entry[0]
+            generation = self._generation
+
+        batch = BatchInfo.query.filter_by(batch_number=batch_number).first()
+        if batch is None:
+            return None
+        serials = db.session.execute(
+            db.select(SerialNumberRecord.verified_sn).where(
+                SerialNumberRecord.batch_info_id == batch.id,
+                SerialNumberRecord.is_deleted == False,
+                SerialNumberRecord.verified_sn.isnot(None)
+            )
+        ).scalars().all()
+        entry = BatchSerials(batch, serials)
+        with self._lock:
+            # Skip caching if a write was recorded while the entry was being built
+            if generation == self._generation:
+                self._entries[batch_number] = (entry, now + self.ttl)
+            self.counters["builds"] += 1
+        return entry
+
+    def invalidate(self, batch_info_id):
+        """
+        Drops the entry for the batch with id batch_info_id, if any.
+        """
+        if batch_info_id is None:
+            return
+        with self._lock:
+            self._generation += 1
+            for batch_number, (entry, _) in list(self._entries.items()):
+                if entry.batch_id == batch_info_id:
+                    del self._entries[batch_number]
+                    self.counters["invalidations"] += 1
+
+    def metrics(self):
+        return {**self.counters, "entries": len(self._entries), "ttl": self.ttl}
+
+
+batch_index = BatchSerialIndex()
@@ -1,10 +1,16 @@
-from flask import jsonify, request, Blueprint
-from datetime import datetime
+from flask import jsonify, request, Blueprint, current_app
+from datetime import datetime, timedelta
+from collections import Counter
+from functools import lru_cache
+import base64
+import json
 from .models import SerialNumberRecord,  BatchInfo, BatchReferences
 from .extensions import db
-from marshmallow import Schema, fields, validate, ValidationError
+from .batch_index import batch_index
+from . import batch_counters
+from marshmallow import Schema, fields, missing, validate, ValidationError
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, func, insert, literal, update
 
 # Define a blueprint
 crud = Blueprint('crud', __name__)
@@ -75,6 +81,151 @@ class SerialNumberRecordSchema(Schema):
 serial_number_schema = SerialNumberRecordSchema()
 serial_numbers_schema = SerialNumberRecordSchema(many=True)
 
+
+# Field types whose values already come out of the database as the schema dumps them
+_NATIVE_TYPES = {fields.Str: db.String, fields.Int: db.Integer, fields.Bool: db.Boolean}
+
+
+def _dump_converter(field, column):
+    """
+    Returns the function that turns a column value into the value the schema
+    field dumps, or None if the value is dumped as it is.
+    """
+    if isinstance(field, fields.DateTime) and field.format in (None, 'iso'):
+        return datetime.isoformat
+    native = _NATIVE_TYPES.get(type(field))
+    if native is not None and isinstance(column.type, native):
+        return None
+    return lambda value: field._serialize(value, None, None)
+
+
+class SerialNumberRowSerializer:
+    """
+    Dumps Core rows of the given SerialNumberRecord columns to the same
+    dicts as SerialNumberRecordSchema, without marshmallow's per-field
+    overhead. Select the rows with columns; extra trailing columns in a row
+    are ignored.
+    """
+
+    def __init__(self, names):
+        schema_fields = SerialNumberRecordSchema._declared_fields
+        table_columns = SerialNumberRecord.__table__.c
+        self.names = tuple(names)
+        self.columns = [table_columns[name] for name in self.names]
+        # (position, converter) for the values that need converting
+        self.converters = [
+            (position, converter) for position, converter in enumerate(
+                _dump_converter(schema_fields[name], table_columns[name]) for name in self.names
+            ) if converter is not None
+        ]
+
+    def dump(self, rows):
+        names = self.names
+        if not self.converters:
+            return [dict(zip(names, row)) for row in rows]
+        result = []
+        for row in rows:
+            values = list(row)
+            for position, converter in self.converters:
+                if values[position] is not None:
+                    values[position] = converter(values[position])
+            result.append(dict(zip(names, values)))
+        return result
+
+
+# Fields SerialNumberRecordSchema dumps for a record, in schema order
+SERIAL_NUMBER_FIELDS = tuple(name for name in SerialNumberRecordSchema._declared_fields
+                             if name in SerialNumberRecord.__table__.c)
+
+
+@lru_cache(maxsize=128)
+def _row_serializer(names):
+    unknown = [name for name in names if name not in SERIAL_NUMBER_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return SerialNumberRowSerializer(names)
+
+
+def serial_number_rows(requested=None):
+    """
+    Returns the row serializer for the comma-separated field names of a
+    fields= query parameter, or for every schema field if it is empty.
+    Serializers are built once per field list.
+
+    Raises ValueError for unknown field names.
+    """
+    names = tuple(name.strip() for name in requested.split(',') if name.strip()) if requested else ()
+    return _row_serializer(names or SERIAL_NUMBER_FIELDS)
+
+# Python types a field of each type loads unchanged
+_LOADED_TYPES = {fields.Str: str, fields.Int: int, fields.Bool: bool}
+
+
+class SerialNumberRowLoader:
+    """
+    Loads a list of serial number dicts to the same rows and error messages
+    as SerialNumberRecordSchema(many=True) in one pass, without
+    marshmallow's per-row overhead. Values already of the type a field
+    loads are taken as they are; the rest go through the field. A
+    verified_sn repeated within the list is an error.
+    """
+
+    def __init__(self, schema):
+        self.fields = schema.load_fields
+        self.native = {
+            name: _LOADED_TYPES.get(type(field)) for name, field in self.fields.items()
+            if not field.validators
+        }
+        self.required = [(name, field.error_messages['required'])
+                         for name, field in self.fields.items() if field.required]
+        self.defaults = [(name, field.load_default)
+                         for name, field in self.fields.items() if field.load_default is not missing]
+
+    def load(self, items):
+        """
+        Returns (rows, errors): the valid rows, and the error messages of
+        the others keyed by their index.
+        """
+        rows = []
+        errors = {}
+        first_index = {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors[index] = {"_schema": ["Invalid input type."]}
+                continue
+            row = {}
+            row_errors = {}
+            for key, value in item.items():
+                if type(value) is self.native.get(key):
+                    row[key] = value
+                    continue
+                field = self.fields.get(key)
+                if field is None:
+                    row_errors[key] = ["Unknown field."]
+                    continue
+                try:
+                    row[key] = field.deserialize(value, key, item)
+                except ValidationError as err:
+                    row_errors[key] = err.messages
+            for name, message in self.required:
+                if name not in item:
+                    row_errors[name] = [message]
+            if 'verified_sn' in row and not row_errors:
+                first = first_index.setdefault(row['verified_sn'], index)
+                if first != index:
+                    row_errors['verified_sn'] = [f"Duplicate of item {first}."]
+            if row_errors:
+                errors[index] = row_errors
+                continue
+            for name, default in self.defaults:
+                if name not in row:
+                    row[name] = default() if callable(default) else default
+            rows.append(row)
+        return rows, errors
+
+
+serial_number_row_loader = SerialNumberRowLoader(serial_number_schema)
+
 # Marshmallow schema for BatchInfo
 class BatchInfoSchema(Schema):
     id = fields.Int(dump_only=True)
@@ -88,6 +239,14 @@ class BatchInfoSchema(Schema):
     last_scanned_item = fields.Str()
     current_item_number = fields.Int()
 
+    # Progress counters, maintained by the server
+    scanned_count = fields.Int(dump_only=True)
+    verified_count = fields.Int(dump_only=True)
+    recorded_count = fields.Int(dump_only=True)
+    voided_count = fields.Int(dump_only=True)
+    testing_selected_count = fields.Int(dump_only=True)
+    testing_passed_count = fields.Int(dump_only=True)
+
     # Related serial numbers
     serial_number_records = fields.Nested(SerialNumberRecordSchema, many=True)
 
@@ -101,6 +260,20 @@ class BatchReferencesSchema(Schema):
 batch_info_schema = BatchInfoSchema()
 batch_references_schema = BatchReferencesSchema()
 
+# Upper bound on how many serials a single generate request may create
+MAX_GENERATED_SERIALS = 100000
+
+# Marshmallow schema for server-side serial range generation
+class GenerateSerialsSchema(Schema):
+    prefix = fields.Str(missing="")
+    start = fields.Int(required=True, validate=validate.Range(min=0))
+    digits = fields.Int(missing=5, validate=validate.Range(min=1, max=20))
+    count = fields.Int(required=True, validate=validate.Range(min=1, max=MAX_GENERATED_SERIALS))
+    uploaded_by = fields.Str()
+    on_conflict = fields.Str(validate=validate.OneOf(["skip", "abort"]), missing="skip")
+
+generate_serials_schema = GenerateSerialsSchema()
+
 # Create a new serial number record
 @crud.route('/serial_number', methods=['POST'])
 def create_serial_number():
@@ -117,7 +290,9 @@ def create_serial_number():
     try:
         new_record = SerialNumberRecord(**data)
         db.session.add(new_record)
+        batch_counters.apply(batch_counters.inserted([data]))
         db.session.commit()
+        batch_index.invalidate(new_record.batch_info_id)
         result = serial_number_schema.dump(new_record)
         return jsonify({"message": "Serial number record created", "data": result}), 201
 
@@ -129,6 +304,93 @@ def create_serial_number():
         db.session.rollback()
         return jsonify({"error": "An error occurred", "details": str(e)}), 500
     
+def _fill_defaults(rows):
+    """
+    Gives every row the same set of keys so the rows can be sent as one
+    executemany. Missing columns fall back to the model's scalar default.
+    """
+    table = SerialNumberRecord.__table__
+    fill = {}
+    for key in set().union(*rows):
+        default = table.c[key].default
+        fill[key] = default.arg if default is not None and default.is_scalar else None
+    return [{**fill, **row} for row in rows]
+
+def _advance_batch(batch_info_id, count, last_scanned_item):
+    """
+    Moves current_item_number / last_scanned_item forward with a single
+    UPDATE so concurrent writers cannot lose increments.
+    """
+    db.session.execute(
+        update(BatchInfo)
+        .where(BatchInfo.id == batch_info_id)
+        .values(
+            current_item_number=func.coalesce(BatchInfo.current_item_number, 0) + count,
+            last_scanned_item=last_scanned_item
+        )
+    )
+
+def _advance_batches(rows):
+    """
+    Advances every batch touched by the inserted rows.
+    """
+    counts = Counter()
+    last_scanned = {}
+    for row in rows:
+        batch_info_id = row.get('batch_info_id')
+        if batch_info_id is None:
+            continue
+        counts[batch_info_id] += 1
+        last_scanned[batch_info_id] = row['verified_sn']
+
+    for batch_info_id, count in counts.items():
+        _advance_batch(batch_info_id, count, last_scanned[batch_info_id])
+
+# Create many serial number records in a single transaction
+@crud.route('/serial_numbers/bulk', methods=['POST'])
+def create_serial_numbers_bulk():
+    json_data = request.get_json()
+    if not json_data:
+        return jsonify({"error": "No input data provided"}), 400
+    if not isinstance(json_data, list):
+        return jsonify({"error": "Expected a list of serial number records"}), 400
+
+    chunk_size = request.args.get('chunk_size', current_app.config['BULK_CHUNK_SIZE'], type=int)
+    if chunk_size < 1:
+        return jsonify({"error": "chunk_size must be a positive integer"}), 400
+
+    # Validate the whole array at once; invalid items are reported by index
+    rows, errors = serial_number_row_loader.load(json_data)
+
+    if not rows:
+        return jsonify({"error": "No valid records provided", "errors": errors}), 400
+
+    try:
+        rows = _fill_defaults(rows)
+        table = SerialNumberRecord.__table__
+        for start in range(0, len(rows), chunk_size):
+            db.session.execute(insert(table), rows[start:start + chunk_size])
+        _advance_batches(rows)
+        batch_counters.apply(batch_counters.inserted(rows))
+        db.session.commit()
+        for batch_info_id in {row.get('batch_info_id') for row in rows}:
+            batch_index.invalidate(batch_info_id)
+
+        return jsonify({
+            "message": "Serial number records created",
+            "created": len(rows),
+            "failed": len(errors),
+            "errors": errors
+        }), 207 if errors else 201
+
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({"error": "Database integrity error", "details": str(e)}), 400
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "An error occurred", "details": str(e)}), 500
+
 # Update an existing serial number record
 @crud.route('/serial_number/<int:id>', methods=['PUT'])
 def update_serial_number(id):
@@ -136,7 +398,8 @@ def update_serial_number(id):
     if not json_data:
         return jsonify({"error": "No input data provided"}), 400
 
-    record = SerialNumberRecord.query.get_or_404(id)
+    # Locked until commit, so concurrent changes to the record count once
+    record = SerialNumberRecord.query.with_for_update().get_or_404(id)
 
     try:
         # Validate and deserialize input
@@ -145,9 +408,14 @@ def update_serial_number(id):
         return jsonify({"errors": err.messages}), 400
 
     try:
+        previous_batch_info_id = record.batch_info_id
+        before = batch_counters.record_values(record)
         for key, value in data.items():
             setattr(record, key, value)
+        batch_counters.apply(batch_counters.changed(before, batch_counters.record_values(record)))
         db.session.commit()
+        batch_index.invalidate(previous_batch_info_id)
+        batch_index.invalidate(record.batch_info_id)
         result = serial_number_schema.dump(record)
         return jsonify({"message": "Serial number record updated", "data": result}), 200
 
@@ -159,19 +427,115 @@ def update_serial_number(id):
         db.session.rollback()
         return jsonify({"error": "An error occurred", "details": str(e)}), 500
     
+# Fields that may be changed through the bulk PATCH endpoint
+BULK_UPDATABLE_FIELDS = {
+    'is_verified', 'recorded_sn', 'recorded_sn_timestamp', 'recorded_sn_user',
+    'testing_selected', 'testing_passed', 'testing_notes', 'testing_user',
+    'testing_timestamp', 'sn_status_id'
+}
+
+# Update many serial number records with a single UPDATE statement
+@crud.route('/serial_numbers', methods=['PATCH'])
+def update_serial_numbers_bulk():
+    json_data = request.get_json()
+    if not json_data:
+        return jsonify({"error": "No input data provided"}), 400
+
+    updates = json_data.get('updates')
+    if not updates:
+        return jsonify({"error": "updates is required"}), 400
+
+    unknown = set(updates) - BULK_UPDATABLE_FIELDS
+    if unknown:
+        return jsonify({"error": f"Fields cannot be bulk updated: {', '.join(sorted(unknown))}"}), 400
+
+    try:
+        # Validate and deserialize input
+        data = serial_number_schema.load(updates, partial=True)
+    except ValidationError as err:
+        return jsonify({"errors": err.messages}), 400
+
+    ids = json_data.get('ids')
+    filters = json_data.get('filter')
+    if ids is None and filters is None:
+        return jsonify({"error": "Either ids or filter is required"}), 400
+
+    conditions = [SerialNumberRecord.is_deleted == False]
+    # One UPDATE per group of conditions, so long id lists stay under the bound-parameter limit
+    condition_groups = [conditions]
+    failures = {}
+    if ids is not None:
+        # bool is a subclass of int
+        if not isinstance(ids, list) or not all(isinstance(id, int) and not isinstance(id, bool) for id in ids):
+            return jsonify({"error": "ids must be a list of integers"}), 400
+        chunk_size = current_app.config['BULK_CHUNK_SIZE']
+        chunks = [ids[start:start + chunk_size] for start in range(0, len(ids), chunk_size)]
+        found = set()
+        for chunk in chunks:
+            found.update(db.session.execute(
+                db.select(SerialNumberRecord.id).where(SerialNumberRecord.id.in_(chunk), *conditions)
+            ).scalars())
+        failures = {id: "Record not found" for id in ids if id not in found}
+        found = sorted(found)
+        condition_groups = [
+            [*conditions, SerialNumberRecord.id.in_(found[start:start + chunk_size])]
+            for start in range(0, len(found), chunk_size)
+        ]
+    else:
+        if not isinstance(filters, dict):
+            return jsonify({"error": "filter must be an object"}), 400
+        try:
+            # Substring matches are fine for searching but not for choosing records to change
+            filter_conditions = build_filters(filters, exact=True)
+        except ValueError as err:
+            return jsonify({"error": str(err)}), 400
+        if not filter_conditions:
+            return jsonify({"error": "filter must match at least one known field"}), 400
+        conditions.extend(filter_conditions)
+
+    try:
+        updated = 0
+        for group in condition_groups:
+            counter_deltas = batch_counters.bulk_updated(group, data)
+            result = db.session.execute(
+                update(SerialNumberRecord)
+                .where(*group)
+                .values(**data)
+                .execution_options(synchronize_session=False)
+            )
+            batch_counters.apply(counter_deltas)
+            updated += result.rowcount
+        db.session.commit()
+        return jsonify({
+            "message": "Serial number records updated",
+            "updated": updated,
+            "failed": len(failures),
+            "failures": failures
+        }), 200
+
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({"error": "Database integrity error", "details": str(e)}), 400
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "An error occurred", "details": str(e)}), 500
+
 # Void a serial number record
 @crud.route('/serial_number/<int:id>/void', methods=['PATCH'])
 def void_serial_number(id):
-    record = SerialNumberRecord.query.get_or_404(id)
+    record = SerialNumberRecord.query.with_for_update().get_or_404(id)
     json_data = request.get_json() or {}
 
     if record.voided:
         return jsonify({"error": "Record is already voided"}), 409
 
     try:
+        before = batch_counters.record_values(record)
         record.voided = True
         record.voided_timestamp = datetime.utcnow()
         record.voided_user = json_data.get('voided_user', 'unknown')
+        batch_counters.apply(batch_counters.changed(before, batch_counters.record_values(record)))
         db.session.commit()
         result = serial_number_schema.dump(record)
         return jsonify({"message": "Serial number record voided", "data": result}), 200
@@ -199,6 +563,12 @@ def query_serial_numbers():
     per_page = request.args.get('per_page', 20, type=int)
     recorded_sn = request.args.get('recorded_sn')
 
+    # Optional projection, e.g. ?fields=id,verified_sn
+    try:
+        serializer = serial_number_rows(request.args.get('fields'))
+    except ValueError as err:
+        return jsonify({"error": str(err)}), 400
+
     # Base query excluding soft-deleted records
     query = SerialNumberRecord.query.filter_by(is_deleted=False)
 
@@ -255,12 +625,12 @@ def query_serial_numbers():
             else:
                 return jsonify({"error": "Invalid voided parameter. Expected 'true' or 'false'."}), 400
 
-        # Apply pagination
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Apply pagination, selecting only the serialized columns
+        pagination = query.with_entities(*serializer.columns).paginate(page=page, per_page=per_page, error_out=False)
         serial_numbers = pagination.items
 
         # Serialize results
-        result = serial_numbers_schema.dump(serial_numbers)
+        result = serializer.dump(serial_numbers)
 
         return jsonify({
             "total": pagination.total,
@@ -275,12 +645,15 @@ def query_serial_numbers():
     
 @crud.route('/serial_number/<int:id>', methods=['DELETE'])
 def delete_serial_number(id):
-    record = SerialNumberRecord.query.get_or_404(id)
+    record = SerialNumberRecord.query.with_for_update().get_or_404(id)
 
     try:
         # Soft delete by setting is_deleted to True
+        before = batch_counters.record_values(record)
         record.is_deleted = True
+        batch_counters.apply(batch_counters.changed(before, batch_counters.record_values(record)))
         db.session.commit()
+        batch_index.invalidate(record.batch_info_id)
         return jsonify({"message": "Serial number record soft deleted", "id": record.id}), 200
 
     except IntegrityError as e:
@@ -291,6 +664,153 @@ def delete_serial_number(id):
         db.session.rollback()
         return jsonify({"error": "An error occurred", "details": str(e)}), 500
     
+def build_filters(params, exact=False):
+    """
+    Builds filter conditions from query-string style parameters keyed by
+    SerialNumberRecord column names. Unknown keys are ignored.
+
+    String values match as case-insensitive substrings and dates match
+    that day onwards. With exact, as used to select records to change,
+    strings must be equal and dates match that day only.
+
+    Raises ValueError with a user-facing message for malformed values.
+    """
+    columns = SerialNumberRecord.__table__.c
+    filter_conditions = []
+    for key, value in params.items():
+        if key not in columns:
+            # Ignore unknown parameters
+            continue
+        column = getattr(SerialNumberRecord, key)
+        if isinstance(column.type, db.String):
+            if exact:
+                filter_conditions.append(column == str(value))
+            else:
+                filter_conditions.append(column.ilike(f"%{value}%"))
+        elif isinstance(column.type, (db.Integer, db.Float)):
+            try:
+                filter_conditions.append(column == column.type.python_type(value))
+            except ValueError:
+                raise ValueError(f"Invalid value for {key}.")
+        elif isinstance(column.type, db.Boolean):
+            if str(value).lower() == 'true':
+                filter_conditions.append(column == True)
+            elif str(value).lower() == 'false':
+                filter_conditions.append(column == False)
+            else:
+                raise ValueError(f"Invalid boolean value for {key}. Expected 'true' or 'false'.")
+        elif isinstance(column.type, db.DateTime):
+            try:
+                date_value = datetime.strptime(value, "%Y-%m-%d")
+                filter_conditions.append(column >= date_value)
+                if exact:
+                    filter_conditions.append(column < date_value + timedelta(days=1))
+            except ValueError:
+                raise ValueError(f"Invalid date format for {key}. Expected YYYY-MM-DD.")
+        else:
+            # For other types, attempt exact match
+            filter_conditions.append(column == value)
+    return filter_conditions
+
+# Counting stops here when an estimated total is requested on databases
+# without planner statistics
+COUNT_ESTIMATE_CAP = 10000
+
+def _estimate_count(query):
+    """
+    Returns a cheap approximation of the number of rows matching query:
+    the planner estimate on Postgres, otherwise an exact count capped at
+    COUNT_ESTIMATE_CAP.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        statement = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+        plan = db.session.execute(db.text(f"EXPLAIN (FORMAT JSON) {statement}")).scalar()
+        return int(plan[0]["Plan"]["Plan Rows"])
+    capped = query.with_entities(SerialNumberRecord.id).order_by(None).limit(COUNT_ESTIMATE_CAP).subquery()
+    return db.session.execute(db.select(func.count()).select_from(capped)).scalar()
+
+def _encode_cursor(sort_by, sort_order, value, id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort_by, "o": sort_order, "v": value, "id": id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def _decode_cursor(cursor, sort_by, sort_order, column):
+    """
+    Returns (last sort value, last id) from an opaque cursor, raising
+    ValueError if it is malformed or was issued for a different ordering.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value, id = payload["v"], int(payload["id"])
+        if payload["s"] != sort_by or payload["o"] != sort_order:
+            raise ValueError
+        if value is not None and isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+    except (ValueError, TypeError, KeyError, json.JSONDecodeError):
+        raise ValueError("Invalid cursor for this sort order.")
+    return value, id
+
+def _keyset_page(query, cursor, per_page, sort_by, sort_order, count_mode, serializer):
+    """
+    Serves one page ordered by (sort column, id), seeking past the last row
+    of the previous page instead of using OFFSET. NULL sort values come last.
+    """
+    if not sort_by or sort_by not in SerialNumberRecord.__table__.c:
+        sort_by = 'id'
+    if sort_order != 'desc':
+        sort_order = 'asc'
+    column = getattr(SerialNumberRecord, sort_by)
+    id_column = SerialNumberRecord.id
+    descending = sort_order == 'desc'
+
+    total = None
+    if count_mode == 'exact':
+        total = query.order_by(None).count()
+    elif count_mode == 'estimate':
+        total = _estimate_count(query)
+
+    if cursor:
+        try:
+            last_value, last_id = _decode_cursor(cursor, sort_by, sort_order, column)
+        except ValueError as err:
+            return jsonify({"error": str(err)}), 400
+
+        after_id = id_column < last_id if descending else id_column > last_id
+        if sort_by == 'id':
+            query = query.filter(after_id)
+        elif last_value is None:
+            query = query.filter(column.is_(None), after_id)
+        else:
+            # Bound as the column's type: SQLAlchemy only allows == and != against a bare True/False
+            last_value = literal(last_value, column.type)
+            after_value = column < last_value if descending else column > last_value
+            query = query.filter(or_(after_value, and_(column == last_value, after_id), column.is_(None)))
+
+    if sort_by == 'id':
+        ordering = [id_column.desc() if descending else id_column.asc()]
+    elif descending:
+        ordering = [column.desc().nulls_last(), id_column.desc()]
+    else:
+        ordering = [column.asc().nulls_last(), id_column.asc()]
+
+    # Fetch one extra row to learn whether another page exists. The sort value
+    # and id trail the serialized columns so the cursor works with any projection.
+    serial_numbers = query.with_entities(*serializer.columns, column, id_column) \
+        .order_by(*ordering).limit(per_page + 1).all()
+    next_cursor = None
+    if len(serial_numbers) > per_page:
+        serial_numbers = serial_numbers[:per_page]
+        last = serial_numbers[-1]
+        next_cursor = _encode_cursor(sort_by, sort_order, last[-2], last[-1])
+
+    return jsonify({
+        "total": total,
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+        "data": serializer.dump(serial_numbers)
+    }), 200
+
 @crud.route('/serial_numbers/query_v2', methods=['GET'])
 def query_serial_numbers_v2():
     # Get all query parameters
@@ -299,6 +819,16 @@ def query_serial_numbers_v2():
     # Pagination parameters
     page = int(params.pop('page', 1))
     per_page = int(params.pop('per_page', 20))
+    cursor = params.pop('cursor', None)
+    count_mode = params.pop('count', 'none' if cursor is not None else 'exact')
+    if count_mode not in ('exact', 'estimate', 'none'):
+        return jsonify({"error": "Invalid count parameter. Expected 'exact', 'estimate' or 'none'."}), 400
+
+    # Optional projection, e.g. ?fields=id,verified_sn
+    try:
+        serializer = serial_number_rows(params.pop('fields', None))
+    except ValueError as err:
+        return jsonify({"error": str(err)}), 400
     
     # Sorting parameters
     sort_by = params.pop('sort_by', None)
@@ -308,59 +838,43 @@ def query_serial_numbers_v2():
     query = SerialNumberRecord.query.filter_by(is_deleted=False)
     
     # Dynamic filtering
-    filter_conditions = []
-    for key, value in params.items():
-        if hasattr(SerialNumberRecord, key):
-            column = getattr(SerialNumberRecord, key)
-            if isinstance(column.type, db.String):
-                filter_conditions.append(column.ilike(f"%{value}%"))
-            elif isinstance(column.type, (db.Integer, db.Float)):
-                try:
-                    filter_conditions.append(column == type(column.type.python_type)(value))
-                except ValueError:
-                    return jsonify({"error": f"Invalid value for {key}."}), 400
-            elif isinstance(column.type, db.Boolean):
-                if value.lower() == 'true':
-                    filter_conditions.append(column == True)
-                elif value.lower() == 'false':
-                    filter_conditions.append(column == False)
-                else:
-                    return jsonify({"error": f"Invalid boolean value for {key}. Expected 'true' or 'false'."}), 400
-            elif isinstance(column.type, db.DateTime):
-                try:
-                    date_value = datetime.strptime(value, "%Y-%m-%d")
-                    filter_conditions.append(column >= date_value)
-                except ValueError:
-                    return jsonify({"error": f"Invalid date format for {key}. Expected YYYY-MM-DD."}), 400
-            else:
-                # For other types, attempt exact match
-                filter_conditions.append(column == value)
-        else:
-            # Ignore unknown parameters or handle as needed
-            pass
+    try:
+        filter_conditions = build_filters(params)
+    except ValueError as err:
+        return jsonify({"error": str(err)}), 400
     
     # Apply filters
     if filter_conditions:
         query = query.filter(and_(*filter_conditions))
+
+    # Keyset pagination: opt in by passing cursor (empty for the first page)
+    if cursor is not None:
+        return _keyset_page(query, cursor, per_page, sort_by, sort_order, count_mode, serializer)
     
     # Apply sorting
-    if sort_by and hasattr(SerialNumberRecord, sort_by):
+    if sort_by and sort_by in SerialNumberRecord.__table__.c:
         column = getattr(SerialNumberRecord, sort_by)
         if sort_order == 'desc':
             query = query.order_by(column.desc())
         else:
             query = query.order_by(column.asc())
     
-    # Apply pagination
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Apply pagination, selecting only the serialized columns
+    pagination = query.with_entities(*serializer.columns).paginate(
+        page=page, per_page=per_page, error_out=False, count=count_mode == 'exact'
+    )
     serial_numbers = pagination.items
 
     # Serialize results
-    result = serial_numbers_schema.dump(serial_numbers)
+    result = serializer.dump(serial_numbers)
+
+    total = pagination.total
+    if count_mode == 'estimate':
+        total = _estimate_count(query)
 
     return jsonify({
-        "total": pagination.total,
-        "pages": pagination.pages,
+        "total": total,
+        "pages": pagination.pages if count_mode == 'exact' else None,
         "current_page": pagination.page,
         "per_page": pagination.per_page,
         "data": result
@@ -429,6 +943,140 @@ def get_batch_info(id):
     result = batch_info_schema.dump(batch_info)
     return jsonify(result), 200
 
+def _existing_serials(first, last, candidates):
+    """
+    Returns the members of candidates that are already stored, using one
+    range query over verified_sn instead of a lookup per serial. Callers must
+    pass same-length serials so string order matches numeric order.
+    """
+    existing = db.session.execute(
+        db.select(SerialNumberRecord.verified_sn).where(
+            SerialNumberRecord.verified_sn.between(first, last),
+            SerialNumberRecord.is_deleted == False
+        )
+    ).scalars()
+    return sorted(candidates.intersection(existing))
+
+# Generate a range of serial numbers for a batch on the server
+@crud.route('/batch/<int:id>/generate_serials', methods=['POST'])
+def generate_serials(id):
+    batch_info = BatchInfo.query.get_or_404(id)
+    json_data = request.get_json()
+    if not json_data:
+        return jsonify({"error": "No input data provided"}), 400
+
+    try:
+        params = generate_serials_schema.load(json_data)
+    except ValidationError as err:
+        return jsonify({"errors": err.messages}), 400
+
+    prefix = params['prefix']
+    start = params['start']
+    end = start + params['count'] - 1
+    digits = params['digits']
+    if len(str(end)) > digits:
+        return jsonify({"error": f"Range {start}-{end} does not fit in {digits} digits."}), 400
+
+    serials = [f"{prefix}{number:0{digits}d}" for number in range(start, end + 1)]
+    conflicts = _existing_serials(serials[0], serials[-1], set(serials))
+    if conflicts and params['on_conflict'] == 'abort':
+        return jsonify({
+            "error": "Some serial numbers already exist",
+            "conflict_count": len(conflicts),
+            "conflicts": conflicts[:100]
+        }), 409
+
+    conflict_set = set(conflicts)
+    timestamp = datetime.utcnow()
+    template = {
+        "ocr_detected_text": "Bulk Added",
+        "serial_number_extracted": "BULK ADDED",
+        "ocr_timestamp": timestamp,
+        "uploaded_by": params.get('uploaded_by'),
+        "batch_id": batch_info.batch_number,
+        "batch_quantity": batch_info.number_of_items,
+        "part_id": batch_info.part_number,
+        "batch_type": batch_info.batch_type,
+        "batch_description": batch_info.batch_description,
+        "batch_info_id": batch_info.id,
+        "sn_status_id": "NewScan",
+    }
+
+    try:
+        # Stream the rows to the database in chunks rather than building them all up front
+        chunk_size = current_app.config['BULK_CHUNK_SIZE']
+        table = SerialNumberRecord.__table__
+        created = 0
+        last_created = None
+        chunk = []
+        for serial in serials:
+            if serial in conflict_set:
+                continue
+            chunk.append({**template, "verified_sn": serial})
+            if len(chunk) == chunk_size:
+                db.session.execute(insert(table), chunk)
+                created += len(chunk)
+                chunk = []
+            last_created = serial
+        if chunk:
+            db.session.execute(insert(table), chunk)
+            created += len(chunk)
+
+        if created:
+            _advance_batch(batch_info.id, created, last_created)
+            # Every generated record is the template with its own serial
+            batch_counters.apply({batch_info.id: Counter({
+                counter: count * created for counter, count in batch_counters.contribution(template).items()
+            })})
+        db.session.commit()
+        batch_index.invalidate(batch_info.id)
+
+        return jsonify({
+            "message": "Serial numbers generated",
+            "first": serials[0],
+            "last": serials[-1],
+            "count": created,
+            "conflict_count": len(conflicts),
+            "conflicts": conflicts[:100]
+        }), 201
+
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({"error": "Database integrity error", "details": str(e)}), 400
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "An error occurred", "details": str(e)}), 500
+
+def _batch_summary(batch_record):
+    """
+    The batch's details and progress, read from its counters alone.
+    """
+    return {
+        "batch_id": batch_record.id,
+        "batch_number": batch_record.batch_number,
+        "part_number": batch_record.part_number,
+        "batch_quantity": batch_record.number_of_items,
+        "total_records": batch_record.scanned_count,
+        "last_scanned_item": batch_record.last_scanned_item,
+        "current_item_number": batch_record.current_item_number,
+        "batch_type": batch_record.batch_type,
+        "batch_description": batch_record.batch_description,
+        "counts": batch_counters.summary(batch_record),
+    }
+
+# Batch progress for polling: one row read, no serial number records
+@crud.route('/batch/summary', methods=['GET'])
+def batch_summary():
+    batch_number = request.args.get('batch_number')
+    if not batch_number:
+        return jsonify({"error": "batch_number is required"}), 400
+
+    batch_record = BatchInfo.query.filter_by(batch_number=batch_number).first()
+    if not batch_record:
+        return jsonify({"message": "Batch not found."}), 404
+    return jsonify(_batch_summary(batch_record)), 200
+
 # Retrieve batch references
 @crud.route('/batch', methods=['GET'])
 def check_batch():
@@ -436,6 +1084,19 @@ def check_batch():
     if not batch_number:
         return jsonify({"error": "batch_number is required"}), 400
 
+    # Optional projection of the records, e.g. ?fields=id,verified_sn
+    try:
+        serializer = serial_number_rows(request.args.get('fields'))
+    except ValueError as err:
+        return jsonify({"error": str(err)}), 400
+
+    # ?records=false answers from the counters alone; ?page= returns one page of records
+    include_records = request.args.get('records', 'true').lower() != 'false'
+    page = request.args.get('page', type=int)
+    per_page = request.args.get('per_page', 100, type=int)
+    if page is not None and (page < 1 or per_page < 1):
+        return jsonify({"error": "page and per_page must be positive integers"}), 400
+
     try:
         # Query the batch record first
         batch_record = BatchInfo.query.filter_by(batch_number=batch_number).first()
@@ -443,26 +1104,26 @@ def check_batch():
         if not batch_record:
             return jsonify({"message": "Batch not found."}), 404
 
-        # Query for serial numbers associated with the batch using a join
-        records = SerialNumberRecord.query.filter(
+        batch_info = _batch_summary(batch_record)
+        if not include_records:
+            return jsonify(batch_info), 200
+
+        # Query for the serialized columns of the batch's serial numbers
+        query = SerialNumberRecord.query.with_entities(*serializer.columns).filter(
             SerialNumberRecord.batch_info_id == batch_record.id,  # Compare with batch_record.id
             SerialNumberRecord.is_deleted == False
-        ).all()
-
-        # If records exist, build the response
-        batch_info = {
-            "batch_id": batch_record.id,
-            "batch_number": batch_record.batch_number,
-            "part_number": batch_record.part_number,
-            "batch_quantity": batch_record.number_of_items,
-            "total_records": len(records),
-            "last_scanned_item": batch_record.last_scanned_item,
-            "current_item_number": batch_record.current_item_number,
-            "batch_type": batch_record.batch_type,
-            "batch_description": batch_record.batch_description,
-            "records": serial_numbers_schema.dump(records)
-        }
+        )
+        if page is not None:
+            # total_records already holds the count, so skip paginate's COUNT query
+            records = query.order_by(SerialNumberRecord.id).paginate(
+                page=page, per_page=per_page, error_out=False, count=False
+            ).items
+            batch_info.update(page=page, per_page=per_page,
+                              pages=(batch_record.scanned_count + per_page - 1) // per_page)
+        else:
+            records = query.all()
 
+        batch_info["records"] = serializer.dump(records)
         return jsonify(batch_info), 200
 
     except Exception as e:
@@ -0,0 +1,97 @@
+# db_profile.py
+"""
+Connection settings tuned for the database in use.
+
+SQLite (the default): every new connection switches the file to WAL, so
+readers never block the writer and a writer only waits for other writers,
+with synchronous=NORMAL (fsync at checkpoints instead of every commit), a
+busy timeout so concurrent gunicorn workers queue for the write lock
+instead of failing with "database is locked", and memory-mapped reads.
+Pool settings are left to SQLAlchemy's SQLite defaults.
+
+PostgreSQL: a sized connection pool per worker with pre-ping and recycling,
+so connections dropped by the server or a proxy are replaced transparently,
+and a server-side statement timeout so one runaway query cannot hold a
+worker indefinitely.
+
+engine_options() must be applied before db.init_app creates the engines;
+init_app() then attaches the SQLite pragmas to them.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from .extensions import db
+
+
+def engine_options(config):
+    """
+    Returns SQLALCHEMY_ENGINE_OPTIONS for config's database URI, on top of
+    any options already configured.
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    backend = make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if backend == 'sqlite':
+        # Also sets sqlite3's own busy handler, used before the PRAGMA runs
+        options.setdefault('connect_args', {}).setdefault('timeout', config['DB_BUSY_TIMEOUT'])
+    elif backend == 'postgresql':
+        options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+        options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+        if config['DB_STATEMENT_TIMEOUT']:
+            connect_args = options.setdefault('connect_args', {})
+            timeout_ms = int(config['DB_STATEMENT_TIMEOUT'] * 1000)
+            connect_args['options'] = f"{connect_args.get('options', '')} -c statement_timeout={timeout_ms}".strip()
+    return options
+
+
+def sqlite_pragmas(config):
+    """
+    The PRAGMA statements run on every new SQLite connection, in order.
+    """
+    return [
+        f"PRAGMA journal_mode={config['DB_SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['DB_SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['DB_BUSY_TIMEOUT'] * 1000)}",
+        f"PRAGMA mmap_size={config['DB_SQLITE_MMAP_SIZE']}",
+    ]
+
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def init_app(app):
+    pragmas = sqlite_pragmas(app.config)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _pragma_listener(pragmas))
+
+
+def metrics():
+    """
+    Pool state of the current app's engine and, on SQLite, the settings a
+    connection actually runs with.
+    """
+    engine = db.engine
+    pool = engine.pool
+    stats = {"dialect": engine.dialect.name, "pool": {"class": type(pool).__name__}}
+    if isinstance(pool, QueuePool):
+        stats["pool"].update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(),
+                             overflow=max(0, pool.overflow()))
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            stats["pragmas"] = {
+                name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+                for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size')
+            }
+    return stats
@@ -0,0 +1,97 @@
+from flask import Response, jsonify, request, Blueprint, stream_with_context
+from datetime import datetime
+import csv
+import io
+import json
+from .models import SerialNumberRecord
+from .extensions import db
+from .crud_routes_v3 import SerialNumberRecordSchema, build_filters
+
+exports = Blueprint('exports', __name__)
+
+# Columns in the same order SerialNumberRecordSchema dumps them
+EXPORT_COLUMNS = [name for name in SerialNumberRecordSchema._declared_fields
+                  if name in SerialNumberRecord.__table__.c]
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+
+# Positions of the DateTime columns, the only values that need converting
+DATETIME_POSITIONS = [position for position, name in enumerate(EXPORT_COLUMNS)
+                      if isinstance(SerialNumberRecord.__table__.c[name].type, db.DateTime)]
+
+
+def _plain_values(row):
+    values = list(row)
+    for position in DATETIME_POSITIONS:
+        if values[position] is not None:
+            values[position] = values[position].isoformat()
+    return values
+
+
+def _csv_lines(partitions):
+    """
+    Yields CSV text, one chunk per partition of rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in partitions:
+        writer.writerows(map(_plain_values, rows))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_lines(partitions):
+    """
+    Yields one JSON object per line, one chunk per partition of rows.
+    """
+    for rows in partitions:
+        yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, _plain_values(row)))) + "\n" for row in rows)
+
+
+EXPORT_FORMATS = {
+    'csv': (_csv_lines, 'text/csv'),
+    'ndjson': (_ndjson_lines, 'application/x-ndjson'),
+}
+
+
+# Stream every record matching the query_v2 filters as CSV or NDJSON
+@exports.route('/serial_numbers/export', methods=['GET'])
+def export_serial_numbers():
+    params = request.args.to_dict()
+    export_format = params.pop('format', 'csv')
+    sort_by = params.pop('sort_by', None)
+    sort_order = params.pop('sort_order', 'asc')
+
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "Invalid format. Expected 'csv' or 'ndjson'."}), 400
+
+    try:
+        filter_conditions = build_filters(params)
+    except ValueError as err:
+        return jsonify({"error": str(err)}), 400
+
+    columns = [SerialNumberRecord.__table__.c[name] for name in EXPORT_COLUMNS]
+    statement = db.select(*columns).where(SerialNumberRecord.is_deleted == False, *filter_conditions)
+    if sort_by and sort_by in SerialNumberRecord.__table__.c:
+        column = SerialNumberRecord.__table__.c[sort_by]
+        statement = statement.order_by(column.desc() if sort_order == 'desc' else column.asc())
+
+    encode, mimetype = EXPORT_FORMATS[export_format]
+
+    @stream_with_context
+    def generate():
+        # yield_per streams from a server-side cursor instead of loading the whole result
+        result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        yield from encode(result.partitions())
+
+    filename = f"serial_numbers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    return Response(
+        generate(),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
@@ -0,0 +1,210 @@
+# image_processing.py
+"""
+OpenCV helpers used by the OCR preprocessing pipeline.
+"""
+import io
+import cv2
+import numpy as np
+from PIL import Image
+
+# EXIF orientations that rotate the image by 90 degrees
+EXIF_ORIENTATION_TAG = 0x0112
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+# cv2.imdecode flags that decode to grayscale at 1/N size; JPEG decodes these
+# directly at the reduced scale, which is much cheaper than a full decode
+REDUCED_GRAYSCALE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+def read_image_header(buffer):
+    """
+    Returns (width, height, channels, format) from the image header without
+    decoding the pixels. Width and height are as displayed, after any EXIF
+    rotation. Raises ValueError if the data is not a readable image.
+    """
+    # A BytesIO over bytes shares the buffer; an mmap is already file-like
+    stream = buffer if hasattr(buffer, 'seek') else io.BytesIO(buffer)
+    try:
+        stream.seek(0)
+        with Image.open(stream) as image:
+            width, height = image.size
+            channels = len(image.getbands())
+            image_format = image.format
+            if image.getexif().get(EXIF_ORIENTATION_TAG) in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+    except Exception:
+        raise ValueError("Could not decode image")
+    return width, height, channels, image_format
+
+
+def decode_grayscale(buffer, longest_side, max_dimension=None):
+    """
+    Decodes image bytes straight to a single-channel image. When the image
+    is at least twice as large as max_dimension it is decoded at 1/2, 1/4
+    or 1/8 scale, never going below max_dimension.
+    """
+    flag = cv2.IMREAD_GRAYSCALE
+    if max_dimension:
+        for factor, reduced_flag in REDUCED_GRAYSCALE_FLAGS:
+            if longest_side // factor >= max_dimension:
+                flag = reduced_flag
+                break
+
+    # np.frombuffer wraps the bytes (or mmap) without copying them
+    gray = cv2.imdecode(np.frombuffer(buffer, np.uint8), flag)
+    if gray is None:
+        raise ValueError("Could not decode image")
+    return gray
+
+
+def downscale(image, max_dimension):
+    """
+    Shrinks image so its longer side is at most max_dimension pixels.
+    Images that are already small enough are returned unchanged.
+    """
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if not max_dimension or longest <= max_dimension:
+        return image
+    scale = max_dimension / longest
+    return cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+def _text_blobs(gray, work_width=800):
+    """
+    Finds line-shaped blobs of engraved text on a reduced copy of gray.
+    Returns (contours, scale, reduced area).
+
+    Engraved characters produce dense, strong local gradients. The gradient
+    map is thresholded and closed with a wide kernel so characters merge
+    into line-shaped blobs; blobs that are wider than tall, of plausible
+    size and mostly filled are kept.
+    """
+    width = gray.shape[1]
+    scale = min(1.0, work_width / width)
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    small_height, small_width = small.shape[:2]
+    small_area = small_height * small_width
+
+    small = cv2.GaussianBlur(small, (3, 3), 0)
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, small_width // 40), 3))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    blobs = []
+    for contour in contours:
+        _, _, box_width, box_height = cv2.boundingRect(contour)
+        area = box_width * box_height
+        if box_width < 1.5 * box_height:
+            continue
+        if area < 0.0005 * small_area or area > 0.5 * small_area:
+            continue
+        # Outlines (edges of the part, scratches) are hollow; text blobs are mostly filled
+        if cv2.contourArea(contour) < 0.4 * area:
+            continue
+        blobs.append(contour)
+    return blobs, scale, small_area
+
+
+def find_text_region(gray, padding=0.1, max_coverage=0.8, work_width=800):
+    """
+    Returns the (x, y, w, h) box around the text-like areas of a grayscale
+    image, or None when no useful crop is found. A crop covering more than
+    max_coverage of the frame is not worth making.
+    """
+    height, width = gray.shape[:2]
+    blobs, scale, _ = _text_blobs(gray, work_width)
+    if not blobs:
+        return None
+
+    boxes = [cv2.boundingRect(contour) for contour in blobs]
+    left = min(x for x, _, _, _ in boxes) / scale
+    top = min(y for _, y, _, _ in boxes) / scale
+    right = max(x + w for x, _, w, _ in boxes) / scale
+    bottom = max(y + h for _, y, _, h in boxes) / scale
+
+    pad_x = (right - left) * padding
+    pad_y = (bottom - top) * padding
+    left, top = max(0, int(left - pad_x)), max(0, int(top - pad_y))
+    right, bottom = min(width, int(right + pad_x)), min(height, int(bottom + pad_y))
+
+    if (right - left) * (bottom - top) > max_coverage * height * width:
+        return None
+    return left, top, right - left, bottom - top
+
+
+def crop_to_text(gray):
+    """
+    Crops a grayscale image to its text region, or returns it unchanged.
+    """
+    region = find_text_region(gray)
+    if region is None:
+        return gray
+    x, y, width, height = region
+    return gray[y:y + height, x:x + width]
+
+
+def estimate_skew(gray, work_width=800):
+    """
+    Returns the angle in degrees by which the text lines in gray are
+    rotated, or None when no text lines are found.
+    """
+    blobs, _, _ = _text_blobs(gray, work_width)
+    angles = []
+    weights = []
+    for contour in blobs:
+        (_, _), (rect_width, rect_height), angle = cv2.minAreaRect(contour)
+        # Measure the angle of the long side, folded into [-45, 45]
+        if rect_width < rect_height:
+            angle -= 90
+        angles.append((angle + 45) % 90 - 45)
+        # Whole lines outweigh the fragments left by single strokes
+        weights.append(rect_width * rect_height)
+    if not angles:
+        return None
+    return float(np.average(angles, weights=weights))
+
+
+def clahe(gray, clip_limit=2.0, tile_size=8):
+    """
+    Contrast-limited adaptive histogram equalization. Keeps shallow
+    engravings readable next to glare, where global equalization fails.
+    """
+    return cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_size, tile_size)).apply(gray)
+
+
+def adaptive_threshold(gray, block_size=31, offset=10):
+    """
+    Binarizes gray against its local mean, for unevenly lit parts.
+    """
+    blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+    return cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                 block_size, offset)
+
+
+def deskew(gray, min_angle=0.5, max_angle=30):
+    """
+    Rotates gray so its text lines are horizontal, then equalizes it.
+    Angles outside [min_angle, max_angle] are left alone.
+    """
+    angle = estimate_skew(gray)
+    if angle is not None and min_angle <= abs(angle) <= max_angle:
+        height, width = gray.shape[:2]
+        rotation = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        gray = cv2.warpAffine(gray, rotation, (width, height), flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_REPLICATE)
+    return cv2.equalizeHist(gray)
+
+
+def invert(gray):
+    """
+    Equalizes and inverts gray, for dark characters engraved on a light surface.
+    """
+    return cv2.bitwise_not(cv2.equalizeHist(gray))
@@ -0,0 +1,295 @@
+# instrumentation.py
+"""
+Request latency, SQL and pipeline stage metrics.
+
+Every request is timed per endpoint, together with the number and total
+duration of the SQL statements it ran (from SQLAlchemy cursor events) and
+the time spent in named stages of the OCR and report pipelines. Responses
+carry that breakdown in a Server-Timing header, and requests slower than
+SLOW_REQUEST_SECONDS are logged with it.
+
+Background OCR jobs run outside any request, so each job is traced on its
+own and logged against its job id when slower than SLOW_REQUEST_SECONDS;
+the /upload request that queued it only shows the time spent queueing.
+Stages run on helper threads (e.g. parallel preprocessing of a batch) are
+only counted in the stage histograms.
+
+Samples are Prometheus counters and cumulative histogram buckets, so the
+samples of several processes add up. Each worker collects them in memory
+and adds them to the SQLite file METRICS_PATH at most every
+METRICS_FLUSH_INTERVAL seconds; /metrics reports the totals of every
+gunicorn worker on the host, including workers that have since exited.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Histogram buckets of the latency metrics, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Histogram buckets of the SQL statements run per request
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250)
+
+# Metric families: name -> (type, help)
+FAMILIES = {
+    "http_requests_total": ("counter", "Requests served, by endpoint, method and status."),
+    "http_request_duration_seconds": ("histogram", "Request latency, by endpoint and method."),
+    "http_request_db_queries": ("histogram", "SQL statements run per request, by endpoint."),
+    "http_request_db_duration_seconds": ("histogram", "Time spent in SQL per request, by endpoint."),
+    "pipeline_stage_duration_seconds": ("histogram", "Time spent in OCR and report pipeline stages."),
+}
+
+
+class RequestTrace:
+    """
+    What one request spent its time on.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.stages = defaultdict(float)
+
+
+_current_trace = ContextVar('request_trace', default=None)
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _sample_order(row):
+    # Buckets of a series by increasing bound, +Inf last; le is always the last label
+    name, labels, _ = row
+    if name.endswith("_bucket"):
+        series, _, bound = labels.rpartition('le="')
+        return name, series, float(bound[:-1])
+    return name, labels, 0.0
+
+
+def _family(name):
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+            return name[:-len(suffix)]
+    return name
+
+
+class Instrumentation:
+    def __init__(self):
+        self.path = None
+        self.flush_interval = 5.0
+        self.slow_request_seconds = 1.0
+        self._lock = threading.Lock()
+        # Samples not yet added to METRICS_PATH: (sample name, labels) -> value
+        self._pending = defaultdict(float)
+        self._last_flush = time.monotonic()
+        self._listening = False
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The samples collected so far belong to the parent, which flushes them
+        self._lock = threading.Lock()
+        self._pending = defaultdict(float)
+        self._last_flush = time.monotonic()
+
+    def init_app(self, app):
+        self.path = app.config['METRICS_PATH'] or os.path.join(app.instance_path, 'metrics.sqlite')
+        self.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+        self.slow_request_seconds = app.config['SLOW_REQUEST_SECONDS']
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS metrics "
+                "(name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (name, labels))"
+            )
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._end_trace)
+        if not self._listening:
+            # Engines are created lazily per app, so listen on all of them
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            atexit.register(self.flush)
+            self._listening = True
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _add(self, name, labels, value):
+        with self._lock:
+            self._pending[(name, labels)] += value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """
+        Adds value to the histogram name.
+        """
+        base = _labels(**labels)
+        prefix = base + "," if base else ""
+        with self._lock:
+            for bound in buckets:
+                if value <= bound:
+                    self._pending[(name + "_bucket", f'{prefix}le="{bound}"')] += 1
+            self._pending[(name + "_bucket", f'{prefix}le="+Inf"')] += 1
+            self._pending[(name + "_sum", base)] += value
+            self._pending[(name + "_count", base)] += 1
+
+    def record_stage(self, pipeline, stage, seconds):
+        """
+        Records time spent in a pipeline stage, also against the current
+        request or background job if there is one.
+        """
+        self.observe("pipeline_stage_duration_seconds", seconds, pipeline=pipeline, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.stages[f"{pipeline}.{stage}"] += seconds
+
+    def _start_request(self):
+        g.request_trace_token = _current_trace.set(RequestTrace())
+
+    def _finish_request(self, response):
+        trace = _current_trace.get()
+        if trace is None:
+            return response
+        elapsed = time.perf_counter() - trace.started
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+        self._add("http_requests_total", _labels(endpoint=endpoint, method=request.method,
+                                                 status=response.status_code), 1)
+        self.observe("http_request_duration_seconds", elapsed, endpoint=endpoint, method=request.method)
+        self.observe("http_request_db_queries", trace.queries, QUERY_COUNT_BUCKETS, endpoint=endpoint)
+        self.observe("http_request_db_duration_seconds", trace.query_seconds, endpoint=endpoint)
+
+        timings = [f"total;dur={elapsed * 1000:.1f}",
+                   f'db;dur={trace.query_seconds * 1000:.1f};desc="{trace.queries} queries"']
+        timings += [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in trace.stages.items()]
+        response.headers["Server-Timing"] = ", ".join(timings)
+
+        if elapsed >= self.slow_request_seconds:
+            self._log_slow(f"request {request.method} {request.full_path.rstrip('?')} ({response.status_code})",
+                           trace, elapsed)
+
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        return response
+
+    @contextmanager
+    def trace_job(self, description):
+        """
+        Collects the SQL and stages of a background job run in the block,
+        as for a request, and logs them if the job is slow. description
+        names the job in the log, e.g. "OCR job <id>".
+        """
+        token = _current_trace.set(RequestTrace())
+        try:
+            yield
+        finally:
+            trace = _current_trace.get()
+            _current_trace.reset(token)
+            elapsed = time.perf_counter() - trace.started
+            if elapsed >= self.slow_request_seconds:
+                self._log_slow(description, trace, elapsed)
+
+    @staticmethod
+    def _log_slow(description, trace, elapsed):
+        stages = ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in trace.stages.items())
+        current_app.logger.warning(
+            "Slow %s took %.0f ms: %d SQL statements in %.0f ms; stages: %s",
+            description, elapsed * 1000, trace.queries, trace.query_seconds * 1000, stages or "none"
+        )
+
+    def _end_trace(self, exc=None):
+        token = g.pop('request_trace_token', None)
+        if token is not None:
+            _current_trace.reset(token)
+
+    def flush(self):
+        """
+        Adds this worker's samples since the last flush to METRICS_PATH.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            with self._connect() as connection:
+                connection.executemany(
+                    "INSERT INTO metrics (name, labels, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+                    [(name, labels, value) for (name, labels), value in pending.items()]
+                )
+        except sqlite3.Error:
+            # Keep the samples for the next flush
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending[key] += value
+
+    def render(self):
+        """
+        Returns the metrics of all workers in the Prometheus text format.
+        """
+        self.flush()
+        with self._connect() as connection:
+            rows = connection.execute("SELECT name, labels, value FROM metrics").fetchall()
+
+        samples = defaultdict(list)
+        for name, labels, value in sorted(rows, key=_sample_order):
+            samples[_family(name)].append((name, labels, value))
+
+        lines = []
+        for family, family_samples in samples.items():
+            kind, description = FAMILIES.get(family, ("untyped", ""))
+            lines.append(f"# HELP {family} {description}")
+            lines.append(f"# TYPE {family} {kind}")
+            for name, labels, value in family_samples:
+                lines.append(f"{name}{{{labels}}} {value:.17g}" if labels else f"{name} {value:.17g}")
+        return "\n".join(lines) + "\n"
+
+
+instrumentation = Instrumentation()
+
+
+@contextmanager
+def stage(pipeline, name):
+    """
+    Times the block as stage name of pipeline, e.g. stage('ocr', 'decode').
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        instrumentation.record_stage(pipeline, name, time.perf_counter() - started)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_trace.get() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current_trace.get()
+    started = conn.info.get('query_started')
+    if trace is not None and started:
+        trace.queries += 1
+        trace.query_seconds += time.perf_counter() - started.pop()
@@ -0,0 +1,41 @@
+# json_provider.py
+"""
+JSON responses encoded with orjson when it is installed.
+
+Flask's default provider runs the standard library encoder with sorted
+keys, which takes most of the time of a large page of records. This
+provider produces the same documents with orjson: keys stay sorted, and
+dates and other types orjson would encode its own way go through Flask's
+default() as before. Debug-mode pretty printing and dumps() calls with
+encoder arguments fall back to the default provider.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def _encode(self, obj):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj).decode()
+
+    def response(self, *args, **kwargs):
+        if self.compact is None and self._app.debug:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._encode(obj) + b"\n", mimetype=self.mimetype)
+
+
+def init_app(app):
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
@@ -0,0 +1,158 @@
+# label_layouts.py
+"""
+Named label layouts for /serial_numbers/report.
+
+A layout places labels on a page in a grid: sheet layouts such as the Avery
+templates put many labels on a letter page, roll layouts for thermal
+printers have one label per page. All sizes are in points (72 per inch).
+More layouts can be added with the JSON file named by REPORT_LABEL_LAYOUTS:
+
+    {"avery-5195": {"page_width": 612, "page_height": 792, "columns": 4, "rows": 15,
+                    "label_width": 126, "label_height": 47.52, "left_margin": 20.88,
+                    "top_margin": 38.88, "column_pitch": 148.32, "row_pitch": 47.52}}
+
+Label positions only depend on the layout, so they are computed once per
+layout and shared by every report drawn with it.
+"""
+import json
+import re
+import threading
+from collections import namedtuple
+from functools import lru_cache
+
+INCH = 72
+
+# left_margin and top_margin are measured from the page edges to the first
+# label; column_pitch and row_pitch from one label's edge to the next.
+# padding is kept clear inside each label; dpi is the printer resolution
+# used for ZPL output.
+LabelLayout = namedtuple('LabelLayout', [
+    'name', 'description', 'page_width', 'page_height', 'columns', 'rows',
+    'label_width', 'label_height', 'left_margin', 'top_margin', 'column_pitch', 'row_pitch',
+    'padding', 'dpi'
+])
+
+DEFAULT_LAYOUT = 'letter-3x8'
+
+DEFAULT_LAYOUTS = (
+    # The original report grid of 2x1 inch labels, spaced to fit on the page
+    dict(name='letter-3x8', description='Letter sheet, 3 x 8 labels of 2 x 1 in',
+         page_width=8.5 * INCH, page_height=11 * INCH, columns=3, rows=8,
+         label_width=2 * INCH, label_height=1 * INCH, left_margin=50, top_margin=0.5 * INCH,
+         column_pitch=184, row_pitch=(11 - 1 - 1) * INCH / 7),
+    dict(name='avery-5160', description='Avery 5160 address labels, 3 x 10 of 2.625 x 1 in',
+         page_width=8.5 * INCH, page_height=11 * INCH, columns=3, rows=10,
+         label_width=2.625 * INCH, label_height=1 * INCH, left_margin=0.1875 * INCH, top_margin=0.5 * INCH,
+         column_pitch=2.75 * INCH, row_pitch=1 * INCH, padding=0.08 * INCH),
+    dict(name='avery-5163', description='Avery 5163 shipping labels, 2 x 5 of 4 x 2 in',
+         page_width=8.5 * INCH, page_height=11 * INCH, columns=2, rows=5,
+         label_width=4 * INCH, label_height=2 * INCH, left_margin=0.15625 * INCH, top_margin=0.5 * INCH,
+         column_pitch=4.1875 * INCH, row_pitch=2 * INCH, padding=0.25 * INCH),
+    dict(name='avery-5167', description='Avery 5167 return address labels, 4 x 20 of 1.75 x 0.5 in',
+         page_width=8.5 * INCH, page_height=11 * INCH, columns=4, rows=20,
+         label_width=1.75 * INCH, label_height=0.5 * INCH, left_margin=0.3 * INCH, top_margin=0.5 * INCH,
+         column_pitch=2.05 * INCH, row_pitch=0.5 * INCH, padding=0.04 * INCH),
+    dict(name='thermal-2x1', description='Thermal roll, 2 x 1 in labels at 203 dpi',
+         page_width=2 * INCH, page_height=1 * INCH, columns=1, rows=1,
+         label_width=2 * INCH, label_height=1 * INCH, padding=0.06 * INCH, dpi=203),
+    dict(name='thermal-3x1', description='Thermal roll, 3 x 1 in labels at 203 dpi',
+         page_width=3 * INCH, page_height=1 * INCH, columns=1, rows=1,
+         label_width=3 * INCH, label_height=1 * INCH, padding=0.06 * INCH, dpi=203),
+)
+
+# Layout names end up in report file names
+LAYOUT_NAME = re.compile(r'^[A-Za-z0-9._-]+$')
+
+
+def make_layout(name, page_width, page_height, label_width, label_height, columns=1, rows=1,
+                left_margin=0, top_margin=0, column_pitch=None, row_pitch=None, padding=0,
+                dpi=203, description=''):
+    """
+    Builds a LabelLayout, checking that its grid fits on the page. Raises
+    ValueError otherwise.
+    """
+    layout = LabelLayout(
+        name, description, float(page_width), float(page_height), int(columns), int(rows),
+        float(label_width), float(label_height), float(left_margin), float(top_margin),
+        float(label_width if column_pitch is None else column_pitch),
+        float(label_height if row_pitch is None else row_pitch), float(padding), int(dpi)
+    )
+    if not LAYOUT_NAME.match(name):
+        raise ValueError(f"Invalid label layout name {name!r}")
+    if layout.columns < 1 or layout.rows < 1:
+        raise ValueError(f"Label layout {name} needs at least one column and row")
+    if layout.label_width <= 2 * layout.padding or layout.label_height <= 2 * layout.padding:
+        raise ValueError(f"Label layout {name} has no room inside its padding")
+    right = layout.left_margin + (layout.columns - 1) * layout.column_pitch + layout.label_width
+    bottom = layout.top_margin + (layout.rows - 1) * layout.row_pitch + layout.label_height
+    # Allow for rounding in sizes converted from inches or millimetres
+    if right > layout.page_width + 0.5 or bottom > layout.page_height + 0.5:
+        raise ValueError(f"Label layout {name} does not fit on its page")
+    return layout
+
+
+@lru_cache(maxsize=None)
+def label_positions(layout):
+    """
+    Lower left corners of the labels on a page, in reading order, in PDF
+    coordinates (origin at the bottom left of the page).
+    """
+    return tuple(
+        (layout.left_margin + column * layout.column_pitch,
+         layout.page_height - layout.top_margin - row * layout.row_pitch - layout.label_height)
+        for row in range(layout.rows)
+        for column in range(layout.columns)
+    )
+
+
+@lru_cache(maxsize=None)
+def barcode_box(layout):
+    """
+    (x offset, y offset, width, height) of the barcode inside a label.
+    """
+    return (layout.padding, layout.padding,
+            layout.label_width - 2 * layout.padding, layout.label_height - 2 * layout.padding)
+
+
+def labels_per_page(layout):
+    return layout.columns * layout.rows
+
+
+class LabelLayoutRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._layouts = {spec['name']: make_layout(**spec) for spec in DEFAULT_LAYOUTS}
+        self.default = DEFAULT_LAYOUT
+
+    def init_app(self, app):
+        if app.config['REPORT_LABEL_LAYOUTS']:
+            self.load(app.config['REPORT_LABEL_LAYOUTS'])
+        default = app.config['REPORT_DEFAULT_LAYOUT']
+        if default not in self._layouts:
+            raise ValueError(f"Unknown REPORT_DEFAULT_LAYOUT {default!r}")
+        self.default = default
+
+    def register(self, layout):
+        with self._lock:
+            self._layouts[layout.name] = layout
+
+    def load(self, path):
+        with open(path) as layouts_file:
+            for name, spec in json.load(layouts_file).items():
+                self.register(make_layout(name, **spec))
+
+    def get(self, name=None):
+        """
+        Returns the layout called name, the default layout for None, or
+        raises KeyError.
+        """
+        return self._layouts[name or self.default]
+
+    def describe(self):
+        return [
+            {**layout._asdict(), "labels_per_page": labels_per_page(layout), "default": name == self.default}
+            for name, layout in sorted(self._layouts.items())
+        ]
+
+
+label_layouts = LabelLayoutRegistry()
@@ -0,0 +1,200 @@
+# label_report.py
+"""
+Barcode labels for /serial_numbers/report, in any of the label layouts.
+
+Reports come in three formats:
+
+- pdf: Code128 barcodes drawn as vector graphics with reportlab's built-in
+  barcode support, so a label costs a few rectangles in the PDF instead of
+  a raster image encoded three times. Finished reports are cached on disk
+  (see report_cache.py), so unchanged batches are never drawn twice.
+- zpl: one ZPL label per serial for Zebra thermal printers, which draw the
+  barcode themselves.
+- csv: a manifest of which serial is printed where.
+
+reportlab and pypdf are imported by the functions that use them, so the
+app starts without loading them until the first report.
+"""
+import csv
+import io
+import math
+import time
+from collections import namedtuple
+from functools import lru_cache
+from .label_layouts import label_layouts, label_positions, barcode_box, labels_per_page
+from .instrumentation import instrumentation, stage
+
+
+# Human-readable text under each barcode
+BARCODE_FONT_SIZE = 9
+BARCODE_TEXT_HEIGHT = BARCODE_FONT_SIZE * 1.4
+
+
+def _code128(serial, width, height):
+    """
+    Builds a Code128 barcode for serial that fills width x height points,
+    with quiet zones at the sides and the serial printed underneath.
+    """
+    from reportlab.graphics.barcode.code128 import Code128
+    modules = Code128(serial, barWidth=1, quiet=0).width
+    quiet_zone = width * 0.05
+    return Code128(
+        serial,
+        barWidth=(width - 2 * quiet_zone) / modules,
+        barHeight=height - BARCODE_TEXT_HEIGHT,
+        quiet=1, lquiet=quiet_zone, rquiet=quiet_zone,
+        humanReadable=True, fontSize=BARCODE_FONT_SIZE
+    )
+
+
+def write_label_pdf(serials, output, title, layout=None):
+    """
+    Writes a PDF of Code128 labels placed by layout (the default layout
+    for None) to the file-like object output.
+    """
+    from reportlab.pdfgen import canvas
+    layout = layout or label_layouts.get()
+    pdf = canvas.Canvas(output, pagesize=(layout.page_width, layout.page_height))
+    pdf.setTitle(title)
+
+    # Label corners and the barcode box inside a label come from the layout
+    positions = label_positions(layout)
+    box_x, box_y, box_width, box_height = barcode_box(layout)
+
+    slot = 0
+    barcode_seconds = draw_seconds = 0.0
+    for serial_number in serials:
+        # If we've filled all labels on the page, start a new page
+        if slot == len(positions):
+            pdf.showPage()
+            slot = 0
+
+        # Draw the barcode as vector shapes at the label's position, text underneath
+        started = time.perf_counter()
+        barcode = _code128(serial_number, box_width, box_height)
+        encoded = time.perf_counter()
+        x_position, y_position = positions[slot]
+        barcode.drawOn(pdf, x_position + box_x, y_position + box_y + BARCODE_TEXT_HEIGHT)
+        barcode_seconds += encoded - started
+        draw_seconds += time.perf_counter() - encoded
+        slot += 1
+
+    # Labels are timed together; a stage per label would cost more than drawing it
+    instrumentation.record_stage('report', 'barcode', barcode_seconds)
+    instrumentation.record_stage('report', 'draw', draw_seconds)
+
+    # Finalize the PDF
+    with stage('report', 'save'):
+        pdf.save()
+
+
+def render_label_pdf(serials, title, layout):
+    """
+    Returns the label PDF for serials as bytes. Runs in the report worker
+    processes, so it only takes picklable arguments.
+    """
+    output = io.BytesIO()
+    write_label_pdf(serials, output, title, layout)
+    return output.getvalue()
+
+
+def write_label_pdf_parallel(serials, output, title, pool, parts, layout=None):
+    """
+    Splits serials into up to parts runs of whole pages, renders them on
+    the process pool and writes the merged PDF to output.
+    """
+    from pypdf import PdfReader, PdfWriter
+    layout = layout or label_layouts.get()
+    page_size = labels_per_page(layout)
+    pages = math.ceil(len(serials) / page_size)
+    part_size = math.ceil(pages / parts) * page_size
+    chunks = [serials[start:start + part_size] for start in range(0, len(serials), part_size)]
+
+    writer = PdfWriter()
+    with stage('report', 'draw'):
+        for part in pool.map(render_label_pdf, chunks, [title] * len(chunks), [layout] * len(chunks)):
+            writer.append(PdfReader(io.BytesIO(part)))
+    writer.add_metadata({"/Title": title})
+    with stage('report', 'save'):
+        writer.write(output)
+
+
+def _dots(points, dpi):
+    return int(round(points * dpi / 72))
+
+
+@lru_cache(maxsize=None)
+def zpl_geometry(layout):
+    """
+    (label width, label height, barcode x, barcode y, barcode width, bar
+    height) of a layout's labels in printer dots.
+    """
+    box_x, box_y, box_width, box_height = barcode_box(layout)
+    label_height = _dots(layout.label_height, layout.dpi)
+    # ZPL measures from the top of the label and prints the text under the bars
+    top = label_height - _dots(box_y + box_height, layout.dpi)
+    return (_dots(layout.label_width, layout.dpi), label_height, _dots(box_x, layout.dpi), top,
+            _dots(box_width, layout.dpi), _dots(box_height - BARCODE_TEXT_HEIGHT, layout.dpi))
+
+
+def _zpl_field(text):
+    # ^FH lets _XX hex escapes stand in for the UTF-8 bytes of control
+    # characters and of characters ZPL would treat as commands
+    return ''.join(
+        ''.join(f"_{byte:02X}" for byte in char.encode('utf-8'))
+        if char in '^~_' or not char.isprintable() else char
+        for char in text
+    )
+
+
+def write_label_zpl(serials, output, title, layout=None):
+    """
+    Writes one ZPL label per serial, sized by layout, to the binary
+    file-like object output.
+    """
+    from reportlab.graphics.barcode.code128 import Code128
+    layout = layout or label_layouts.get()
+    width, height, box_x, box_y, box_width, bar_height = zpl_geometry(layout)
+    with stage('report', 'draw'):
+        for serial in serials:
+            serial = str(serial)
+            # Widest whole-dot module that fits the barcode box, centred in it
+            modules = Code128(serial, barWidth=1, quiet=0).width
+            module = max(1, int(box_width // modules))
+            x = box_x + max(0, int(box_width - modules * module) // 2)
+            output.write(
+                # ^CI28 makes the printer read field data as UTF-8
+                f"^XA^CI28^PW{width}^LL{height}^LH0,0"
+                f"^FO{x},{box_y}^BY{module}^BCN,{bar_height},Y,N,N,A^FH^FD{_zpl_field(serial)}^FS^XZ\n".encode('utf-8')
+            )
+
+
+def write_label_csv(serials, output, title, layout=None):
+    """
+    Writes a CSV manifest of the labels, with the page, row and column
+    each serial is printed at in layout, to the binary file-like object
+    output.
+    """
+    layout = layout or label_layouts.get()
+    page_size = labels_per_page(layout)
+    text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(['label', 'serial', 'page', 'row', 'column', 'layout'])
+    with stage('report', 'draw'):
+        for index, serial in enumerate(serials):
+            page, slot = divmod(index, page_size)
+            row, column = divmod(slot, layout.columns)
+            writer.writerow([index + 1, serial, page + 1, row + 1, column + 1, layout.name])
+    text.flush()
+    # Leave output open for the caller
+    text.detach()
+
+
+# Output formats of the report: file extension, mimetype and writer
+ReportFormat = namedtuple('ReportFormat', ['extension', 'mimetype', 'write'])
+
+REPORT_FORMATS = {
+    'pdf': ReportFormat('pdf', 'application/pdf', write_label_pdf),
+    'zpl': ReportFormat('zpl', 'text/plain', write_label_zpl),
+    'csv': ReportFormat('csv', 'text/csv', write_label_csv),
+}
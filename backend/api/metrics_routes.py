@@ -0,0 +1,15 @@
+from flask import Response, Blueprint, jsonify
+from .instrumentation import instrumentation
+from . import db_profile
+
+monitoring = Blueprint('monitoring', __name__)
+
+# Prometheus metrics of every worker on this host
+@monitoring.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+# Connection pool and SQLite settings of this worker
+@monitoring.route('/db/metrics', methods=['GET'])
+def database_metrics():
+    return jsonify(db_profile.metrics()), 200
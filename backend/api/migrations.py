@@ -0,0 +1,112 @@
+# migrations.py
+"""
+Minimal schema migrations for changes db.create_all() cannot make on
+existing tables, such as adding indexes or columns.
+
+Each migration runs once per database and is recorded in the
+schema_version table. Append new migrations to MIGRATIONS; never reorder
+or edit ones that have shipped.
+
+Every gunicorn worker calls run_migrations() at boot, so the whole run,
+including creating missing tables, holds a database-wide lock: the other
+workers wait for it and then find nothing left to do.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+from .extensions import db
+
+# Key of the PostgreSQL advisory lock held while migrating
+MIGRATION_LOCK_KEY = 7365040100
+
+
+def _create_missing_indexes(connection):
+    """
+    Creates every index declared on the models that does not exist yet.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _add_records_version(connection):
+    """
+    Adds BatchInfo.records_version, the version of a batch's cached reports.
+    """
+    existing = {column['name'] for column in inspect(connection).get_columns('batch_info')}
+    if 'records_version' not in existing:
+        connection.execute(text("ALTER TABLE batch_info ADD COLUMN records_version INTEGER NOT NULL DEFAULT 0"))
+
+
+def _add_batch_counters(connection):
+    """
+    Adds the BatchInfo progress counters and fills them from the records.
+    Columns are only added when missing, since create_all() has already
+    made them on a new database. The recount relies on run_migrations()
+    holding the lock: a write between it and the commit would be lost.
+    """
+    from .batch_counters import COUNTERS, recount
+    existing = {column['name'] for column in inspect(connection).get_columns('batch_info')}
+    for counter in COUNTERS:
+        if counter not in existing:
+            connection.execute(text(f"ALTER TABLE batch_info ADD COLUMN {counter} INTEGER NOT NULL DEFAULT 0"))
+    # recount() bumps records_version, added by a later migration
+    _add_records_version(connection)
+    recount(connection)
+
+
+# Ordered list of (version, description, function)
+MIGRATIONS = [
+    (1, "Add indexes for serial number hot query columns", _create_missing_indexes),
+    (2, "Add batch progress counters", _add_batch_counters),
+    (3, "Add batch records version", _add_records_version),
+]
+
+
+def lock(connection):
+    """
+    Takes the lock that serializes schema changes across processes. It is
+    held until the connection's transaction ends. Other databases are not
+    locked.
+    """
+    if connection.dialect.name == 'sqlite':
+        # Takes the write lock now instead of at the first write; waits up to the busy timeout
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+    elif connection.dialect.name == 'postgresql':
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def current_version(connection):
+    connection.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY)"))
+    # Tables created before the primary key may hold a version more than once
+    versions = connection.execute(text("SELECT version FROM schema_version")).scalars().all()
+    if len(versions) != len(set(versions)):
+        connection.execute(text("DELETE FROM schema_version"))
+        connection.execute(text("INSERT INTO schema_version (version) VALUES (:version)"),
+                           [{"version": version} for version in set(versions)])
+    connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_schema_version ON schema_version (version)"))
+    return max(versions, default=0)
+
+
+def run_migrations():
+    """
+    Creates missing tables and applies pending migrations in order, in one
+    transaction under lock(). Must be called inside an application context.
+    """
+    applied = []
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            # DB_STATEMENT_TIMEOUT is meant for requests: waiting for the lock or
+            # building an index on a large table may take longer. LOCAL lasts
+            # until the transaction ends.
+            connection.execute(text("SET LOCAL statement_timeout = 0"))
+        lock(connection)
+        db.metadata.create_all(connection)
+        version = current_version(connection)
+        for number, description, migrate in MIGRATIONS:
+            if number <= version:
+                continue
+            migrate(connection)
+            connection.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": number})
+            applied.append(description)
+        connection.commit()
+    return applied
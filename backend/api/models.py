@@ -56,6 +56,19 @@ class SerialNumberRecord(db.Model):
     batch_info_id = db.Column(db.Integer, db.ForeignKey('batch_info.id'))
     batch_info = db.relationship('BatchInfo', back_populates='serial_number_records')
 
+    # Indexes tuned to the hot query paths (check_batch, generate_report,
+    # query_serial_numbers, query_serial_numbers_v2). Existing databases pick
+    # these up through migrations.py.
+    __table_args__ = (
+        db.Index('ix_serial_number_record_batch_info_deleted', 'batch_info_id', 'is_deleted'),
+        db.Index('ix_serial_number_record_deleted_timestamp', 'is_deleted', 'ocr_timestamp'),
+        db.Index('ix_serial_number_record_deleted_recorded', 'is_deleted', 'recorded_sn', 'voided'),
+        db.Index('ix_serial_number_record_verified_sn', 'verified_sn'),
+        db.Index('ix_serial_number_record_batch_id', 'batch_id'),
+        db.Index('ix_serial_number_record_serial_number_extracted', 'serial_number_extracted'),
+        db.Index('ix_serial_number_record_uploaded_by', 'uploaded_by'),
+    )
+
 
 class BatchInfo(db.Model):  # Renamed for Python class naming convention
     id = db.Column(db.Integer, primary_key=True)
@@ -67,6 +80,18 @@ class BatchInfo(db.Model):  # Renamed for Python class naming convention
     last_scanned_item = db.Column(db.String(50))
     current_item_number = db.Column(db.Integer, default=0)
 
+    # Progress over the batch's non-deleted serial numbers, kept up to date
+    # by the CRUD routes (see batch_counters.py)
+    scanned_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    verified_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    recorded_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    voided_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    testing_selected_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    testing_passed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped with the counters on every write to the batch's records; report
+    # cache file names are derived from it
+    records_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     # Relationship to SerialNumberRecord
     serial_number_records = db.relationship('SerialNumberRecord', back_populates='batch_info')
 
@@ -84,3 +109,15 @@ class BatchReferences(db.Model):  # Renamed for Python class naming convention
     
     # Relationship to BatchInfo
     batch_info = db.relationship('BatchInfo', back_populates='batch_references')
+
+
+class OcrJob(db.Model):
+    # Background OCR request queued by /upload
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued / running / done / failed
+    image_file_name = db.Column(db.String(255))
+    result = db.Column(db.Text)  # JSON payload, same shape as the old synchronous /upload response
+    error = db.Column(db.Text)
+    submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime, index=True)
@@ -0,0 +1,135 @@
+# ocr_cache.py
+"""
+Cache of OCR results keyed by the content of the uploaded image.
+
+Operators often re-upload the same photo after a failed save or a page
+reload. Results are kept in a per-process LRU and, when OCR_CACHE_PATH is
+set, in a SQLite file shared by all gunicorn workers on the host.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class OcrResultCache:
+    def __init__(self):
+        self.max_entries = 1024
+        self.ttl = 86400
+        self.path = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._sets = 0
+        self.counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def init_app(self, app):
+        self.max_entries = app.config['OCR_CACHE_SIZE']
+        self.ttl = app.config['OCR_CACHE_TTL']
+        self.path = app.config['OCR_CACHE_PATH']
+        if self.path:
+            with self._connect() as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS ocr_cache "
+                    "(key TEXT PRIMARY KEY, payload TEXT NOT NULL, created REAL NOT NULL)"
+                )
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or bool(self.path)
+
+    @staticmethod
+    def key(img_bytes, *params):
+        """
+        Hashes the image bytes together with anything else that changes the
+        result, such as the engine name and preprocessing parameters.
+        """
+        digest = hashlib.blake2b(img_bytes, digest_size=20)
+        for param in params:
+            digest.update(b"\0" + str(param).encode())
+        return digest.hexdigest()
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                payload, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    self.counters["memory_hits"] += 1
+                    return payload
+                del self._entries[key]
+
+        if self.path:
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT payload FROM ocr_cache WHERE key = ? AND created > ?",
+                    (key, time.time() - self.ttl)
+                ).fetchone()
+            if row:
+                payload = json.loads(row[0])
+                self._remember(key, payload)
+                self._count("hits", "disk_hits")
+                return payload
+
+        self._count("misses")
+        return None
+
+    def _count(self, *names):
+        # Request threads look up the cache concurrently
+        with self._lock:
+            for name in names:
+                self.counters[name] += 1
+
+    def set(self, key, payload):
+        self._remember(key, payload)
+        if self.path:
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO ocr_cache (key, payload, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(payload), time.time())
+                )
+                with self._lock:
+                    self._sets += 1
+                    prune = self._sets % 100 == 0
+                if prune:
+                    connection.execute("DELETE FROM ocr_cache WHERE created <= ?", (time.time() - self.ttl,))
+
+    def _remember(self, key, payload):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (payload, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def metrics(self):
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else None,
+            "memory_entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "shared_path": self.path,
+        }
+
+
+ocr_cache = OcrResultCache()
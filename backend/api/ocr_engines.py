@@ -0,0 +1,219 @@
+# ocr_engines.py
+"""
+Pluggable OCR backends.
+
+The OCR pipeline in ocr_routes.py hands a preprocessed grayscale image to
+the engine selected by the OCR_ENGINE setting:
+
+- "google": Google Cloud Vision text detection (network, billed per image)
+- "tesseract": local Tesseract via pytesseract (in-process, no network)
+
+Engines are created once per app and build their clients lazily, so the
+app starts without Google credentials when they are not used, and without
+importing OpenCV or the Vision client library until the first image.
+"""
+import threading
+from collections import namedtuple
+from flask import current_app
+from .instrumentation import stage
+
+# Text found in one image. confidence_scores holds one value in [0, 1] per text
+# block; words holds the OcrWords in reading order, where the engine reports them.
+OcrResult = namedtuple('OcrResult', ['text', 'language', 'confidence_scores', 'words'], defaults=((),))
+
+# One word and its (x, y, width, height) box in the image sent to the engine
+OcrWord = namedtuple('OcrWord', ['text', 'box'])
+
+
+class OcrEngine:
+    """
+    Base class for OCR backends. Subclasses implement detect_text and may
+    override detect_text_batch when the backend can do better than a loop.
+    """
+    name = None
+
+    # True when the engine can work from the original encoded upload, so
+    # the pipeline may skip decoding entirely when no preprocessing is needed
+    accepts_encoded = False
+
+    def __init__(self, config):
+        self.config = config
+
+    def detect_text(self, image, encoded=None):
+        """
+        Returns an OcrResult for a grayscale numpy image, or for the encoded
+        image bytes when image is None. Raises RuntimeError if the backend
+        reports an error.
+        """
+        raise NotImplementedError
+
+    def detect_text_batch(self, images, encoded=None):
+        """
+        Returns one OcrResult or RuntimeError per image, in order. encoded,
+        if given, is a parallel list of encoded bytes used where an image
+        is None.
+        """
+        encoded = encoded or [None] * len(images)
+        results = []
+        for image, image_bytes in zip(images, encoded):
+            try:
+                results.append(self.detect_text(image, image_bytes))
+            except RuntimeError as e:
+                results.append(e)
+        return results
+
+
+class GoogleVisionEngine(OcrEngine):
+    name = 'google'
+    accepts_encoded = True
+
+    # Images per batch_annotate_images call (synchronous API limit)
+    batch_limit = 16
+
+    def __init__(self, config):
+        super().__init__(config)
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google.cloud import vision
+                    self._client = vision.ImageAnnotatorClient()
+        return self._client
+
+    @staticmethod
+    def _encode(image, encoded=None):
+        from google.cloud import vision
+        if image is None:
+            # Send the original upload as-is
+            return vision.Image(content=bytes(encoded))
+        import cv2
+        with stage('ocr', 'encode'):
+            _, buffer = cv2.imencode('.jpg', image)
+        return vision.Image(content=buffer.tobytes())
+
+    @staticmethod
+    def _to_result(response):
+        if response.error.message:
+            raise RuntimeError(response.error.message)
+
+        texts = response.text_annotations
+        confidence_scores = []
+        if response.full_text_annotation:
+            for page in response.full_text_annotation.pages:
+                for block in page.blocks:
+                    confidence_scores.append(block.confidence)
+
+        # Annotations after the first are single words with their bounding polygons
+        words = []
+        for annotation in texts[1:]:
+            xs = [vertex.x for vertex in annotation.bounding_poly.vertices]
+            ys = [vertex.y for vertex in annotation.bounding_poly.vertices]
+            if xs and ys:
+                words.append(OcrWord(annotation.description, (min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))))
+
+        return OcrResult(
+            text=texts[0].description if texts else "",
+            language=texts[0].locale if texts else None,
+            confidence_scores=confidence_scores,
+            words=words
+        )
+
+    def detect_text(self, image, encoded=None):
+        request_image = self._encode(image, encoded)
+        with stage('ocr', 'ocr_call'):
+            response = self.client.text_detection(image=request_image)
+        return self._to_result(response)
+
+    def detect_text_batch(self, images, encoded=None):
+        from google.cloud import vision
+        encoded = encoded or [None] * len(images)
+        features = [vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)]
+        results = []
+        for start in range(0, len(images), self.batch_limit):
+            annotate_requests = [
+                vision.AnnotateImageRequest(image=self._encode(image, image_bytes), features=features)
+                for image, image_bytes in zip(images[start:start + self.batch_limit],
+                                              encoded[start:start + self.batch_limit])
+            ]
+            with stage('ocr', 'ocr_call'):
+                batch_response = self.client.batch_annotate_images(requests=annotate_requests)
+            for response in batch_response.responses:
+                try:
+                    results.append(self._to_result(response))
+                except RuntimeError as e:
+                    results.append(e)
+        return results
+
+
+class TesseractEngine(OcrEngine):
+    """
+    Local engine for clean engraved serials. Needs the pytesseract package
+    and the tesseract binary.
+    """
+    name = 'tesseract'
+
+    def __init__(self, config):
+        super().__init__(config)
+        try:
+            import pytesseract
+        except ImportError:
+            raise RuntimeError("The tesseract OCR engine requires the pytesseract package")
+        self._pytesseract = pytesseract
+        self._tesseract_config = config.get('OCR_TESSERACT_CONFIG', '--psm 11')
+        self._language = config.get('OCR_TESSERACT_LANG', 'eng')
+
+    def detect_text(self, image, encoded=None):
+        if image is None:
+            from .image_processing import decode_grayscale
+            image = decode_grayscale(encoded, 0)
+        try:
+            with stage('ocr', 'ocr_call'):
+                data = self._pytesseract.image_to_data(
+                    image, lang=self._language, config=self._tesseract_config,
+                    output_type=self._pytesseract.Output.DICT
+                )
+        except self._pytesseract.TesseractError as e:
+            raise RuntimeError(str(e))
+
+        # Rebuild lines from the word boxes and average word confidence per block
+        lines = {}
+        block_confidences = {}
+        words = []
+        for word, conf, block, paragraph, line, left, top, width, height in zip(
+                data['text'], data['conf'], data['block_num'], data['par_num'], data['line_num'],
+                data['left'], data['top'], data['width'], data['height']):
+            word = word.strip()
+            if not word:
+                continue
+            lines.setdefault((block, paragraph, line), []).append(word)
+            block_confidences.setdefault(block, []).append(max(float(conf), 0) / 100)
+            words.append(OcrWord(word, (left, top, width, height)))
+
+        return OcrResult(
+            text="\n".join(" ".join(words) for words in lines.values()),
+            language=self._language,
+            confidence_scores=[sum(scores) / len(scores) for scores in block_confidences.values()],
+            words=words
+        )
+
+
+# Available engines by OCR_ENGINE name
+OCR_ENGINES = {
+    GoogleVisionEngine.name: GoogleVisionEngine,
+    TesseractEngine.name: TesseractEngine,
+}
+
+
+def init_app(app):
+    name = app.config['OCR_ENGINE']
+    if name not in OCR_ENGINES:
+        raise ValueError(f"Unknown OCR_ENGINE '{name}'. Expected one of: {', '.join(OCR_ENGINES)}")
+    app.extensions['ocr_engine'] = OCR_ENGINES[name](app.config)
+
+
+def get_engine():
+    return current_app.extensions['ocr_engine']
@@ -0,0 +1,220 @@
+# ocr_jobs.py
+"""
+Background queue for OCR work.
+
+/upload hands each image to a small pool of worker threads in the current
+process and returns a job id straight away, so slow Vision calls no longer
+hold a gunicorn worker for the whole request. Job state is kept in the
+ocr_job table, so any worker process can answer GET /ocr_jobs/<id>.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from flask import current_app
+from .extensions import db
+from .instrumentation import instrumentation
+from .models import OcrJob
+
+FINISHED_STATUSES = ('done', 'failed')
+
+
+class QueueFull(Exception):
+    """Raised when the queue is at capacity and the caller should retry later."""
+
+
+def job_to_dict(job):
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "image_file_name": job.image_file_name,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "submitted_at": job.submitted_at.isoformat() if job.submitted_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _percentiles(samples):
+    if not samples:
+        return {"p50": None, "p95": None, "max": None}
+    ordered = sorted(samples)
+    return {
+        "p50": round(ordered[len(ordered) // 2], 2),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+class OcrJobQueue:
+    """
+    Bounded in-process queue served by a fixed pool of daemon threads.
+
+    Threads are started on first use in each process, so the queue is safe
+    to create before gunicorn forks its workers.
+    """
+
+    def __init__(self):
+        self.workers = 2
+        self.max_queue = 32
+        self.job_ttl = 3600
+        self._pid = None
+        self._queue = None
+        self._lock = threading.Lock()
+        self._events = {}
+        self._last_purge = 0.0
+        self._reset_metrics()
+
+    def init_app(self, app):
+        self.workers = app.config['OCR_WORKERS']
+        self.max_queue = app.config['OCR_QUEUE_MAX']
+        self.job_ttl = app.config['OCR_JOB_TTL']
+
+    def _reset_metrics(self):
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._wait_ms = deque(maxlen=500)
+        self._run_ms = deque(maxlen=500)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # First use in this process (or after a fork): start a fresh pool
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._events = {}
+            self._reset_metrics()
+            for _ in range(self.workers):
+                threading.Thread(target=self._work, daemon=True).start()
+
+    def _count(self, name):
+        # Worker threads and request threads update the counters concurrently
+        with self._lock:
+            self.counters[name] += 1
+
+    def submit(self, func, *args, image_file_name=None):
+        """
+        Records a queued job and schedules func(*args) on the pool. The
+        return value of func must be JSON serializable; an exception marks
+        the job failed. Raises QueueFull when the queue is at capacity.
+        """
+        self._ensure_started()
+        if self._queue.full():
+            self._count("rejected")
+            raise QueueFull()
+
+        self._purge_expired()
+        job = OcrJob(id=uuid.uuid4().hex, status='queued', image_file_name=image_file_name,
+                     submitted_at=datetime.utcnow())
+        db.session.add(job)
+        db.session.commit()
+
+        event = threading.Event()
+        self._events[job.id] = event
+        app = current_app._get_current_object()
+        try:
+            self._queue.put_nowait((job.id, app, func, args, time.monotonic()))
+        except queue.Full:
+            self._events.pop(job.id, None)
+            db.session.delete(job)
+            db.session.commit()
+            self._count("rejected")
+            raise QueueFull()
+
+        self._count("submitted")
+        return job
+
+    def _work(self):
+        while True:
+            job_id, app, func, args, queued_at = self._queue.get()
+            started = time.monotonic()
+            self._wait_ms.append((started - queued_at) * 1000)
+            with app.app_context():
+                try:
+                    self._run(job_id, func, args)
+                except Exception:
+                    # The job's state could not be saved; log it and keep serving the queue
+                    app.logger.exception("OCR job %s could not be recorded", job_id)
+                    db.session.rollback()
+                    self._count("failed")
+                finally:
+                    db.session.remove()
+            self._run_ms.append((time.monotonic() - started) * 1000)
+            event = self._events.pop(job_id, None)
+            if event:
+                event.set()
+            self._queue.task_done()
+
+    def _run(self, job_id, func, args):
+        # Records the job as running, then its result or the error func raised
+        self._update(job_id, status='running', started_at=datetime.utcnow())
+        try:
+            with instrumentation.trace_job(f"OCR job {job_id}"):
+                result = func(*args)
+            self._update(job_id, status='done', result=json.dumps(result), finished_at=datetime.utcnow())
+            self._count("completed")
+        except Exception as e:
+            db.session.rollback()
+            self._update(job_id, status='failed', error=str(e), finished_at=datetime.utcnow())
+            self._count("failed")
+
+    def _update(self, job_id, **values):
+        db.session.execute(db.update(OcrJob).where(OcrJob.id == job_id).values(**values))
+        db.session.commit()
+
+    def _purge_expired(self):
+        # Finished jobs are only needed until the client has collected them. Jobs
+        # that never finished were lost with the worker that queued them.
+        if time.monotonic() - self._last_purge < 60:
+            return
+        self._last_purge = time.monotonic()
+        cutoff = datetime.utcnow() - timedelta(seconds=self.job_ttl)
+        db.session.execute(db.delete(OcrJob).where(db.or_(
+            OcrJob.finished_at < cutoff,
+            db.and_(OcrJob.finished_at.is_(None), OcrJob.submitted_at < cutoff)
+        )))
+        db.session.commit()
+
+    def get(self, job_id, wait=0):
+        """
+        Returns the job, waiting up to `wait` seconds for it to finish.
+        Jobs queued in this process are awaited on an event; jobs owned by
+        another worker process are polled from the database.
+        """
+        job = db.session.get(OcrJob, job_id)
+        if job is None or job.status in FINISHED_STATUSES or wait <= 0:
+            return job
+
+        event = self._events.get(job_id) if self._pid == os.getpid() else None
+        deadline = time.monotonic() + wait
+        while job.status not in FINISHED_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if event is not None:
+                event.wait(remaining)
+            else:
+                time.sleep(min(0.2, remaining))
+            db.session.refresh(job)
+        return job
+
+    def metrics(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "pid": os.getpid(),
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            **counters,
+            "queue_wait_ms": _percentiles(list(self._wait_ms)),
+            "processing_ms": _percentiles(list(self._run_ms)),
+        }
+
+
+ocr_queue = OcrJobQueue()
@@ -1,65 +1,103 @@
 import os
 import io
-import cv2
-from flask import Blueprint, request, jsonify, render_template
-from google.cloud import vision
-from google.cloud.vision_v1 import types
+from flask import Blueprint, request, jsonify, render_template, url_for, current_app
 from werkzeug.utils import secure_filename
-from PIL import Image
-import numpy as np
-import re
 from datetime import datetime
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from .ocr_jobs import ocr_queue, job_to_dict, QueueFull
+from .ocr_engines import get_engine
+from .ocr_cache import ocr_cache
+from .uploads import SpooledUpload
+from .ocr_variants import DEFAULT_VARIANT, variant_stats, run_variants, result_confidence
+from .serial_extraction import extract_serials
+from .models import BatchInfo
+from .extensions import db
+from .batch_index import batch_index
+from .instrumentation import stage
 
 # Define a blueprint
 ocr = Blueprint('ocr', __name__)
 
-# Set Google Cloud Vision client
-client = vision.ImageAnnotatorClient()
-
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
+# Longest a client may block on GET /ocr_jobs/<id>?wait=. Kept short: a
+# waiting request holds a sync gunicorn worker, so clients poll with backoff.
+MAX_JOB_WAIT_SECONDS = 1
+
+# Files accepted by /upload/batch
+MAX_BATCH_FILES = 64
+
+# An upload after header reading and preprocessing. base is the grayscale
+# image before equalization, used by the retry variants; image is None when
+# the original bytes in encoded are sent to the engine instead.
+PreparedImage = namedtuple('PreparedImage', ['metadata', 'image', 'encoded', 'base'])
+
 # Function to check allowed file type
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def isolate_serial_number(text):
+def isolate_serial_number(text, words=(), part_number=None):
     """
-    Extracts the serial number from the given text.
-
-    Prioritizes finding patterns with "S.N." followed by numbers, 
-    but falls back to extracting any sequence of digits if no "S.N." pattern is found.
+    Extracts the serial number from the given OCR output: the best ranked
+    candidate of extract_serials, or None if nothing looks like a serial.
     """
+    candidates = extract_serials(text, words, part_number, limit=1)
+    return candidates[0].serial if candidates else None
 
-    # First, try to find the "S.N." pattern followed by 7 digits
-    sn_pattern = r'(?:S/N|SN|S\.N\.)\s*(\d{7})'  # Matches "S.N." with any number of spaces and then 7 digits
-    match = re.search(sn_pattern, text, re.IGNORECASE)
-    if match:
-        return match.group(1)  # Return the captured group (the 7 digits)
-
-    # If the above pattern is not found, look for any 7-digit number
-    fallback_pattern = r'(\d{7})' 
-    match = re.search(fallback_pattern, text)
-    if match:
-        return match.group(1) 
 
-    # If no serial number is found, return None (or an appropriate message)
-    return 'None'  
-
-
-def preprocess_image(image):
+def preprocess_image(image, max_dimension=None, crop_roi=False, equalize=True):
     """
     Preprocess the image for better OCR:
-    - Convert to grayscale
+    - Convert to grayscale (if not already single-channel)
+    - Downscale so the longer side is at most max_dimension pixels
+    - Optionally crop to the region that looks like engraved text
     - Increase contrast using histogram equalization
     """
+    import cv2
+    from .image_processing import downscale, crop_to_text
+
     # Convert the image to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+    # Shrink large phone photos before any further work
+    gray = downscale(gray, max_dimension)
+
+    # Drop the background and unrelated markings around the serial
+    if crop_roi:
+        gray = crop_to_text(gray)
 
     # Increase contrast using histogram equalization
-    contrast_enhanced = cv2.equalizeHist(gray)
+    if equalize:
+        gray = cv2.equalizeHist(gray)
+
+    return gray
 
-    return contrast_enhanced
+
+def preprocess_options():
+    """
+    Preprocessing settings from the app config, read once per request so
+    they can be handed to threads without an app context.
+    """
+    return {
+        "max_dimension": current_app.config['OCR_MAX_DIMENSION'],
+        "crop_roi": current_app.config['OCR_CROP_ROI'],
+        "equalize": current_app.config['OCR_EQUALIZE'],
+        "retry_variants": current_app.config['OCR_RETRY_VARIANTS'],
+        "retry_confidence": current_app.config['OCR_RETRY_CONFIDENCE'],
+    }
+
+
+def preprocess_params():
+    """
+    Describes the configured preprocessing. It is part of the OCR cache key,
+    so cached results are not reused across different settings.
+    """
+    options = preprocess_options()
+    return (f"gray+max{options['max_dimension']}+roi{int(options['crop_roi'])}+eq{int(options['equalize'])}"
+            f"+retry{','.join(options['retry_variants'])}@{options['retry_confidence']}")
 
 
 # Route to serve the upload form
@@ -67,6 +105,263 @@ def preprocess_image(image):
 def index():
     return render_template('index.html')
 
+
+def prepare_image(buffer, options, accepts_encoded=False):
+    """
+    Reads and preprocesses an upload with a single decode. Returns a
+    PreparedImage; when the engine can take the original bytes and there is
+    nothing to change, those bytes are kept in place of the image.
+    """
+    # OpenCV and Pillow are imported on the first upload, not at startup
+    import cv2
+    from .image_processing import read_image_header, decode_grayscale
+
+    # Dimensions come from the header, so they are known before any decode
+    width, height, channels, _ = read_image_header(buffer)
+    metadata = {"image_width": width, "image_height": height, "image_channels": channels}
+    longest_side = max(width, height)
+    max_dimension = options["max_dimension"]
+
+    fits = not max_dimension or longest_side <= max_dimension
+    if accepts_encoded and fits and not options["crop_roi"] and not options["equalize"]:
+        # Nothing to change: hand the original bytes to the engine without decoding
+        return PreparedImage(metadata, None, bytes(buffer), None)
+
+    # Decode straight to grayscale, at reduced scale for large photos
+    with stage('ocr', 'decode'):
+        gray = decode_grayscale(buffer, longest_side, max_dimension)
+
+    with stage('ocr', 'preprocess'):
+        # Preprocess the image (downscale and crop), keeping it for the retry variants
+        base = preprocess_image(gray, max_dimension=max_dimension, crop_roi=options["crop_roi"], equalize=False)
+
+        # Increase contrast using histogram equalization
+        processed_img = cv2.equalizeHist(base) if options["equalize"] else base
+
+    return PreparedImage(metadata, processed_img, None, base)
+
+
+def has_serial(result, part_number=None):
+    return isolate_serial_number(result.text, result.words, part_number) is not None
+
+
+def retry_variants(engine, prepared, result, options, latency_ms, part_number=None):
+    """
+    Takes the engine result for the default preprocessing and, if it has no
+    serial number or low confidence, runs the configured retry variants in
+    parallel. Returns (variant name, OcrResult) for the best attempt: one
+    with a serial number first, then the highest mean block confidence.
+    """
+    found = has_serial(result, part_number)
+    variant_stats.record(DEFAULT_VARIANT, latency_ms, found)
+    names = options["retry_variants"]
+    if not names or (found and result_confidence(result) >= options["retry_confidence"]):
+        variant_stats.record_win(DEFAULT_VARIANT)
+        return DEFAULT_VARIANT, result
+
+    base = prepared.base
+    if base is None:
+        # The original bytes were sent as-is; decode them now
+        from .image_processing import decode_grayscale
+        metadata = prepared.metadata
+        longest_side = max(metadata["image_width"], metadata["image_height"])
+        with stage('ocr', 'decode'):
+            base = decode_grayscale(prepared.encoded, longest_side, options["max_dimension"])
+        with stage('ocr', 'preprocess'):
+            base = preprocess_image(base, max_dimension=options["max_dimension"], equalize=False)
+
+    attempts = [(DEFAULT_VARIANT, result)] + run_variants(
+        engine, base, names, lambda attempt: has_serial(attempt, part_number))
+    # max keeps the earliest of equal attempts, so the default wins ties
+    name, result = max(attempts, key=lambda attempt: (has_serial(attempt[1], part_number),
+                                                      result_confidence(attempt[1])))
+    variant_stats.record_win(name)
+    return name, result
+
+
+def build_ocr_result(result, metadata, image_size_bytes, filename, content_type, variant=DEFAULT_VARIANT,
+                     part_number=None):
+    """
+    Turns an engine OcrResult into the payload the frontend stores with the
+    serial number record.
+    """
+    # Rank the possible serial numbers, using the word boxes when the engine reports them
+    with stage('ocr', 'extract'):
+        candidates = extract_serials(result.text, result.words, part_number)
+
+    return {
+        "ocr_detected_text": result.text,
+        "serial_number_extracted": candidates[0].serial if candidates else None,  # Renamed for consistency
+        "serial_candidates": [candidate._asdict() for candidate in candidates],
+        "image_file_name": filename,  # Updated naming convention
+        "image_metadata": {
+            **metadata,
+            "image_size_bytes": image_size_bytes,  # Updated naming convention
+            "image_format": content_type  # Updated naming convention
+        },
+        "confidence_scores": result.confidence_scores,  # Pluralized for clarity
+        "ocr_language": result.language,  # Updated naming convention
+        "ocr_variant": variant,  # Preprocessing that produced this result
+        "ocr_timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # Updated naming convention
+    }
+
+
+def cache_key(buffer, part_number=None):
+    """
+    Cache key for an upload: its content plus everything that changes the
+    OCR result for the same bytes.
+    """
+    return ocr_cache.key(buffer, get_engine().name, preprocess_params(), part_number or '')
+
+
+def cached_result(key, filename, content_type):
+    """
+    Returns the cached payload for key with the per-upload fields filled in
+    for this request, or None.
+    """
+    payload = ocr_cache.get(key) if ocr_cache.enabled else None
+    if payload is None:
+        return None
+    return {
+        **payload,
+        "image_file_name": filename,
+        "image_metadata": {**payload["image_metadata"], "image_format": content_type},
+        "ocr_timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+def process_image(upload, key=None, part_number=None, batch_number=None):
+    """
+    Runs the OCR pipeline on a single SpooledUpload and releases it. Pass
+    the cache key when the caller has already looked it up, to skip a
+    second lookup, and batch_number to validate the serial against a batch.
+    """
+    engine = get_engine()
+    options = preprocess_options()
+    try:
+        with upload.buffer() as buffer:
+            if key is None:
+                key = cache_key(buffer, part_number)
+                cached = cached_result(key, upload.filename, upload.content_type)
+                if cached is not None:
+                    return with_batch_validation(cached, batch_number)
+            prepared = prepare_image(buffer, options, engine.accepts_encoded)
+    finally:
+        upload.discard()
+
+    started = time.monotonic()
+    result = engine.detect_text(prepared.image, prepared.encoded)
+    variant, result = retry_variants(engine, prepared, result, options, (time.monotonic() - started) * 1000,
+                                     part_number)
+    payload = build_ocr_result(result, prepared.metadata, upload.size, upload.filename, upload.content_type,
+                               variant, part_number)
+    if ocr_cache.enabled:
+        ocr_cache.set(key, payload)
+    return with_batch_validation(payload, batch_number)
+
+
+def _try_prepare(upload, options, accepts_encoded):
+    try:
+        with upload.buffer() as buffer:
+            return prepare_image(buffer, options, accepts_encoded), None
+    except Exception as e:
+        return None, str(e)
+
+
+def process_images(uploads, part_number=None, batch_number=None):
+    """
+    Runs the OCR pipeline on several SpooledUploads and releases them.
+    Images are preprocessed in parallel and handed to the engine as one
+    batch. Returns one payload per upload, in order; failed files carry an
+    "error".
+    """
+    engine = get_engine()
+    results = [None] * len(uploads)
+    keys = []
+    misses = []
+    try:
+        for index, upload in enumerate(uploads):
+            with upload.buffer() as buffer:
+                keys.append(cache_key(buffer, part_number))
+            results[index] = cached_result(keys[index], upload.filename, upload.content_type)
+            if results[index] is None:
+                misses.append(index)
+        if not misses:
+            return [with_batch_validation(result, batch_number) for result in results]
+
+        options = preprocess_options()
+        with ThreadPoolExecutor(max_workers=min(len(misses), os.cpu_count() or 1)) as pool:
+            prepared = dict(zip(misses, pool.map(
+                lambda index: _try_prepare(uploads[index], options, engine.accepts_encoded), misses
+            )))
+    finally:
+        for upload in uploads:
+            upload.discard()
+
+    pending = []
+    for index in misses:
+        _, error = prepared[index]
+        if error:
+            results[index] = {"image_file_name": uploads[index].filename, "error": error}
+        else:
+            pending.append(index)
+
+    started = time.monotonic()
+    detected = engine.detect_text_batch(
+        [prepared[index][0].image for index in pending],
+        [prepared[index][0].encoded for index in pending]
+    )
+    latency_ms = (time.monotonic() - started) * 1000 / max(len(pending), 1)
+    for index, result in zip(pending, detected):
+        upload = uploads[index]
+        if isinstance(result, Exception):
+            results[index] = {"image_file_name": upload.filename, "error": str(result)}
+        else:
+            variant, result = retry_variants(engine, prepared[index][0], result, options, latency_ms, part_number)
+            results[index] = build_ocr_result(result, prepared[index][0].metadata, upload.size,
+                                              upload.filename, upload.content_type, variant, part_number)
+            if ocr_cache.enabled:
+                ocr_cache.set(keys[index], results[index])
+
+    return [with_batch_validation(result, batch_number) for result in results]
+
+
+def request_batch():
+    """
+    Reads the optional part_number, batch_info_id and batch_number form
+    fields. Returns (part number whose serial patterns apply, batch number
+    to validate against); the part number defaults to the batch's. Raises
+    LookupError for an unknown batch_number.
+    """
+    part_number = request.form.get('part_number') or None
+    batch_number = request.form.get('batch_number') or None
+    if batch_number:
+        batch = batch_index.get(batch_number)
+        if batch is None:
+            raise LookupError(batch_number)
+        part_number = part_number or batch.part_number
+    batch_info_id = request.form.get('batch_info_id', type=int)
+    if not part_number and batch_info_id:
+        part_number = db.session.execute(
+            db.select(BatchInfo.part_number).where(BatchInfo.id == batch_info_id)
+        ).scalar()
+    return part_number or None, batch_number
+
+
+def with_batch_validation(payload, batch_number):
+    """
+    Adds duplicate, range and next-expected hints for batch_number to an
+    OCR payload. The hints are not cached with the payload.
+    """
+    if batch_number is None or "error" in payload:
+        return payload
+    batch = batch_index.get(batch_number)
+    if batch is None:
+        return payload
+    return {**payload, "batch_validation": batch.check(payload["serial_number_extracted"])}
+
+
+# Queue an image for OCR and return the job id immediately
 @ocr.route('/upload', methods=['POST'])
 def upload_image():
     if 'file' not in request.files:
@@ -77,58 +372,104 @@ def upload_image():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
 
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        img_bytes = file.read()
-
-        # Convert the image bytes into an OpenCV image
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        # Preprocess the image (greyscale and contrast enhancement)
-        processed_img = preprocess_image(img)
-
-        # Convert the processed image back to bytes to send to Google Vision API
-        _, buffer = cv2.imencode('.jpg', processed_img)
-        processed_img_bytes = buffer.tobytes()
-
-        # Convert the processed image to a format for Google Vision API
-        image = vision.Image(content=processed_img_bytes)
-
-        # Call the Google Vision API
-        response = client.text_detection(image=image)
-        texts = response.text_annotations
-
-        if response.error.message:
-            return jsonify({"error": response.error.message}), 500
-
-        # Get the detected text
-        detected_text = texts[0].description if texts else ""
-
-        # Isolate the serial number from the detected text
-        serial_number = isolate_serial_number(detected_text)
-
-        confidence_scores = []
-        if response.full_text_annotation:
-            for page in response.full_text_annotation.pages:
-                for block in page.blocks:
-                    confidence_scores.append(block.confidence)
-
-        data = {
-            "ocr_detected_text": detected_text,
-            "serial_number_extracted": serial_number,  # Renamed for consistency
-            "image_file_name": filename,  # Updated naming convention
-            "image_metadata": {
-                "image_width": img.shape[1],  # Updated naming convention
-                "image_height": img.shape[0],  # Updated naming convention
-                "image_channels": img.shape[2],  # Updated naming convention
-                "image_size_bytes": len(img_bytes),  # Updated naming convention
-                "image_format": file.content_type  # Updated naming convention
-            },
-            "confidence_scores": confidence_scores,  # Pluralized for clarity
-            "ocr_language": texts[0].locale if texts else None,  # Updated naming convention
-            "ocr_timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # Updated naming convention
-        }
-
-
-        return jsonify(data), 200 
+    if not allowed_file(file.filename):
+        return jsonify({"error": "File type not allowed"}), 400
+
+    try:
+        part_number, batch_number = request_batch()
+    except LookupError:
+        return jsonify({"error": "Batch not found"}), 404
+
+    upload = SpooledUpload(file, secure_filename(file.filename), current_app.config['OCR_SPOOL_THRESHOLD'])
+
+    # Repeat uploads are answered from the cache without queueing a job
+    with upload.buffer() as buffer:
+        key = cache_key(buffer, part_number)
+    cached = cached_result(key, upload.filename, upload.content_type)
+    if cached is not None:
+        upload.discard()
+        return jsonify({"job_id": None, "status": "done", "cached": True,
+                        "result": with_batch_validation(cached, batch_number)}), 200
+
+    try:
+        job = ocr_queue.submit(process_image, upload, key, part_number, batch_number,
+                               image_file_name=upload.filename)
+    except QueueFull:
+        upload.discard()
+        return jsonify({"error": "OCR queue is full, please retry shortly"}), 503, {"Retry-After": "2"}
+
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for('ocr.get_ocr_job', job_id=job.id)
+    }), 202
+
+
+# Queue several images for OCR as one job
+@ocr.route('/upload/batch', methods=['POST'])
+def upload_images():
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({"error": "No files part in the request"}), 400
+    if len(files) > MAX_BATCH_FILES:
+        return jsonify({"error": f"At most {MAX_BATCH_FILES} files may be uploaded at once"}), 400
+
+    rejected = [file.filename for file in files if not allowed_file(file.filename)]
+    if rejected:
+        return jsonify({"error": "File type not allowed", "files": rejected}), 400
+
+    try:
+        part_number, batch_number = request_batch()
+    except LookupError:
+        return jsonify({"error": "Batch not found"}), 404
+
+    spool_threshold = current_app.config['OCR_SPOOL_THRESHOLD']
+    uploads = [SpooledUpload(file, secure_filename(file.filename), spool_threshold) for file in files]
+
+    try:
+        job = ocr_queue.submit(process_images, uploads, part_number, batch_number,
+                               image_file_name=f"{len(uploads)} files")
+    except QueueFull:
+        for upload in uploads:
+            upload.discard()
+        return jsonify({"error": "OCR queue is full, please retry shortly"}), 503, {"Retry-After": "2"}
+
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for('ocr.get_ocr_job', job_id=job.id)
+    }), 202
+
+
+# Report queue depth and latency for this worker process
+@ocr.route('/ocr_jobs/metrics', methods=['GET'])
+def ocr_job_metrics():
+    return jsonify(ocr_queue.metrics()), 200
+
+
+# Report OCR result cache hit and miss counters for this worker process
+@ocr.route('/ocr_cache/metrics', methods=['GET'])
+def ocr_cache_metrics():
+    return jsonify(ocr_cache.metrics()), 200
+
+
+# Report per-variant attempts, hit rates and latency for this worker process
+@ocr.route('/ocr_variants/metrics', methods=['GET'])
+def ocr_variant_metrics():
+    return jsonify(variant_stats.metrics()), 200
+
+
+# Report per-batch serial index hits and rebuilds for this worker process
+@ocr.route('/ocr_batch_index/metrics', methods=['GET'])
+def ocr_batch_index_metrics():
+    return jsonify(batch_index.metrics()), 200
+
+
+# Fetch an OCR job, optionally waiting briefly for it to finish
+@ocr.route('/ocr_jobs/<job_id>', methods=['GET'])
+def get_ocr_job(job_id):
+    wait = min(request.args.get('wait', 0, type=float), MAX_JOB_WAIT_SECONDS)
+    job = ocr_queue.get(job_id, wait=wait)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_to_dict(job)), 200
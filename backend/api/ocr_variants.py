@@ -0,0 +1,102 @@
+# ocr_variants.py
+"""
+Fallback preprocessing for photos the default pipeline cannot read.
+
+When the equalized image yields no serial number, or its text blocks are
+read with low confidence, the variants listed in OCR_RETRY_VARIANTS are run
+in parallel and the most confident result that contains a serial wins.
+Attempts, hits, wins and latency are counted per variant in each process,
+so the list can be reordered or trimmed from GET /ocr_variants/metrics.
+
+Every variant run is one more engine call. On Cloud Vision each is a billed
+request, so by default the google engine runs no variants, and when some
+are configured it only retries photos with no serial number.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .ocr_jobs import _percentiles
+
+# The first attempt, made with the configured preprocessing
+DEFAULT_VARIANT = 'default'
+
+# Retry variants by OCR_RETRY_VARIANTS name: functions of image_processing,
+# which is imported on first use. Each takes the grayscale image after
+# downscaling and cropping, before histogram equalization.
+VARIANTS = ('clahe', 'adaptive_threshold', 'deskew', 'invert')
+
+
+def result_confidence(result):
+    """
+    Mean block confidence of an OcrResult; 0 when no blocks were found.
+    """
+    scores = result.confidence_scores
+    return sum(scores) / len(scores) if scores else 0.0
+
+
+class VariantStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._latency_ms = {}
+
+    def _entry(self, name):
+        if name not in self._counters:
+            self._counters[name] = {"attempts": 0, "hits": 0, "wins": 0}
+            self._latency_ms[name] = deque(maxlen=500)
+        return self._counters[name]
+
+    def record(self, name, latency_ms, hit):
+        with self._lock:
+            entry = self._entry(name)
+            entry["attempts"] += 1
+            entry["hits"] += int(hit)
+            self._latency_ms[name].append(latency_ms)
+
+    def record_win(self, name):
+        with self._lock:
+            self._entry(name)["wins"] += 1
+
+    def metrics(self):
+        with self._lock:
+            return {
+                name: {
+                    **counters,
+                    "hit_rate": round(counters["hits"] / counters["attempts"], 4) if counters["attempts"] else None,
+                    "latency_ms": _percentiles(list(self._latency_ms[name])),
+                }
+                for name, counters in self._counters.items()
+            }
+
+
+variant_stats = VariantStats()
+
+
+def run_variants(engine, base, names, has_serial):
+    """
+    Runs each named variant of the grayscale image base through engine in
+    parallel. Returns (name, OcrResult) for every variant that succeeded,
+    in the order given.
+    """
+    import cv2
+    from . import image_processing
+
+    def attempt(name):
+        started = time.monotonic()
+        try:
+            result = engine.detect_text(getattr(image_processing, name)(base))
+        except (RuntimeError, cv2.error):
+            variant_stats.record(name, (time.monotonic() - started) * 1000, False)
+            return None
+        variant_stats.record(name, (time.monotonic() - started) * 1000, has_serial(result))
+        return name, result
+
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        return [outcome for outcome in pool.map(attempt, names) if outcome is not None]
+
+
+def init_app(app):
+    unknown = [name for name in app.config['OCR_RETRY_VARIANTS'] if name not in VARIANTS]
+    if unknown:
+        raise ValueError(f"Unknown OCR_RETRY_VARIANTS {', '.join(unknown)}. Expected any of: {', '.join(VARIANTS)}")
@@ -0,0 +1,205 @@
+# report_cache.py
+"""
+Disk cache and background builder for batch label reports.
+
+A finished report is stored as
+REPORT_CACHE_DIR/batch-<id>-<layout>-<version>.<format>. The version is a
+digest of the batch's records_version, the report's title, layout and
+format. Every write to a batch's records bumps records_version, so it gives
+a new file name, while re-downloads of an unchanged batch are served
+straight from disk by any worker without reading its serials. Large PDF reports are rendered on a process pool, and very large ones
+are built in the background while the client polls.
+
+Background builds are claimed with a <report>.building marker file created
+exclusively, so however many workers the client's polls reach, each report
+is built once. A failed build leaves its error in <report>.error for the
+next poll to collect.
+"""
+import glob
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from .label_report import REPORT_FORMATS, write_label_pdf_parallel
+
+# Age after which a .building marker is taken to belong to a worker that died
+STALE_BUILD_SECONDS = 15 * 60
+
+
+class ReportCache:
+    def __init__(self):
+        self.directory = None
+        self.workers = 1
+        self.parallel_min_labels = 2000
+        self.async_min_labels = 10000
+        self._pid = None
+        self._pool = None
+        self._builder = None
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "built": 0, "failed": 0}
+
+    def init_app(self, app):
+        self.directory = app.config['REPORT_CACHE_DIR'] or os.path.join(app.instance_path, 'report_cache')
+        self.workers = app.config['REPORT_WORKERS']
+        self.parallel_min_labels = app.config['REPORT_PARALLEL_MIN_LABELS']
+        self.async_min_labels = app.config['REPORT_ASYNC_MIN_LABELS']
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # First use in this process (or after a fork): start fresh pools.
+            # Report workers are spawned so they never inherit the OCR threads.
+            self._pid = os.getpid()
+            self._builder = ThreadPoolExecutor(max_workers=1)
+            self._pool = None
+            if self.workers > 1:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+
+    @staticmethod
+    def version(batch, title, layout, report_format):
+        """
+        Version stamp of a report on a BatchInfo: a digest of the batch's
+        records_version and the report's title, layout geometry and format.
+        """
+        stamp = f"{batch.records_version}\n{title}\n{layout!r}\n{report_format}\n"
+        return hashlib.blake2b(stamp.encode(), digest_size=12).hexdigest()
+
+    def path(self, batch_info_id, version, layout, report_format, pattern=False):
+        """
+        Path of a report in the cache; with pattern=True, a glob matching
+        every version of it.
+        """
+        version = '[0-9a-f]' * len(version) if pattern else version
+        extension = REPORT_FORMATS[report_format].extension
+        return os.path.join(self.directory, f"batch-{batch_info_id}-{layout.name}-{version}.{extension}")
+
+    def lookup(self, batch_info_id, version, layout, report_format):
+        """
+        Returns the path of the cached report, or None.
+        """
+        path = self.path(batch_info_id, version, layout, report_format)
+        if os.path.exists(path):
+            self._count("hits")
+            return path
+        self._count("misses")
+        return None
+
+    def _count(self, name):
+        # Request threads and build threads update the counters concurrently
+        with self._lock:
+            self.counters[name] += 1
+
+    def build(self, batch_info_id, version, serials, title, layout, report_format, count=None):
+        """
+        Renders the report into the cache and returns its path. serials may
+        be any iterable; it is only materialized for a parallel PDF render,
+        which count (the number of serials, when known) decides. Older
+        versions of the batch's report in the same layout and format are
+        removed.
+        """
+        self._ensure_started()
+        path = self.path(batch_info_id, version, layout, report_format)
+        spool = tempfile.NamedTemporaryFile(dir=self.directory, prefix='.building-', delete=False)
+        try:
+            with spool:
+                if count is None and isinstance(serials, list):
+                    count = len(serials)
+                if report_format == 'pdf' and self._pool is not None and count is not None \
+                        and count >= self.parallel_min_labels:
+                    write_label_pdf_parallel(list(serials), spool, title, self._pool, self.workers, layout)
+                else:
+                    REPORT_FORMATS[report_format].write(serials, spool, title, layout)
+            # Readers see either the old state or the complete file
+            os.replace(spool.name, path)
+        except Exception:
+            os.remove(spool.name)
+            self._count("failed")
+            raise
+
+        pattern = self.path(batch_info_id, version, layout, report_format, pattern=True)
+        for stale in glob.glob(pattern) + glob.glob(pattern + '.error'):
+            if not stale.startswith(path):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+        self._count("built")
+        return path
+
+    def build_async(self, batch_info_id, version, serials, title, layout, report_format):
+        """
+        Starts building the report in the background unless a worker has
+        already claimed it.
+        """
+        self._ensure_started()
+        path = self.path(batch_info_id, version, layout, report_format)
+        if not self._claim(path):
+            return
+        if os.path.exists(path):
+            # Another worker finished it since the caller's lookup
+            os.remove(path + '.building')
+            return
+        self._builder.submit(self._build_claimed, path, batch_info_id, version, list(serials), title, layout,
+                             report_format)
+
+    @staticmethod
+    def _claim(path):
+        """
+        Creates the .building marker of a report. Returns False when another
+        worker holds it, unless it has gone stale.
+        """
+        marker = path + '.building'
+        for _ in range(2):
+            try:
+                os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(marker) < STALE_BUILD_SECONDS:
+                        return False
+                    os.remove(marker)
+                except FileNotFoundError:
+                    pass
+        return False
+
+    def _build_claimed(self, path, *args):
+        try:
+            self.build(*args)
+        except Exception as e:
+            with open(path + '.error', 'w') as error_file:
+                error_file.write(str(e) or type(e).__name__)
+        finally:
+            os.remove(path + '.building')
+
+    def failure(self, batch_info_id, version, layout, report_format):
+        """
+        Returns the error of a failed background build of this report and
+        forgets it, or None.
+        """
+        error_path = self.path(batch_info_id, version, layout, report_format) + '.error'
+        try:
+            with open(error_path) as error_file:
+                error = error_file.read()
+            os.remove(error_path)
+        except FileNotFoundError:
+            return None
+        return error
+
+    def metrics(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "pending": len(glob.glob(os.path.join(self.directory, '*.building'))),
+            "workers": self.workers,
+            "directory": self.directory,
+        }
+
+
+report_cache = ReportCache()
@@ -1,22 +1,31 @@
 from flask import send_file, jsonify, request, Blueprint
-import io
-from reportlab.lib.pagesizes import letter  # Using letter size for more space
-from reportlab.pdfgen import canvas
-from reportlab.lib import utils
-from barcode.codex import Code128
-from barcode.writer import ImageWriter
-from PIL import Image
 from .models import SerialNumberRecord, BatchInfo
-from .crud_routes_v3 import serial_numbers_schema
+from .extensions import db
+from .label_layouts import label_layouts
+from .label_report import REPORT_FORMATS
+from .report_cache import report_cache
+from .instrumentation import stage
 
 reports = Blueprint('reports', __name__)
 
+# Serials fetched per round trip while drawing a report
+REPORT_BATCH_SIZE = 1000
+
 @reports.route('/serial_numbers/report', methods=['GET'])
 def generate_report():
     batch_id = str(request.args.get('batch_id'))
     if not batch_id:
         return jsonify({"error": "batch_id is required"}), 400
 
+    # Label layout and output format, e.g. ?layout=thermal-2x1&format=zpl
+    report_format = request.args.get('format', 'pdf').lower()
+    if report_format not in REPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(REPORT_FORMATS)}"}), 400
+    try:
+        layout = label_layouts.get(request.args.get('layout'))
+    except KeyError:
+        return jsonify({"error": f"Unknown label layout {request.args.get('layout')}"}), 400
+
     try:
         # Query the batch record first to get the batch_info_id
         batch_record = BatchInfo.query.filter_by(batch_number=batch_id).first()
@@ -24,80 +33,59 @@ def generate_report():
         if not batch_record:
             return jsonify({"message": "Batch not found."}), 404
 
-        # Query for serial numbers associated with the batch using batch_info_id
-        records = SerialNumberRecord.query.filter(
+        # Only the serial is printed, so only that column is selected, streamed in order
+        serial_query = db.select(SerialNumberRecord.verified_sn).where(
             SerialNumberRecord.batch_info_id == batch_record.id,
-            SerialNumberRecord.is_deleted == False
-        ).all()
-        
-        data = serial_numbers_schema.dump(records)
-
-        # Prepare a PDF file with letter page size
-        output = io.BytesIO()
-        pdf = canvas.Canvas(output, pagesize=letter)
-        width, height = letter
-        pdf.setTitle(f"Batch {batch_id} Report")
-
-        # Desired barcode dimensions in points (2 inches by 1 inch)
-        barcode_width = 2 * 72  # 2 inches in points
-        barcode_height = 1 * 72  # 1 inch in points
-
-        # Grid configuration: 4 columns, 5 rows per page
-        columns = 3
-        rows_per_page = 8
-        x_margin = 50  # Margin from left
-        y_margin = height - 100  # Start margin from the top
-        x_spacing = (width - 2 * x_margin - columns * barcode_width) / (columns - 1)
-        y_spacing = 50  # Space between rows
-
-        # Track positions in the grid
-        column = 0
-        row = 0
-
-        for sn in data:
-            serial_number = sn['verified_sn']
-
-            # Calculate the position for this barcode
-            x_position = x_margin + column * (barcode_width + x_spacing)
-            y_position = y_margin - row * (barcode_height + y_spacing)
-
-            # Create barcode image in memory
-            barcode = Code128(serial_number, writer=ImageWriter())
-            buffer = io.BytesIO()
-            barcode.write(buffer)
-            buffer.seek(0)
-            barcode_image = Image.open(buffer)
-
-            # Convert the barcode image to RGB
-            barcode_image = barcode_image.convert("RGB")
-            image_buffer = io.BytesIO()
-            barcode_image.save(image_buffer, format='PNG')
-            image_buffer.seek(0)
-
-            # Use reportlab's image utils to convert the buffer into an image object
-            image = utils.ImageReader(image_buffer)
-
-            # Add barcode image to the PDF at the calculated position
-            pdf.drawImage(image, x_position, y_position, width=barcode_width, height=barcode_height)
-
-            # Move to the next position in the grid
-            column += 1
-            if column == columns:
-                column = 0
-                row += 1
-
-            # If we've filled all rows, start a new page
-            if row == rows_per_page:
-                pdf.showPage()  # Start a new page
-                row = 0
-                column = 0
-
-        # Finalize the PDF
-        pdf.save()
-        output.seek(0)
-
-        # Send the PDF as a downloadable file
-        return send_file(output, download_name=f'Batch_{batch_id}_Report.pdf', as_attachment=True)
+            SerialNumberRecord.is_deleted == False,
+            SerialNumberRecord.verified_sn.isnot(None)
+        ).order_by(SerialNumberRecord.id)
+
+        def stream_serials():
+            return db.session.execute(serial_query.execution_options(yield_per=REPORT_BATCH_SIZE)).scalars()
+
+        title = f"Batch {batch_id} Report"
+
+        # Reports of unchanged batches are served from the disk cache
+        version = report_cache.version(batch_record, title, layout, report_format)
+        path = report_cache.lookup(batch_record.id, version, layout, report_format)
+        if path is None:
+            error = report_cache.failure(batch_record.id, version, layout, report_format)
+            if error is not None:
+                return jsonify({"error": f"Report generation failed: {error}"}), 500
+
+            with stage('report', 'query'):
+                count = db.session.execute(
+                    db.select(db.func.count()).select_from(serial_query.order_by(None).subquery())
+                ).scalar()
+
+            # Very large reports are built in the background; the client polls this URL
+            build_async = request.args.get('async', 'false').lower() == 'true'
+            if build_async or count >= report_cache.async_min_labels:
+                report_cache.build_async(batch_record.id, version, list(stream_serials()), title, layout, report_format)
+                return jsonify({
+                    "status": "generating",
+                    "batch_id": batch_id,
+                    "labels": count
+                }), 202, {"Retry-After": "2"}
+
+            path = report_cache.build(batch_record.id, version, stream_serials(), title, layout, report_format, count)
+
+        # Send the report as a downloadable file, streamed from disk in chunks
+        output = REPORT_FORMATS[report_format]
+        return send_file(path, mimetype=output.mimetype, as_attachment=True,
+                         download_name=f'Batch_{batch_id}_Report.{output.extension}')
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+# Report cache counters for this worker process
+@reports.route('/serial_numbers/report/metrics', methods=['GET'])
+def report_metrics():
+    return jsonify({"reports": report_cache.metrics()}), 200
+
+
+# Label layouts the report can be printed in
+@reports.route('/serial_numbers/report/layouts', methods=['GET'])
+def report_layouts():
+    return jsonify({"layouts": label_layouts.describe(), "formats": list(REPORT_FORMATS)}), 200
@@ -0,0 +1,180 @@
+# serial_extraction.py
+"""
+Finds serial numbers in OCR output.
+
+Patterns are compiled once into a registry. The default patterns cover the
+labelled ("S/N 1234567") and bare 7-digit serials and prefixed serials
+such as CV102500001; part numbers can add their own through the JSON file
+named by OCR_SERIAL_PATTERNS:
+
+    {"CV-1025": [{"name": "cv1025", "regex": "CV1025\\d{5}", "score": 2.0}]}
+
+When the engine reports word boxes, text is rebuilt line by line from the
+words so each candidate carries the box it was read from.
+"""
+import json
+import re
+import threading
+from collections import namedtuple
+
+# A compiled pattern. The serial is group 1 if the regex has groups, else the whole match.
+SerialPattern = namedtuple('SerialPattern', ['name', 'regex', 'score'])
+
+# A possible serial number. line is the index of the text line it was read
+# from and start/end are offsets into that line; bounding_box is
+# (x, y, width, height) in the image sent to OCR, or None without word boxes.
+SerialCandidate = namedtuple('SerialCandidate', ['serial', 'score', 'pattern', 'line', 'start', 'end',
+                                                 'bounding_box'])
+
+DEFAULT_PATTERNS = (
+    ('labelled', r'(?:S/N|SN|S\.N\.)\s*[:#]?\s*([A-Z]{0,4}\d{5,12})', 1.0),
+    ('prefixed', r'(?<![A-Z0-9])([A-Z]{1,4}\d{6,12})(?![A-Z0-9])', 0.6),
+    ('seven_digit', r'(?<!\d)(\d{7})(?!\d)', 0.5),
+)
+
+# Score multiplier for serials read across words that OCR split apart
+JOINED_WORDS_FACTOR = 0.8
+
+
+def _compile(patterns):
+    return tuple(SerialPattern(name, re.compile(regex, re.IGNORECASE), float(score))
+                 for name, regex, score in patterns)
+
+
+class SerialPatternRegistry:
+    """
+    Precompiled serial patterns, the defaults plus any registered for a
+    part number. Part-specific patterns are tried before the defaults.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._defaults = _compile(DEFAULT_PATTERNS)
+        self._by_part = {}
+
+    def register(self, part_number, patterns):
+        """
+        Adds (name, regex, score) patterns for part_number. Raises
+        re.error for an invalid regex.
+        """
+        compiled = _compile(patterns)
+        with self._lock:
+            self._by_part[part_number] = self._by_part.get(part_number, ()) + compiled
+
+    def load(self, path):
+        with open(path) as patterns_file:
+            for part_number, patterns in json.load(patterns_file).items():
+                self.register(part_number, [
+                    (pattern['name'], pattern['regex'], pattern.get('score', 1.0)) for pattern in patterns
+                ])
+
+    def patterns_for(self, part_number=None):
+        return self._by_part.get(part_number, ()) + self._defaults
+
+    def part_numbers(self):
+        return sorted(self._by_part)
+
+
+serial_patterns = SerialPatternRegistry()
+
+
+def _box_union(boxes):
+    left = min(x for x, _, _, _ in boxes)
+    top = min(y for _, y, _, _ in boxes)
+    right = max(x + w for x, _, w, _ in boxes)
+    bottom = max(y + h for _, y, _, h in boxes)
+    return left, top, right - left, bottom - top
+
+
+def _group_lines(words):
+    """
+    Groups OcrWords into lines: a word starts a new line when it lies left
+    of the previous word or its vertical center is outside that word's box.
+    """
+    lines = []
+    previous = None
+    for word in words:
+        if not word.text:
+            continue
+        x, y, _, height = word.box
+        if previous is not None:
+            prev_x, prev_y, _, prev_height = previous.box
+            center = y + height / 2
+            if x >= prev_x and prev_y <= center <= prev_y + prev_height:
+                lines[-1].append(word)
+                previous = word
+                continue
+        lines.append([word])
+        previous = word
+    return lines
+
+
+def _join(line, compact):
+    """
+    Joins a line of words with spaces, or in compact mode with no space
+    between neighbouring alphanumeric words. Returns (text, spans) where
+    spans holds the (start, end, box) of each word in text.
+    """
+    parts = []
+    spans = []
+    position = 0
+    for index, word in enumerate(line):
+        if index:
+            separator = '' if compact and word.text.isalnum() and line[index - 1].text.isalnum() else ' '
+            parts.append(separator)
+            position += len(separator)
+        parts.append(word.text)
+        spans.append((position, position + len(word.text), word.box))
+        position += len(word.text)
+    return ''.join(parts), spans
+
+
+def _line_texts(words):
+    """
+    Yields (line index, text, spans, factor) per line of words: once joined
+    with spaces and once compacted, for serials OCR split into several words.
+    """
+    for index, line in enumerate(_group_lines(words)):
+        spaced, spans = _join(line, compact=False)
+        yield index, spaced, spans, 1.0
+        compacted, compact_spans = _join(line, compact=True)
+        if compacted != spaced:
+            yield index, compacted, compact_spans, JOINED_WORDS_FACTOR
+
+
+def extract_serials(text, words=(), part_number=None, limit=5):
+    """
+    Returns up to limit SerialCandidates found in the OCR output, best
+    first. Candidates are ranked by pattern score, then by reading order.
+    words, if given, is a list of OcrWords and is used instead of text.
+    """
+    if words:
+        sources = _line_texts(words)
+    else:
+        sources = ((index, line, None, 1.0) for index, line in enumerate(text.splitlines()))
+
+    best = {}
+    order = 0
+    for line, source, spans, factor in sources:
+        for pattern in serial_patterns.patterns_for(part_number):
+            for match in pattern.regex.finditer(source):
+                group = 1 if pattern.regex.groups else 0
+                serial = match.group(group).upper()
+                start, end = match.span(group)
+                box = None
+                if spans:
+                    boxes = [span_box for span_start, span_end, span_box in spans
+                             if span_start < end and start < span_end]
+                    box = _box_union(boxes) if boxes else None
+                score = pattern.score * factor
+                order += 1
+                if serial not in best or score > best[serial][0].score:
+                    best[serial] = (SerialCandidate(serial, score, pattern.name, line, start, end, box), order)
+
+    ranked = sorted(best.values(), key=lambda entry: (-entry[0].score, entry[1]))
+    return [candidate for candidate, _ in ranked[:limit]]
+
+
+def init_app(app):
+    if app.config['OCR_SERIAL_PATTERNS']:
+        serial_patterns.load(app.config['OCR_SERIAL_PATTERNS'])
@@ -0,0 +1,65 @@
+# uploads.py
+"""
+Uploaded images held for background OCR.
+
+Small uploads stay in memory. Larger ones are copied to a temporary file in
+chunks and memory-mapped when read, so a 12 MP photo is never held as a
+second bytes object in the worker's heap while it waits in the OCR queue.
+"""
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+
+class SpooledUpload:
+    def __init__(self, file_storage, filename, spool_threshold):
+        self.filename = filename
+        self.content_type = file_storage.content_type
+        self._data = None
+        self.path = None
+
+        stream = file_storage.stream
+        stream.seek(0, os.SEEK_END)
+        self.size = stream.tell()
+        stream.seek(0)
+
+        if self.size <= spool_threshold:
+            self._data = stream.read()
+        else:
+            with tempfile.NamedTemporaryFile(prefix='ocr-upload-', delete=False) as spool:
+                shutil.copyfileobj(stream, spool, 1024 * 1024)
+                self.path = spool.name
+
+    @contextmanager
+    def buffer(self):
+        """
+        Yields the upload as a bytes-like object: the bytes themselves, or a
+        read-only mmap of the spool file. Views taken from it must not
+        outlive the block.
+        """
+        if self.path is None:
+            yield self._data
+            return
+        with open(self.path, 'rb') as spool:
+            if self.size == 0:
+                yield b""
+                return
+            mapped = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+
+    def discard(self):
+        """
+        Releases the upload once it has been processed.
+        """
+        self._data = None
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
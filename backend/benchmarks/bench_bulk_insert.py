@@ -0,0 +1,143 @@
+"""
+Time of POST /serial_numbers/bulk for a large upload, and how much of it is
+validation.
+
+Each run builds a fresh app on a temporary SQLite database and posts
+--rows records through the test client. It reports the medians of:
+
+- request: the whole request, including the chunked INSERTs and commit
+- loader: SerialNumberRowLoader.load() on the same payload, which the
+  endpoint validates with
+- schema: SerialNumberRecordSchema(many=True).load() on the payload, the
+  marshmallow validation the loader replaced
+
+The medians are compared against the baseline file; --save-baseline
+replaces it. The committed baselines/bulk_insert.json was recorded with the
+defaults on a single-CPU Linux host; re-record it on the machine that runs
+the comparisons.
+
+Usage (from backend/):
+    python -m benchmarks.bench_bulk_insert
+    python -m benchmarks.bench_bulk_insert --rows 50000 --runs 3
+    python -m benchmarks.bench_bulk_insert --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'bulk_insert.json')
+
+TIMINGS = ("request_s", "loader_s", "schema_s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000, help='records per upload')
+    parser.add_argument('--runs', type=int, default=5, help='uploads, each to a fresh database')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='results file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.20, help='relative slowdown reported as a regression')
+    return parser.parse_args()
+
+
+def payload(rows, run):
+    """
+    Records as a scanning station uploads them, with serials unique to the
+    run.
+    """
+    return [{
+        "ocr_detected_text": f"SN R{run}-{number:07d}",
+        "serial_number_extracted": f"R{run}-{number:07d}",
+        "verified_sn": f"R{run}-{number:07d}",
+        "part_id": "PART-100",
+        "batch_id": "WO-BENCH",
+        "batch_quantity": rows,
+        "uploaded_by": "bench",
+        "is_verified": True,
+        "sn_status_id": "NewScan",
+    } for number in range(rows)]
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def run_once(rows, run):
+    directory = tempfile.mkdtemp(prefix='bench-bulk-insert-')
+    os.environ.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, 'db.sqlite')}",
+                      METRICS_PATH=os.path.join(directory, 'metrics.sqlite'),
+                      REPORT_CACHE_DIR=os.path.join(directory, 'reports'))
+    from api import create_app
+    from api.crud_routes_v3 import serial_number_row_loader, serial_numbers_schema
+
+    records = payload(rows, run)
+    app = create_app()
+    client = app.test_client()
+    try:
+        loader_s, _ = timed(serial_number_row_loader.load, records)
+        schema_s, _ = timed(serial_numbers_schema.load, records)
+        request_s, response = timed(lambda: client.post('/serial_numbers/bulk', json=records))
+        if response.status_code != 201:
+            raise SystemExit(f"Upload failed with {response.status_code}: {response.get_json()}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {"request_s": request_s, "loader_s": loader_s, "schema_s": schema_s}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints the change of each timing against the baseline and returns the
+    regressions found.
+    """
+    regressions = []
+    print(f"\nAgainst baseline ({baseline.get('recorded_at', 'unknown date')}), tolerance {tolerance:.0%}:")
+    if baseline.get("host") != results["host"] or baseline.get("python") != results["python"]:
+        print(f"Note: recorded on a different host: {baseline.get('host')}, Python {baseline.get('python')}")
+    if baseline.get("rows") != results["rows"]:
+        print(f"Note: the baseline uploaded {baseline.get('rows')} rows")
+    for key in TIMINGS:
+        change = results[key] / baseline[key] - 1 if baseline.get(key) else 0
+        if change > tolerance:
+            regressions.append(key)
+        print(f"{key:<10} {results[key] * 1000:>8.0f} ms ({change:+6.1%})  {'REGRESSION' if change > tolerance else ''}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    samples = [run_once(args.rows, run) for run in range(args.runs)]
+    results = {
+        "recorded_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "python": sys.version.split()[0],
+        "host": {"cpus": os.cpu_count(), "system": platform.system()},
+        "rows": args.rows,
+        **{key: statistics.median(sample[key] for sample in samples) for key in TIMINGS},
+    }
+    print(f"{args.rows} rows, median of {args.runs} runs:")
+    print(f"  request   {results['request_s'] * 1000:>8.0f} ms")
+    print(f"  loader    {results['loader_s'] * 1000:>8.0f} ms")
+    print(f"  schema    {results['schema_s'] * 1000:>8.0f} ms")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"\nSaved the baseline to {args.baseline}")
+    if regressions:
+        raise SystemExit(f"{len(regressions)} regression(s) against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Write throughput of concurrent worker processes against one database.
+
+Each worker is a separate process with its own app, like a gunicorn worker,
+and repeatedly runs one of these scanning-station writes through the test
+client:
+
+- scan: POST /serial_number
+- verify_bulk: PATCH /serial_numbers for 20 ids
+- bulk_add: POST /serial_numbers/bulk with 50 records
+
+along with compliance_page reads (GET /serial_numbers/query_v2) so readers
+compete with the writers. Responses other than 2xx are errors; "database is
+locked" failures are counted separately.
+
+On SQLite both profiles run on a fresh seeded file each:
+
+- rollback: the settings before db_profile (rollback journal,
+  synchronous=FULL, sqlite3's default 5 s busy timeout, no mmap)
+- tuned: the db_profile defaults (WAL, synchronous=NORMAL, busy timeout,
+  mmap)
+
+With --database-uri (e.g. PostgreSQL) that database is seeded once and only
+the configured profile runs.
+
+Usage (from backend/):
+    python -m benchmarks.bench_db_writes
+    python -m benchmarks.bench_db_writes --workers 1 4 8 --duration 20
+    python -m benchmarks.bench_db_writes --database-uri postgresql://... --workers 4 16
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.loadtest import latency_stats
+from benchmarks.seed_database import PART_NUMBER, batch_number, seed
+
+# Action weights of a worker
+MIX = {"scan": 50, "verify_bulk": 15, "bulk_add": 5, "compliance_page": 30}
+
+WRITES = ("scan", "verify_bulk", "bulk_add")
+
+# Environment of each SQLite profile
+SQLITE_PROFILES = {
+    "rollback": {"DB_SQLITE_JOURNAL_MODE": "DELETE", "DB_SQLITE_SYNCHRONOUS": "FULL",
+                 "DB_BUSY_TIMEOUT": "5", "DB_SQLITE_MMAP_SIZE": "0"},
+    "tuned": {},
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='concurrent worker processes')
+    parser.add_argument('--duration', type=float, default=10, help='seconds each run writes for')
+    parser.add_argument('--database-uri', help='database to use instead of temporary SQLite files')
+    parser.add_argument('--batches', type=int, default=10, help='batches to seed')
+    parser.add_argument('--serials', type=int, default=20000, help='serials to seed')
+    return parser.parse_args()
+
+
+def worker(number, per_batch, batches, barrier, duration, results):
+    from api import create_app
+    app = create_app()
+    client = app.test_client()
+    rng = random.Random(number)
+    samples = defaultdict(lambda: ([], []))
+    scans = 0
+
+    def record(batch):
+        nonlocal scans
+        scans += 1
+        return {
+            "ocr_detected_text": "S/N", "verified_sn": f"DW{number:03d}{scans:08d}", "uploaded_by": f"bench{number}",
+            "ocr_status": "confirmed", "batch_id": batch_number(batch), "part_id": PART_NUMBER,
+            "batch_quantity": per_batch, "batch_type": "Production", "is_verified": False, "sn_status_id": "NewScan",
+        }
+
+    def verify_bulk():
+        first = rng.randint(1, per_batch * batches - 20)
+        return client.patch('/serial_numbers', json={
+            "ids": list(range(first, first + 20)), "updates": {"is_verified": True}
+        })
+
+    actions = {
+        "scan": lambda: client.post('/serial_number', json=record(rng.randint(1, batches))),
+        "verify_bulk": verify_bulk,
+        "bulk_add": lambda: client.post('/serial_numbers/bulk', json=[record(rng.randint(1, batches))
+                                                                     for _ in range(50)]),
+        "compliance_page": lambda: client.get('/serial_numbers/query_v2', query_string={
+            "recorded_sn": "false", "page": rng.randint(1, 20), "per_page": 20,
+            "sort_by": "verified_sn", "sort_order": "asc",
+        }),
+    }
+    names, weights = list(MIX), list(MIX.values())
+
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        action = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        response = actions[action]()
+        elapsed = time.perf_counter() - started
+        latencies, errors = samples[action]
+        if response.status_code < 300:
+            latencies.append(elapsed)
+        else:
+            errors.append(str((response.get_json(silent=True) or {}).get('details') or response.status_code))
+    results.put({action: (latencies, errors) for action, (latencies, errors) in samples.items()})
+
+
+def run(workers, per_batch, batches, duration):
+    """
+    Runs workers processes for duration seconds once all have started.
+    Returns (latencies, errors) by action over all workers.
+    """
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(number, per_batch, batches, barrier, duration, results))
+                 for number in range(workers)]
+    for process in processes:
+        process.start()
+    samples = defaultdict(lambda: ([], []))
+    for _ in processes:
+        for action, (latencies, errors) in results.get().items():
+            samples[action][0].extend(latencies)
+            samples[action][1].extend(errors)
+    for process in processes:
+        process.join()
+    return samples
+
+
+def print_run(profile, workers, samples, duration):
+    writes = sum(len(samples[action][0]) for action in WRITES)
+    errors = [error for latencies, action_errors in samples.values() for error in action_errors]
+    locked = sum('database is locked' in error for error in errors)
+    scan = latency_stats(*samples["scan"], duration)
+    reads = latency_stats(*samples["compliance_page"], duration)
+    print(f"{profile:<10} {workers:>7} {writes / duration:>9.1f} {_ms(scan['p50_ms']):>9} {_ms(scan['p95_ms']):>9} "
+          f"{reads['throughput']:>8.1f} {_ms(reads['p95_ms']):>9} {len(errors):>7} {locked:>7}")
+    if errors and errors[0]:
+        print(f"{'':<10} first error: {errors[0][:120]}")
+
+
+def _ms(value):
+    return f"{value:.0f}" if value is not None else "-"
+
+
+def main():
+    args = parse_args()
+    directory = tempfile.mkdtemp(prefix='bench-db-writes-')
+    if args.database_uri:
+        profiles = {"configured": (args.database_uri, {})}
+    else:
+        profiles = {name: (f"sqlite:///{os.path.join(directory, name + '.sqlite')}", env)
+                    for name, env in SQLITE_PROFILES.items()}
+    # Workers only need the CRUD routes; queueing shows in the latencies, not in slow-request logs
+    os.environ.update(FEATURES='', METRICS_PATH=os.path.join(directory, 'metrics.sqlite'), SLOW_REQUEST_SECONDS='3600')
+
+    print(f"{'profile':<10} {'workers':>7} {'writes/s':>9} {'scan p50':>9} {'scan p95':>9} "
+          f"{'reads/s':>8} {'read p95':>9} {'errors':>7} {'locked':>7}")
+    try:
+        for profile, (database_uri, env) in profiles.items():
+            os.environ.update(env)
+            per_batch = seed(database_uri, args.batches, args.serials, log=lambda message: None)
+            for workers in args.workers:
+                samples = run(workers, per_batch, args.batches, args.duration)
+                print_run(profile, workers, samples, args.duration)
+            for name in env:
+                del os.environ[name]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Query plan and latency benchmark for the SerialNumberRecord indexes.
+
+Seeds a scratch database, runs the hot queries without the indexes, applies
+the migrations and runs them again, printing the plan and median latency of
+each query before and after.
+
+The "query_v2 ..." cases use the filters query_serial_numbers_v2 builds
+from the Reporting view's text boxes, which match substrings with
+ILIKE '%value%'. Leading wildcards cannot use the b-tree indexes, so those
+cases show what the indexes do not speed up; equality lookups on the same
+columns (e.g. from check_batch) are timed separately.
+
+Usage (from backend/):
+    python -m benchmarks.bench_indexes --rows 300000
+    python -m benchmarks.bench_indexes --database-uri postgresql://... --rows 300000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=300000, help='serial number rows to seed')
+    parser.add_argument('--batches', type=int, default=500, help='batches to spread the rows over')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per query')
+    parser.add_argument('--database-uri', help='defaults to a temporary SQLite file')
+    return parser.parse_args()
+
+
+def seed(db, SerialNumberRecord, BatchInfo, rows, batches):
+    rng = random.Random(42)
+    epoch = datetime(2024, 1, 1)
+    db.session.execute(db.insert(BatchInfo), [
+        {"batch_number": f"B{n:05d}", "number_of_items": rows // batches, "part_number": "P100"}
+        for n in range(1, batches + 1)
+    ])
+    chunk = []
+    for n in range(rows):
+        batch = rng.randint(1, batches)
+        chunk.append({
+            "ocr_detected_text": "S/N",
+            "serial_number_extracted": f"{n:07d}",
+            "verified_sn": f"CV{n:07d}",
+            "ocr_timestamp": epoch + timedelta(minutes=n),
+            "uploaded_by": f"user{rng.randint(1, 25)}",
+            "is_deleted": rng.random() < 0.02,
+            "recorded_sn": rng.random() < 0.8,
+            "voided": rng.random() < 0.01,
+            "batch_id": f"B{batch:05d}",
+            "batch_info_id": batch,
+            "part_id": "P100",
+            "sn_status_id": "NewScan",
+        })
+        if len(chunk) == 10000:
+            db.session.execute(db.insert(SerialNumberRecord), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(db.insert(SerialNumberRecord), chunk)
+    db.session.commit()
+
+
+def hot_queries(db, SerialNumberRecord, rows, batches):
+    """
+    The WHERE clauses used by check_batch, generate_report,
+    query_serial_numbers and query_serial_numbers_v2.
+    """
+    from api.crud_routes_v3 import build_filters
+    record = SerialNumberRecord
+    middle = datetime(2024, 1, 1) + timedelta(minutes=rows // 2)
+    return {
+        "check_batch / generate_report": db.select(record).where(
+            record.batch_info_id == batches // 2, record.is_deleted == False),
+        "query by date range": db.select(record).where(
+            record.is_deleted == False,
+            record.ocr_timestamp >= middle,
+            record.ocr_timestamp <= middle + timedelta(days=1)).order_by(record.id).limit(20),
+        "compliance queue (recorded_sn=false)": db.select(record).where(
+            record.is_deleted == False, record.recorded_sn == False, record.voided == False).limit(20),
+        "verified_sn lookup": db.select(record).where(record.verified_sn == f"CV{rows // 3:07d}"),
+        "batch_id filter": db.select(record).where(
+            record.is_deleted == False, record.batch_id == f"B{batches // 3:05d}").limit(20),
+        "serial range": db.select(record).where(
+            record.is_deleted == False,
+            record.serial_number_extracted.between(f"{rows // 4:07d}", f"{rows // 4 + 50:07d}")),
+        "uploaded_by filter": db.select(record).where(
+            record.is_deleted == False, record.uploaded_by == "user7").limit(20),
+        "query_v2 verified_sn contains": db.select(record).where(*build_filters(
+            {"is_deleted": "false", "verified_sn": f"{rows // 3:07d}"})).order_by(record.id).limit(20),
+        "query_v2 batch_id contains": db.select(record).where(*build_filters(
+            {"is_deleted": "false", "batch_id": f"{batches // 3:05d}"})).order_by(record.id).limit(20),
+    }
+
+
+def explain(db, statement):
+    compiled = statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN " if db.engine.dialect.name == 'sqlite' else "EXPLAIN "
+    plan = db.session.execute(db.text(prefix + str(compiled))).all()
+    return [row[-1] for row in plan]
+
+
+def measure(db, statement, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.session.execute(statement).all()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    args = parse_args()
+    if args.database_uri:
+        os.environ['SQLALCHEMY_DATABASE_URI'] = args.database_uri
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'bench_indexes.sqlite')
+        os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+
+    from api import create_app
+    from api.extensions import db
+    from api.models import SerialNumberRecord, BatchInfo
+    from api.migrations import run_migrations
+
+    app = create_app()
+    with app.app_context():
+        # Start from the pre-index schema
+        with db.engine.begin() as connection:
+            for index in SerialNumberRecord.__table__.indexes:
+                index.drop(connection, checkfirst=True)
+            connection.execute(db.text("DELETE FROM schema_version"))
+
+        print(f"Seeding {args.rows} rows over {args.batches} batches...")
+        seed(db, SerialNumberRecord, BatchInfo, args.rows, args.batches)
+        queries = hot_queries(db, SerialNumberRecord, args.rows, args.batches)
+
+        before = {name: (explain(db, q), measure(db, q, args.repeat)) for name, q in queries.items()}
+        run_migrations()
+        db.session.execute(db.text("ANALYZE"))
+        after = {name: (explain(db, q), measure(db, q, args.repeat)) for name, q in queries.items()}
+
+        for name in queries:
+            plan_before, ms_before = before[name]
+            plan_after, ms_after = after[name]
+            print(f"\n{name}: {ms_before:.2f} ms -> {ms_after:.2f} ms ({ms_before / max(ms_after, 1e-6):.1f}x)")
+            print("  before: " + " | ".join(plan_before))
+            print("  after:  " + " | ".join(plan_after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Measures peak memory and time of the OCR ingestion path for one large
+upload, before and after single-decode ingestion.
+
+- legacy: read the upload into bytes, decode to BGR, convert to grayscale,
+  equalize, then re-encode to JPEG for the engine
+- current: read dimensions from the header, decode straight to grayscale
+  at reduced scale (prepare_image), from bytes or from a spooled mmap
+
+Each path runs in a fresh subprocess so ru_maxrss reflects only that path.
+The image is synthetic (noise plus text) unless --image is given.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ingest_memory
+    python -m benchmarks.bench_ingest_memory --image samples/IMG_0001.jpg --max-dimension 1600
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+PATHS = ('legacy', 'current', 'current-spooled')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', help='JPEG/PNG to ingest (default: synthetic 12 MP JPEG)')
+    parser.add_argument('--max-dimension', type=int, default=2048, help='OCR_MAX_DIMENSION for the current path')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per path, the median time is reported')
+    parser.add_argument('--path', choices=PATHS, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def synthetic_image(path):
+    rng = np.random.default_rng(0)
+    image = rng.integers(60, 120, (3000, 4000, 3), dtype=np.uint8)
+    cv2.putText(image, 'S/N 1234567', (900, 1600), cv2.FONT_HERSHEY_SIMPLEX, 8, (230, 230, 230), 20)
+    cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+
+
+def legacy_ingest(path):
+    with open(path, 'rb') as upload:
+        img_bytes = upload.read()
+    img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+    gray = cv2.equalizeHist(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    _, encoded = cv2.imencode('.jpg', gray)
+    return encoded.tobytes()
+
+
+def current_ingest(path, max_dimension, spooled):
+    from api.ocr_routes import prepare_image
+    from api.uploads import SpooledUpload
+
+    class FileStorage:
+        content_type = 'image/jpeg'
+
+        def __init__(self, stream):
+            self.stream = stream
+
+    options = {"max_dimension": max_dimension, "crop_roi": False, "equalize": True}
+    with open(path, 'rb') as stream:
+        upload = SpooledUpload(FileStorage(stream), os.path.basename(path), 0 if spooled else sys.maxsize)
+    try:
+        with upload.buffer() as buffer:
+            _, processed, _ = prepare_image(buffer, options)
+    finally:
+        upload.discard()
+    _, encoded = cv2.imencode('.jpg', processed)
+    return encoded.tobytes()
+
+
+def run_path(args):
+    if args.path != 'legacy':
+        # Import outside the measured window
+        import api.ocr_routes  # noqa: F401
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        if args.path == 'legacy':
+            payload = legacy_ingest(args.image)
+        else:
+            payload = current_ingest(args.image, args.max_dimension, args.path == 'current-spooled')
+        timings.append(time.perf_counter() - started)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "rss_delta_mb": (peak - baseline) / 1024,
+        "median_ms": sorted(timings)[len(timings) // 2] * 1000,
+        "payload_kb": len(payload) / 1024,
+    }))
+
+
+def main():
+    args = parse_args()
+    if args.path:
+        run_path(args)
+        return
+
+    cleanup = None
+    if not args.image:
+        cleanup = args.image = os.path.join(tempfile.mkdtemp(), 'synthetic.jpg')
+        synthetic_image(args.image)
+    try:
+        height, width = cv2.imread(args.image, cv2.IMREAD_REDUCED_GRAYSCALE_8).shape[:2]
+        print(f"{args.image}: ~{width * 8}x{height * 8}, {os.path.getsize(args.image) / 1024 / 1024:.1f} MB on disk")
+        print(f"{'path':<16} {'peak RSS +MB':>13} {'median ms':>10} {'payload KB':>11}")
+        for path in PATHS:
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_ingest_memory', '--path', path, '--image', args.image,
+                 '--max-dimension', str(args.max_dimension), '--repeat', str(args.repeat)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            stats = json.loads(output.strip().splitlines()[-1])
+            print(f"{path:<16} {stats['rss_delta_mb']:>13.1f} {stats['median_ms']:>10.1f} {stats['payload_kb']:>11.1f}")
+    finally:
+        if cleanup:
+            os.remove(cleanup)
+
+
+if __name__ == '__main__':
+    main()
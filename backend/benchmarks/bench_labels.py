@@ -0,0 +1,99 @@
+"""
+Labels per second for the barcode label report.
+
+Renders the same serials several ways and reports labels/s and output size:
+
+- raster: the previous python-barcode ImageWriter PNG -> PIL -> PNG ->
+  ImageReader path (skipped if python-barcode is not installed)
+- vector: reportlab Code128 vector barcodes
+- zpl: ZPL for Zebra thermal printers
+- csv: the label manifest
+
+Usage (from backend/):
+    python -m benchmarks.bench_labels
+    python -m benchmarks.bench_labels --count 5000 --prefix CV1025
+    python -m benchmarks.bench_labels --layout thermal-2x1
+"""
+import argparse
+import io
+import time
+
+from api.label_layouts import label_layouts
+from api.label_report import REPORT_FORMATS
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1000, help='labels per report')
+    parser.add_argument('--prefix', default='CV1025', help='serial prefix')
+    parser.add_argument('--digits', type=int, default=5, help='digits after the prefix')
+    parser.add_argument('--layout', default='letter-3x8', help='label layout of the vector, zpl and csv runs')
+    return parser.parse_args()
+
+
+def raster_label_pdf(serials, output):
+    # The report loop before vector barcodes, kept for comparison
+    from barcode.codex import Code128
+    from barcode.writer import ImageWriter
+    from PIL import Image
+    from reportlab.lib import utils
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    pdf = canvas.Canvas(output, pagesize=letter)
+    width, height = letter
+    x_spacing = (width - 2 * 50 - 3 * 144) / 2
+    column = row = 0
+    for serial in serials:
+        buffer = io.BytesIO()
+        Code128(serial, writer=ImageWriter()).write(buffer)
+        buffer.seek(0)
+        image_buffer = io.BytesIO()
+        Image.open(buffer).convert("RGB").save(image_buffer, format='PNG')
+        image_buffer.seek(0)
+        pdf.drawImage(utils.ImageReader(image_buffer), 50 + column * (144 + x_spacing),
+                      height - 100 - row * 122, width=144, height=72)
+        column += 1
+        if column == 3:
+            column = 0
+            row += 1
+        if row == 8:
+            pdf.showPage()
+            column = row = 0
+    pdf.save()
+
+
+def timed(render, serials):
+    output = io.BytesIO()
+    started = time.perf_counter()
+    render(serials, output)
+    elapsed = time.perf_counter() - started
+    return len(serials) / elapsed, len(output.getvalue()) / 1024
+
+
+def main():
+    args = parse_args()
+    serials = [f"{args.prefix}{number:0{args.digits}d}" for number in range(1, args.count + 1)]
+
+    layout = label_layouts.get(args.layout)
+
+    def writer(report_format):
+        return lambda serials, output: REPORT_FORMATS[report_format].write(serials, output, "Benchmark", layout)
+
+    runs = []
+    try:
+        import barcode  # noqa: F401
+        runs.append(('raster', raster_label_pdf))
+    except ImportError:
+        print("python-barcode not installed, skipping the raster path")
+    runs += [('vector', writer('pdf')), ('zpl', writer('zpl')), ('csv', writer('csv'))]
+
+    print(f"{args.count} labels, {layout.name}")
+    print(f"{'path':<12} {'labels/s':>10} {'KB':>9}")
+    for name, render in runs:
+        rate, size = timed(render, serials)
+        print(f"{name:<12} {rate:>10.0f} {size:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Peak memory of building a batch label report, before and after the
+lightweight serial query and on-disk report output.
+
+- legacy: load every record through the ORM, dump all fields with
+  serial_numbers_schema, then draw the PDF into an in-memory BytesIO
+- current: GET /serial_numbers/report, which streams only verified_sn
+  and writes the PDF to the report cache on disk
+
+Both draw the same vector barcodes, so the difference is the query,
+serialization and output buffering. Each path runs in a fresh subprocess
+against a seeded temporary SQLite database; ru_maxrss is measured after
+the app is created.
+
+Usage (from backend/):
+    python -m benchmarks.bench_report_memory
+    python -m benchmarks.bench_report_memory --sizes 1000 10000 50000
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PATHS = ('legacy', 'current')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 30000], help='labels per report')
+    parser.add_argument('--path', choices=PATHS, help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def create_app(database):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{database}"
+    os.environ['REPORT_CACHE_DIR'] = tempfile.mkdtemp(prefix='bench-reports-')
+    os.environ['REPORT_WORKERS'] = '1'
+    os.environ['REPORT_ASYNC_MIN_LABELS'] = str(10 ** 9)
+    from api import create_app
+    return create_app()
+
+
+def seed(database, size):
+    from sqlalchemy import insert
+    from api.extensions import db
+    from api.models import BatchInfo, SerialNumberRecord
+
+    app = create_app(database)
+    with app.app_context():
+        batch = BatchInfo(batch_number='BENCH', number_of_items=size, part_number='CV-1025')
+        db.session.add(batch)
+        db.session.flush()
+        rows = [{
+            "ocr_detected_text": "Bulk Added", "serial_number_extracted": "BULK ADDED",
+            "verified_sn": f"CV1025{number:06d}", "part_id": "CV-1025", "batch_id": "BENCH",
+            "batch_info_id": batch.id, "is_deleted": False, "sn_status_id": "NewScan",
+        } for number in range(size)]
+        db.session.execute(insert(SerialNumberRecord.__table__), rows)
+        db.session.commit()
+
+
+def run_path(path, database):
+    app = create_app(database)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if path == 'legacy':
+        from api.crud_routes_v3 import serial_numbers_schema
+        from api.label_report import write_label_pdf
+        from api.models import BatchInfo, SerialNumberRecord
+        with app.app_context():
+            batch = BatchInfo.query.filter_by(batch_number='BENCH').first()
+            records = SerialNumberRecord.query.filter(
+                SerialNumberRecord.batch_info_id == batch.id,
+                SerialNumberRecord.is_deleted == False
+            ).all()
+            data = serial_numbers_schema.dump(records)
+            output = io.BytesIO()
+            write_label_pdf((sn['verified_sn'] for sn in data), output, "Batch BENCH Report")
+            size = len(output.getvalue())
+    else:
+        response = app.test_client().get('/serial_numbers/report?batch_id=BENCH', buffered=False)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"rss_delta_mb": (peak - baseline) / 1024, "seconds": elapsed, "pdf_kb": size / 1024}))
+
+
+def main():
+    args = parse_args()
+    if args.path:
+        run_path(args.path, args.database)
+        return
+
+    print(f"{'labels':>8} {'path':<8} {'peak RSS +MB':>13} {'seconds':>8} {'PDF KB':>8}")
+    for size in args.sizes:
+        database = tempfile.mktemp(suffix='.sqlite')
+        try:
+            subprocess.run([sys.executable, '-c', f"from benchmarks.bench_report_memory import seed; "
+                                                  f"seed({database!r}, {size})"], check=True)
+            for path in PATHS:
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.bench_report_memory', '--path', path,
+                     '--database', database],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                stats = json.loads(output.strip().splitlines()[-1])
+                print(f"{size:>8} {path:<8} {stats['rss_delta_mb']:>13.1f} {stats['seconds']:>8.2f} "
+                      f"{stats['pdf_kb']:>8.0f}")
+        finally:
+            os.remove(database)
+
+
+if __name__ == '__main__':
+    main()
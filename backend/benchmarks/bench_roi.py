@@ -0,0 +1,116 @@
+"""
+Compares the full-frame OCR preprocessing path with downscaling and
+region-of-interest cropping over a folder of sample photos.
+
+For each path it reports preprocessing time, JPEG encode time and bytes
+sent to the OCR engine, and, unless --no-ocr is given, OCR latency and
+how often the expected serial number was extracted.
+
+Expected serials come from --labels (a CSV of file_name,serial) or, failing
+that, from the first 7-digit number in each file name.
+
+Usage (from backend/):
+    python -m benchmarks.bench_roi samples/ --engine tesseract
+    python -m benchmarks.bench_roi samples/ --max-dimension 1600 --no-ocr
+"""
+import argparse
+import csv
+import os
+import re
+import statistics
+import time
+
+import cv2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('folder', help='folder of .jpg/.jpeg/.png sample photos')
+    parser.add_argument('--labels', help='CSV with file_name,serial rows')
+    parser.add_argument('--engine', default=os.getenv('OCR_ENGINE', 'google'), help='OCR engine name')
+    parser.add_argument('--max-dimension', type=int, default=2048, help='longest side for the reduced path')
+    parser.add_argument('--no-ocr', action='store_true', help='only measure preprocessing and payload size')
+    return parser.parse_args()
+
+
+def load_labels(folder, labels_path):
+    labels = {}
+    if labels_path:
+        with open(labels_path, newline='') as labels_file:
+            for row in csv.reader(labels_file):
+                if len(row) >= 2:
+                    labels[row[0]] = row[1].strip()
+    for name in os.listdir(folder):
+        if name not in labels:
+            match = re.search(r'\d{7}', name)
+            if match:
+                labels[name] = match.group(0)
+    return labels
+
+
+def run_path(name, images, labels, engine, preprocess):
+    from api.ocr_routes import isolate_serial_number
+
+    stats = {"preprocess_ms": [], "encode_ms": [], "bytes": [], "ocr_ms": [], "correct": 0, "labelled": 0}
+    for file_name, img in images:
+        start = time.perf_counter()
+        processed = preprocess(img)
+        stats["preprocess_ms"].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        _, buffer = cv2.imencode('.jpg', processed)
+        stats["encode_ms"].append((time.perf_counter() - start) * 1000)
+        stats["bytes"].append(len(buffer))
+
+        if engine is None:
+            continue
+        start = time.perf_counter()
+        result = engine.detect_text(processed)
+        stats["ocr_ms"].append((time.perf_counter() - start) * 1000)
+        if file_name in labels:
+            stats["labelled"] += 1
+            stats["correct"] += isolate_serial_number(result.text) == labels[file_name]
+
+    print(f"\n{name}")
+    for key in ("preprocess_ms", "encode_ms", "ocr_ms"):
+        if stats[key]:
+            print(f"  {key:14} median {statistics.median(stats[key]):8.1f}   total {sum(stats[key]):10.1f}")
+    print(f"  {'bytes':14} median {statistics.median(stats['bytes']):8.0f}   total {sum(stats['bytes']):10.0f}")
+    if stats["labelled"]:
+        print(f"  {'accuracy':14} {stats['correct']}/{stats['labelled']} ({stats['correct'] / stats['labelled']:.1%})")
+    return stats
+
+
+def main():
+    args = parse_args()
+
+    from flask import Flask
+    from api.ocr_engines import OCR_ENGINES
+    from api.ocr_routes import preprocess_image
+
+    names = sorted(name for name in os.listdir(args.folder)
+                   if name.lower().endswith(('.jpg', '.jpeg', '.png')))
+    images = [(name, cv2.imread(os.path.join(args.folder, name), cv2.IMREAD_COLOR)) for name in names]
+    images = [(name, img) for name, img in images if img is not None]
+    if not images:
+        raise SystemExit(f"No readable images in {args.folder}")
+    labels = load_labels(args.folder, args.labels)
+
+    engine = None
+    if not args.no_ocr:
+        config = Flask(__name__).config
+        config.update({"OCR_TESSERACT_CONFIG": os.getenv('OCR_TESSERACT_CONFIG', '--psm 11')})
+        engine = OCR_ENGINES[args.engine](config)
+
+    print(f"{len(images)} images, {len(labels)} with expected serials, engine: {args.engine if engine else 'none'}")
+    full = run_path("full frame", images, labels, engine, lambda img: preprocess_image(img))
+    reduced = run_path(
+        f"downscale to {args.max_dimension} + ROI crop", images, labels, engine,
+        lambda img: preprocess_image(img, max_dimension=args.max_dimension, crop_roi=True)
+    )
+
+    print(f"\nbytes sent: {sum(reduced['bytes']) / sum(full['bytes']):.1%} of full frame")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Micro-benchmark for serial number extraction over a corpus of OCR outputs.
+
+Reports calls per second and top-1 / top-3 accuracy for the previous
+regex-per-call isolate_serial_number and for extract_serials, and exits
+non-zero when extract_serials falls below --min-accuracy or --min-rate, so
+pattern changes can be checked before they ship.
+
+The corpus is a JSON lines file with one OCR output per line:
+
+    {"text": "...", "words": [["S/N", [10, 50, 30, 20]], ...],
+     "part_number": "CV-1025", "expected": "CV102500042"}
+
+words and part_number are optional; expected is null when the image has
+no serial. Without --corpus a synthetic corpus of labelled, bare, prefixed,
+split and missing serials is generated. --patterns loads an
+OCR_SERIAL_PATTERNS file first.
+
+Usage (from backend/):
+    python -m benchmarks.bench_serial_extraction
+    python -m benchmarks.bench_serial_extraction --corpus ocr_outputs.jsonl --patterns patterns.json --min-accuracy 0.95
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+
+from api.ocr_engines import OcrWord
+from api.serial_extraction import extract_serials, serial_patterns
+
+NOISE = ['MADE IN USA', 'MODEL X200', 'LOT 44', 'CAL .223', 'PAT. PEND.', 'WARNING READ MANUAL', 'REV B']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='JSON lines file of OCR outputs')
+    parser.add_argument('--patterns', help='OCR_SERIAL_PATTERNS file to load')
+    parser.add_argument('--size', type=int, default=2000, help='synthetic corpus size')
+    parser.add_argument('--repeat', type=int, default=5, help='passes over the corpus per timing')
+    parser.add_argument('--min-accuracy', type=float, help='fail below this top-1 accuracy')
+    parser.add_argument('--min-rate', type=float, help='fail below this many extractions per second')
+    return parser.parse_args()
+
+
+def legacy_isolate(text):
+    # isolate_serial_number before the pattern registry, kept for comparison
+    match = re.search(r'(?:S/N|SN|S\.N\.)\s*(\d{7})', text, re.IGNORECASE)
+    if match:
+        return match.group(1)
+    match = re.search(r'(\d{7})', text)
+    if match:
+        return match.group(1)
+    return None
+
+
+def synthetic_corpus(size):
+    rng = random.Random(0)
+    corpus = []
+    for index in range(size):
+        kind = index % 5
+        lines = rng.sample(NOISE, 2)
+        expected = None
+        words = None
+        if kind == 0:
+            expected = f"{rng.randrange(10 ** 7):07d}"
+            lines.insert(1, f"S/N {expected}")
+        elif kind == 1:
+            expected = f"{rng.randrange(10 ** 7):07d}"
+            lines.insert(rng.randrange(3), expected)
+        elif kind == 2:
+            expected = f"CV1025{rng.randrange(10 ** 5):05d}"
+            lines.insert(1, f"SN: {expected}")
+        elif kind == 3:
+            # OCR split the serial into two words on one line
+            expected = f"CV1025{rng.randrange(10 ** 5):05d}"
+            words = [[token, [10 + 60 * column, 10 + 40 * row, 50, 20]]
+                     for row, line in enumerate([lines[0], f"S/N {expected[:6]} {expected[6:]}", lines[1]])
+                     for column, token in enumerate(line.split())]
+            lines.insert(1, f"S/N {expected[:6]} {expected[6:]}")
+        corpus.append({"text": "\n".join(lines), "words": words, "part_number": None, "expected": expected})
+    return corpus
+
+
+def load_corpus(path):
+    with open(path) as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+def timed(corpus, extract, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for entry in corpus:
+            extract(entry)
+    return len(corpus) * repeat / (time.perf_counter() - started)
+
+
+def main():
+    args = parse_args()
+    if args.patterns:
+        serial_patterns.load(args.patterns)
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.size)
+    for entry in corpus:
+        entry["words"] = [OcrWord(text, tuple(box)) for text, box in entry.get("words") or ()]
+
+    def current(entry):
+        return extract_serials(entry["text"], entry["words"], entry.get("part_number"), limit=3)
+
+    def legacy(entry):
+        return legacy_isolate(entry["text"])
+
+    current_top1 = current_top3 = legacy_top1 = 0
+    for entry in corpus:
+        candidates = [candidate.serial for candidate in current(entry)]
+        expected = entry["expected"]
+        current_top1 += (candidates[0] if candidates else None) == expected
+        current_top3 += expected in candidates if expected else not candidates
+        legacy_top1 += legacy(entry) == expected
+
+    legacy_rate = timed(corpus, legacy, args.repeat)
+    current_rate = timed(corpus, current, args.repeat)
+
+    print(f"{len(corpus)} OCR outputs")
+    print(f"{'extractor':<10} {'calls/s':>10} {'top-1':>7} {'top-3':>7}")
+    print(f"{'legacy':<10} {legacy_rate:>10.0f} {legacy_top1 / len(corpus):>7.3f} {'-':>7}")
+    print(f"{'current':<10} {current_rate:>10.0f} {current_top1 / len(corpus):>7.3f} "
+          f"{current_top3 / len(corpus):>7.3f}")
+
+    failed = False
+    if args.min_accuracy is not None and current_top1 / len(corpus) < args.min_accuracy:
+        print(f"top-1 accuracy below {args.min_accuracy}")
+        failed = True
+    if args.min_rate is not None and current_rate < args.min_rate:
+        print(f"throughput below {args.min_rate} calls/s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Rows per second for serializing a page of serial number records.
+
+Each path loads the same page from a seeded temporary SQLite database,
+serializes it and encodes the JSON body:
+
+- marshmallow: ORM objects dumped with serial_numbers_schema, encoded by
+  Flask's default JSON provider (the list endpoints before the row
+  serializer)
+- rows: Core rows of the schema's columns dumped by serial_number_rows()
+- rows + orjson: the same, encoded by the orjson provider
+- fields=id,verified_sn: a projected page, encoded by the orjson provider
+
+Usage (from backend/):
+    python -m benchmarks.bench_serializers
+    python -m benchmarks.bench_serializers --pages 100 1000 --repeat 50
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, nargs='+', default=[100, 500, 1000], help='rows per page')
+    parser.add_argument('--repeat', type=int, default=20, help='pages served per path and size')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    database = tempfile.mktemp(suffix='.sqlite')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{database}"
+    os.environ['REPORT_CACHE_DIR'] = tempfile.mkdtemp(prefix='bench-reports-')
+
+    from sqlalchemy import insert
+    from api import create_app
+    from api.extensions import db
+    from api.models import SerialNumberRecord
+    from api.crud_routes_v3 import serial_numbers_schema, serial_number_rows
+    from api.json_provider import OrjsonProvider, orjson
+
+    app = create_app()
+    default_json = DefaultJSONProvider(app)
+    fast_json = OrjsonProvider(app) if orjson is not None else None
+    size = max(args.pages)
+
+    with app.app_context():
+        db.session.execute(insert(SerialNumberRecord.__table__), [{
+            "ocr_detected_text": "S/N CV1025", "serial_number_extracted": f"CV1025{number:05d}",
+            "verified_sn": f"CV1025{number:05d}", "part_id": "CV-1025", "batch_id": "BENCH",
+            "uploaded_by": "bench", "is_deleted": False, "sn_status_id": "NewScan",
+        } for number in range(size)])
+        db.session.commit()
+
+        def marshmallow_page(per_page):
+            records = SerialNumberRecord.query.filter_by(is_deleted=False).limit(per_page).all()
+            return default_json.response(data=serial_numbers_schema.dump(records))
+
+        def rows_page(per_page, encoder=default_json, fields=None):
+            serializer = serial_number_rows(fields)
+            rows = SerialNumberRecord.query.filter_by(is_deleted=False) \
+                .with_entities(*serializer.columns).limit(per_page).all()
+            return encoder.response(data=serializer.dump(rows))
+
+        paths = [('marshmallow', marshmallow_page), ('rows', rows_page)]
+        if fast_json is not None:
+            paths += [('rows + orjson', lambda per_page: rows_page(per_page, fast_json)),
+                      ('fields=id,verified_sn', lambda per_page: rows_page(per_page, fast_json, 'id,verified_sn'))]
+        else:
+            print("orjson not installed, skipping the orjson paths")
+
+        print(f"{'rows/page':>9} {'path':<22} {'rows/s':>10} {'ms/page':>8} {'KB':>7}")
+        for per_page in args.pages:
+            for name, serve in paths:
+                body = serve(per_page).get_data()
+                started = time.perf_counter()
+                for _ in range(args.repeat):
+                    serve(per_page)
+                elapsed = (time.perf_counter() - started) / args.repeat
+                print(f"{per_page:>9} {name:<22} {per_page / elapsed:>10.0f} {elapsed * 1000:>8.2f} "
+                      f"{len(body) / 1024:>7.0f}")
+    os.remove(database)
+
+
+if __name__ == '__main__':
+    main()
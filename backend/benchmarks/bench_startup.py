@@ -0,0 +1,187 @@
+"""
+Cold start time of the backend: what a gunicorn worker boot, a CLI command
+or a test run pays before serving its first request.
+
+Each run starts a fresh interpreter with -X importtime that imports api and
+calls create_app() against a temporary SQLite database. It reports:
+
+- process: wall time of the whole interpreter run
+- import / create_app: time spent in `import api` and in create_app()
+- RSS after create_app
+- the heavy optional libraries (OpenCV, reportlab, ...) loaded by then,
+  which should be none: they are imported on first use
+- the packages with the most import time, from -X importtime
+
+Runs are repeated for each FEATURES profile and the medians are compared
+against the baseline file; --save-baseline replaces it. The committed
+baselines/startup.json was recorded with the defaults on a single-CPU Linux
+host; re-record it on the machine that runs the comparisons.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 10 --profiles ocr,reports,exports reports
+    python -m benchmarks.bench_startup --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'startup.json')
+
+# Libraries that only the OCR and report pipelines need
+HEAVY_MODULES = ('cv2', 'numpy', 'PIL.Image', 'reportlab.pdfgen', 'reportlab.graphics.barcode',
+                 'pypdf', 'google.cloud.vision', 'pytesseract')
+
+# Runs in the child interpreter; prints its timings as JSON on the last line
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import api
+imported = time.perf_counter()
+api.create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - started,
+    "create_app_s": created - imported,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='interpreter starts per profile')
+    parser.add_argument('--profiles', nargs='+', default=['ocr,reports,exports', ''],
+                        help='FEATURES values to measure; "" is the CRUD-only app')
+    parser.add_argument('--top', type=int, default=8, help='packages listed by import time')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='results file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.20, help='relative slowdown reported as a regression')
+    return parser.parse_args()
+
+
+def package_import_times(stderr):
+    """
+    Sums the self import time of -X importtime output by top-level package,
+    in seconds.
+    """
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        totals[module.strip().split('.')[0]] += int(self_us) / 1e6
+    return totals
+
+
+def run_once(features):
+    directory = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(os.environ,
+               FEATURES=features,
+               SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, 'db.sqlite')}",
+               METRICS_PATH=os.path.join(directory, 'metrics.sqlite'),
+               REPORT_CACHE_DIR=os.path.join(directory, 'reports'))
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE], env=env,
+                               capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - started
+    shutil.rmtree(directory, ignore_errors=True)
+    sample = json.loads(completed.stdout.strip().splitlines()[-1])
+    sample["process_s"] = elapsed
+    sample["packages"] = package_import_times(completed.stderr)
+    return sample
+
+
+def measure(features, runs, top):
+    samples = [run_once(features) for _ in range(runs)]
+    packages = defaultdict(list)
+    for sample in samples:
+        for name, seconds in sample["packages"].items():
+            packages[name].append(seconds)
+    slowest = sorted(((name, statistics.median(times)) for name, times in packages.items()),
+                     key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "process_s": statistics.median(sample["process_s"] for sample in samples),
+        "import_s": statistics.median(sample["import_s"] for sample in samples),
+        "create_app_s": statistics.median(sample["create_app_s"] for sample in samples),
+        "rss_mb": statistics.median(sample["rss_mb"] for sample in samples),
+        "heavy_modules": sorted({name for sample in samples for name in sample["heavy_modules"]}),
+        "slowest_packages": dict(slowest),
+    }
+
+
+def print_results(results):
+    print(f"{'FEATURES':<22} {'process ms':>10} {'import ms':>10} {'create ms':>10} {'RSS MB':>7}  heavy modules")
+    for features, stats in results["profiles"].items():
+        print(f"{features or '(none)':<22} {stats['process_s'] * 1000:>10.0f} {stats['import_s'] * 1000:>10.0f} "
+              f"{stats['create_app_s'] * 1000:>10.0f} {stats['rss_mb']:>7.0f}  "
+              f"{', '.join(stats['heavy_modules']) or 'none'}")
+    for features, stats in results["profiles"].items():
+        print(f"\nSlowest imports, FEATURES={features or '(none)'}:")
+        for name, seconds in stats["slowest_packages"].items():
+            print(f"  {name:<20} {seconds * 1000:>7.1f} ms")
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints the change of each profile against the baseline and returns the
+    regressions found.
+    """
+    regressions = []
+    print(f"\nAgainst baseline ({baseline.get('recorded_at', 'unknown date')}), tolerance {tolerance:.0%}:")
+    if baseline.get("host") != results["host"] or baseline.get("python") != results["python"]:
+        print(f"Note: recorded on a different host: {baseline.get('host')}, Python {baseline.get('python')}")
+    for features, stats in results["profiles"].items():
+        before = baseline["profiles"].get(features)
+        if not before:
+            continue
+        flags = []
+        for key in ("process_s", "import_s", "create_app_s"):
+            change = stats[key] / before[key] - 1 if before[key] else 0
+            if change > tolerance:
+                flags.append(f"{key} {change:+.0%}")
+        added = sorted(set(stats["heavy_modules"]) - set(before["heavy_modules"]))
+        if added:
+            flags.append(f"now imports {', '.join(added)}")
+        if flags:
+            regressions.append((features, flags))
+        change = stats["process_s"] / before["process_s"] - 1
+        print(f"{features or '(none)':<22} {stats['process_s'] * 1000:>6.0f} ms ({change:+6.1%})  "
+              f"{'REGRESSION ' + '; '.join(flags) if flags else ''}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    results = {
+        "recorded_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "python": sys.version.split()[0],
+        "host": {"cpus": os.cpu_count(), "system": platform.system()},
+        "profiles": {features: measure(features, args.runs, args.top) for features in args.profiles},
+    }
+    print_results(results)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"\nSaved the baseline to {args.baseline}")
+    if regressions:
+        raise SystemExit(f"{len(regressions)} regression(s) against the baseline")
+
+
+if __name__ == '__main__':
+    main()
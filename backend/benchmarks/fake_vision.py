@@ -0,0 +1,45 @@
+"""
+Local stand-in for the Cloud Vision client, for load tests.
+
+Answers text_detection and batch_annotate_images after a configurable
+latency with a labelled serial number, so the OCR pipeline runs end to end
+without network calls or credentials.
+"""
+import random
+import time
+from types import SimpleNamespace
+
+
+def fake_response(text, confidence=0.9):
+    return SimpleNamespace(
+        text_annotations=[SimpleNamespace(description=text, locale='en')],
+        error=SimpleNamespace(message=''),
+        full_text_annotation=SimpleNamespace(pages=[SimpleNamespace(blocks=[SimpleNamespace(confidence=confidence)])])
+    )
+
+
+class FakeVisionClient:
+    def __init__(self, latency=0.3, jitter=0.1):
+        self.latency = latency
+        self.jitter = jitter
+
+    def _wait(self):
+        time.sleep(max(0.0, random.uniform(self.latency - self.jitter, self.latency + self.jitter)))
+
+    def _response(self):
+        return fake_response(f"PART CV-1025\nS/N CV1025{random.randint(0, 99999):05d}")
+
+    def text_detection(self, image):
+        self._wait()
+        return self._response()
+
+    def batch_annotate_images(self, requests):
+        self._wait()
+        return SimpleNamespace(responses=[self._response() for _ in requests])
+
+
+def install(app, client):
+    """
+    Makes the app's Cloud Vision engine use client.
+    """
+    app.extensions['ocr_engine']._client = client
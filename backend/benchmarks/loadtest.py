@@ -0,0 +1,427 @@
+"""
+Load test of the backend with the traffic mix of the Vue views.
+
+Starts the real Flask app on a local threaded server (or targets --url),
+then runs concurrent clients. Each client repeatedly picks one of these
+operator actions by weight and times it end to end:
+
+- batch_lookup: GET /batch with the records, as TransactionReview and BulkAdd do
+- batch_summary: GET /batch/summary, as BatchInput does
+- scan: POST /upload, wait on /ocr_jobs/<id>, then POST /serial_number
+  (OCRScanning)
+- compliance_page: GET /serial_numbers/query_v2 with page/per_page and
+  recorded_sn=false (Compliance)
+- reporting_pages: three keyset pages of /serial_numbers/query_v2 (Reporting)
+- verify_one: PUT /serial_number/<id> with is_verified (TransactionReview)
+- verify_bulk: PATCH /serial_numbers for 20 ids (Compliance, TransactionReview)
+- report: GET /serial_numbers/report, polling while it answers 202
+
+By default a temporary SQLite database is seeded first (see
+seed_database.py) and Cloud Vision is replaced by fake_vision with
+--vision-latency. The results are throughput, p50/p95/p99 latency per action
+and the server process's memory. They are compared against the baseline
+file, and --save-baseline replaces that file. The committed
+baselines/loadtest.json was recorded with the defaults on a single-CPU
+Linux host; re-record it on the machine that runs the comparisons.
+
+Usage (from backend/):
+    python -m benchmarks.loadtest
+    python -m benchmarks.loadtest --clients 16 --duration 60 --batches 1000 --serials 1000000
+    python -m benchmarks.loadtest --database-uri postgresql://... --seed --serials 5000000
+    python -m benchmarks.loadtest --mix batch_lookup=1,compliance_page=1 --save-baseline
+    python -m benchmarks.loadtest --url http://localhost:5000 --database-uri ...  # e.g. gunicorn, real OCR engine
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import tempfile
+import threading
+import time
+
+import requests
+
+from benchmarks.seed_database import PART_NUMBER, batch_number, seed
+
+DEFAULT_MIX = {
+    "batch_lookup": 12, "batch_summary": 8, "scan": 25, "compliance_page": 20, "reporting_pages": 10,
+    "verify_one": 15, "verify_bulk": 5, "report": 5,
+}
+
+# Pauses between OCR job polls, as in vue-project/src/services/ocrJobs.js
+POLL_BACKOFF_SECONDS = (0.25, 0.5, 1.0, 2.0)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'loadtest.json')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run after warm-up')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds of untimed traffic first')
+    parser.add_argument('--mix', help='action weights, e.g. batch_lookup=20,scan=25 (default: the Vue mix)')
+    parser.add_argument('--url', help='target a running server instead of starting the app in-process')
+    parser.add_argument('--database-uri', help='database of the app; defaults to a seeded temporary SQLite file')
+    parser.add_argument('--seed', action='store_true', help='seed --database-uri before running')
+    parser.add_argument('--batches', type=int, default=100, help='batches to seed')
+    parser.add_argument('--serials', type=int, default=50000, help='serials to seed')
+    parser.add_argument('--vision-latency', type=float, default=0.3, help='seconds the fake Vision client takes')
+    parser.add_argument('--vision-jitter', type=float, default=0.1, help='+/- seconds of fake Vision latency')
+    parser.add_argument('--random-seed', type=int, default=1, help='makes the sequence of actions repeatable')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='results file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='relative change reported as a regression')
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    return parser.parse_args()
+
+
+def parse_mix(text):
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown action {name.strip()!r}. Expected one of: {', '.join(DEFAULT_MIX)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def label_photo():
+    """
+    A JPEG about the size of a phone photo after the app's downscale.
+    """
+    import cv2
+    import numpy as np
+    rng = np.random.RandomState(0)
+    image = np.full((1200, 1600), 200, dtype=np.uint8)
+    cv2.putText(image, "S/N CV102500001", (200, 650), cv2.FONT_HERSHEY_SIMPLEX, 4, 20, 12)
+    image = cv2.add(image, rng.randint(0, 30, image.shape, dtype=np.uint8))
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+class Client:
+    """
+    One simulated operator with its own HTTP session.
+    """
+
+    def __init__(self, number, base_url, batches, per_batch, photo, rng):
+        self.number = number
+        self.base_url = base_url
+        self.batches = batches
+        self.per_batch = per_batch
+        self.photo = photo
+        self.rng = rng
+        self.session = requests.Session()
+        self.scans = 0
+
+    def _check(self, response):
+        if response.status_code >= 400:
+            raise RuntimeError(f"{response.request.method} {response.request.path_url}: {response.status_code}")
+        return response
+
+    def get(self, path, **params):
+        return self._check(self.session.get(self.base_url + path, params=params, timeout=300))
+
+    def random_batch(self):
+        return self.rng.randint(1, self.batches)
+
+    def random_id(self):
+        return self.rng.randint(1, self.batches * self.per_batch)
+
+    def batch_lookup(self):
+        self.get('/batch', batch_number=batch_number(self.random_batch()))
+
+    def batch_summary(self):
+        self.get('/batch/summary', batch_number=batch_number(self.random_batch()))
+
+    def scan(self):
+        batch = self.random_batch()
+        self.scans += 1
+        # Unique trailing bytes after the JPEG end marker, so every upload misses the OCR cache
+        photo = self.photo + f"{self.number}-{self.scans}-{time.time()}".encode()
+        job = self._check(self.session.post(self.base_url + '/upload', files={
+            'file': ('label.jpg', io.BytesIO(photo), 'image/jpeg')
+        }, data={'part_number': PART_NUMBER, 'batch_number': batch_number(batch)}, timeout=60)).json()
+        attempt = 0
+        while job['status'] not in ('done', 'failed'):
+            if attempt:
+                time.sleep(POLL_BACKOFF_SECONDS[min(attempt - 1, len(POLL_BACKOFF_SECONDS) - 1)])
+            job = self.get(f"/ocr_jobs/{job['job_id']}", wait=1).json()
+            attempt += 1
+        if job['status'] == 'failed':
+            raise RuntimeError(f"OCR job failed: {job['error']}")
+
+        result = job['result']
+        verified_sn = f"LT{self.number:03d}{self.scans:07d}"
+        self._check(self.session.post(self.base_url + '/serial_number', json={
+            "ocr_detected_text": result["ocr_detected_text"],
+            "image_file_name": result["image_file_name"],
+            "image_width": result["image_metadata"]["image_width"],
+            "image_height": result["image_metadata"]["image_height"],
+            "image_channels": result["image_metadata"]["image_channels"],
+            "image_size_bytes": result["image_metadata"]["image_size_bytes"],
+            "image_format": result["image_metadata"]["image_format"],
+            "serial_number_extracted": result["serial_number_extracted"],
+            "ocr_language": result["ocr_language"],
+            "uploaded_by": f"loadtest{self.number}",
+            "ocr_status": "confirmed",
+            "is_ocr_corrected": result["serial_number_extracted"] != verified_sn,
+            "batch_id": batch_number(batch),
+            "batch_quantity": self.per_batch,
+            "part_id": PART_NUMBER,
+            "batch_type": "Production",
+            "verified_sn": verified_sn,
+            "is_verified": False,
+            "testing_selected": self.rng.random() < 0.05,
+            "sn_status_id": "NewScan",
+        }, timeout=60))
+
+    def compliance_page(self):
+        self.get('/serial_numbers/query_v2', recorded_sn='false', page=self.rng.randint(1, 20), per_page=20,
+                 sort_by='verified_sn', sort_order='asc')
+
+    def reporting_pages(self):
+        cursor = ''
+        for _ in range(3):
+            cursor = self.get('/serial_numbers/query_v2', cursor=cursor, part_id=PART_NUMBER).json()['next_cursor']
+            if not cursor:
+                break
+
+    def verify_one(self):
+        self._check(self.session.put(f"{self.base_url}/serial_number/{self.random_id()}",
+                                     json={"is_verified": True}, timeout=60))
+
+    def verify_bulk(self):
+        first = self.random_id()
+        self._check(self.session.patch(self.base_url + '/serial_numbers', json={
+            "ids": list(range(first, first + 20)), "updates": {"is_verified": True}
+        }, timeout=60))
+
+    def report(self):
+        # Operators reprint recent batches, so reports mostly come from a few batches
+        batch = self.rng.randint(1, min(self.batches, 5))
+        while True:
+            response = self.get('/serial_numbers/report', batch_id=batch_number(batch))
+            if response.status_code != 202:
+                return
+            time.sleep(float(response.headers.get('Retry-After', 2)))
+
+
+def rss_mb():
+    """
+    Current resident memory of this process, from /proc where available.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(clients, mix, warmup, duration):
+    """
+    Runs the clients and returns {action: ([latency seconds], errors)} for
+    the timed period, its length and the peak RSS sampled meanwhile.
+    """
+    actions = list(mix)
+    weights = [mix[action] for action in actions]
+    samples = {action: ([], []) for action in actions}
+    lock = threading.Lock()
+    started = time.monotonic()
+    timed_from = started + warmup
+    stop_at = timed_from + duration
+
+    def client_loop(client):
+        while time.monotonic() < stop_at:
+            action = client.rng.choices(actions, weights)[0]
+            action_started = time.monotonic()
+            error = None
+            try:
+                getattr(client, action)()
+            except Exception as e:
+                error = str(e)
+            if action_started >= timed_from:
+                with lock:
+                    latencies, errors = samples[action]
+                    if error is None:
+                        latencies.append(time.monotonic() - action_started)
+                    else:
+                        errors.append(error)
+
+    threads = [threading.Thread(target=client_loop, args=(client,), daemon=True) for client in clients]
+    for thread in threads:
+        thread.start()
+    peak_rss = rss_mb()
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(0.5)
+        peak_rss = max(peak_rss, rss_mb())
+    return samples, duration, peak_rss
+
+
+def latency_stats(latencies, errors, duration):
+    latencies = sorted(latencies)
+    stats = {
+        "count": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput": len(latencies) / duration,
+    }
+    for name, fraction in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+        stats[name] = latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000 if latencies else None
+    return stats
+
+
+def summarize(samples, duration):
+    operations = {action: latency_stats(latencies, errors, duration)
+                  for action, (latencies, errors) in samples.items()}
+    operations["total"] = latency_stats(
+        [latency for latencies, _ in samples.values() for latency in latencies],
+        [error for _, errors in samples.values() for error in errors], duration
+    )
+    return operations
+
+
+def _ms(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def print_results(results):
+    print(f"\n{'action':<16} {'count':>7} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for action, stats in results["operations"].items():
+        print(f"{action:<16} {stats['count']:>7} {stats['errors']:>6} {stats['throughput']:>8.2f} "
+              f"{_ms(stats['p50_ms']):>9} {_ms(stats['p95_ms']):>9} {_ms(stats['p99_ms']):>9}")
+        if stats['first_error']:
+            print(f"{'':<16} first error: {stats['first_error']}")
+    memory = results["memory"]
+    if memory:
+        print(f"\nServer process RSS: {memory['rss_start_mb']:.0f} MB at start, {memory['rss_peak_mb']:.0f} MB peak")
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints the change of each action against the baseline and returns the
+    regressions found.
+    """
+    regressions = []
+    print(f"\nAgainst baseline ({baseline.get('recorded_at', 'unknown date')}), tolerance {tolerance:.0%}:")
+    print(f"{'action':<16} {'req/s':>16} {'p95 ms':>20}")
+    for action, stats in results["operations"].items():
+        before = baseline["operations"].get(action)
+        if not before or not before["count"] or not stats["count"]:
+            continue
+        throughput_change = stats["throughput"] / before["throughput"] - 1 if before["throughput"] else 0
+        p95_change = stats["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0
+        flags = []
+        if throughput_change < -tolerance:
+            flags.append("throughput")
+        if p95_change > tolerance:
+            flags.append("p95")
+        if flags:
+            regressions.append((action, flags))
+        print(f"{action:<16} {stats['throughput']:>7.2f} ({throughput_change:+6.1%}) "
+              f"{_ms(stats['p95_ms']):>9} ({p95_change:+6.1%})  {'REGRESSION ' + ', '.join(flags) if flags else ''}")
+
+    memory, before = results["memory"], baseline.get("memory")
+    if memory and before:
+        change = memory["rss_peak_mb"] / before["rss_peak_mb"] - 1
+        print(f"{'peak RSS MB':<16} {memory['rss_peak_mb']:>7.0f} ({change:+6.1%})"
+              f"{'  REGRESSION' if change > tolerance else ''}")
+        if change > tolerance:
+            regressions.append(("memory", ["rss_peak_mb"]))
+    return regressions
+
+
+def start_server(args):
+    """
+    Creates the app against the load-test database, installs the fake
+    Vision client and serves it on a local port. Returns the base URL.
+    """
+    os.environ['SQLALCHEMY_DATABASE_URI'] = args.database_uri
+    os.environ['OCR_ENGINE'] = 'google'
+    os.environ.setdefault('REPORT_CACHE_DIR', tempfile.mkdtemp(prefix='loadtest-reports-'))
+    os.environ.setdefault('METRICS_PATH', tempfile.mktemp(prefix='loadtest-metrics-', suffix='.sqlite'))
+    os.environ.setdefault('SLOW_REQUEST_SECONDS', '3600')
+    from werkzeug.serving import make_server
+    from api import create_app
+    from benchmarks.fake_vision import FakeVisionClient, install
+
+    app = create_app()
+    install(app, FakeVisionClient(args.vision_latency, args.vision_jitter))
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    args = parse_args()
+    mix = parse_mix(args.mix)
+    if args.url and not args.database_uri:
+        raise SystemExit("--url needs --database-uri with the batch and serial volumes it was seeded with")
+
+    temporary_database = None
+    if not args.database_uri:
+        temporary_database = tempfile.mktemp(prefix='loadtest-', suffix='.sqlite')
+        args.database_uri = f"sqlite:///{temporary_database}"
+        args.seed = True
+    if args.seed:
+        print(f"Seeding {args.batches} batches and {args.serials} serials")
+        seed(args.database_uri, args.batches, args.serials)
+    per_batch = max(1, args.serials // args.batches)
+
+    try:
+        base_url = args.url or start_server(args)
+        rss_start = rss_mb()
+        photo = label_photo()
+        clients = [Client(number, base_url, args.batches, per_batch, photo, random.Random(args.random_seed + number))
+                   for number in range(args.clients)]
+        print(f"Running {args.clients} clients for {args.warmup:.0f} s warm-up + {args.duration:.0f} s against {base_url}")
+        samples, duration, rss_peak = run(clients, mix, args.warmup, args.duration)
+    finally:
+        if temporary_database:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(temporary_database + suffix):
+                    os.remove(temporary_database + suffix)
+
+    results = {
+        "recorded_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "host": {"cpus": os.cpu_count(), "python": platform.python_version(), "system": platform.system()},
+        "config": {
+            "clients": args.clients, "duration": args.duration, "mix": mix, "batches": args.batches,
+            "serials": args.serials, "vision_latency": args.vision_latency, "url": args.url,
+            "database": args.database_uri.split(':', 1)[0],
+        },
+        "operations": summarize(samples, duration),
+        # Only meaningful when the app runs in this process
+        "memory": None if args.url else {"rss_start_mb": rss_start, "rss_peak_mb": rss_peak},
+    }
+    print_results(results)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["config"] != results["config"]:
+            print("\nNote: the baseline was recorded with a different configuration:", baseline["config"])
+        if baseline.get("host") != results["host"]:
+            print("\nNote: the baseline was recorded on a different host:", baseline.get("host"))
+        regressions = compare(results, baseline, args.tolerance)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"\nSaved the baseline to {args.baseline}")
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    if regressions:
+        raise SystemExit(f"{len(regressions)} regression(s) against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Seeds a database with batches and serial number records for benchmarks
+and load tests.
+
+Each batch LT00001, LT00002, ... gets an equal share of the serials, numbered
+consecutively (CV0000100001, CV0000100002, ... for batch 1), with a mix of
+recorded, verified, testing-selected and voided records. Tables and
+migrations are created through create_app, so this works on a fresh SQLite
+file or an empty Postgres database. The records are inserted around the API,
+so the batches' progress counters are recounted at the end.
+
+Usage (from backend/):
+    python -m benchmarks.seed_database --database-uri sqlite:////tmp/load.sqlite
+    python -m benchmarks.seed_database --database-uri postgresql://... --batches 1000 --serials 5000000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+PART_NUMBER = 'CV-1025'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri', required=True, help='SQLALCHEMY_DATABASE_URI to seed')
+    parser.add_argument('--batches', type=int, default=100, help='batches to create')
+    parser.add_argument('--serials', type=int, default=50000, help='serial number records, spread over the batches')
+    parser.add_argument('--chunk', type=int, default=10000, help='rows per INSERT and commit')
+    return parser.parse_args()
+
+
+def batch_number(batch):
+    return f"LT{batch:05d}"
+
+
+def serial_number(batch, item):
+    return f"CV{batch:05d}{item:05d}"
+
+
+def seed(database_uri, batches, serials, chunk=10000, log=print):
+    """
+    Seeds database_uri, which should not contain batches named LT*. Returns
+    the number of serials per batch.
+    """
+    os.environ['SQLALCHEMY_DATABASE_URI'] = database_uri
+    from sqlalchemy import insert
+    from api import create_app
+    from api.extensions import db
+    from api.models import BatchInfo, SerialNumberRecord
+    from api.batch_counters import recount
+
+    per_batch = max(1, serials // batches)
+    rng = random.Random(42)
+    epoch = datetime(2024, 1, 1)
+    started = time.perf_counter()
+
+    app = create_app()
+    with app.app_context():
+        db.session.execute(insert(BatchInfo.__table__), [{
+            "batch_number": batch_number(batch), "number_of_items": per_batch, "part_number": PART_NUMBER,
+            "batch_type": "Production", "last_scanned_item": serial_number(batch, per_batch),
+            "current_item_number": per_batch,
+        } for batch in range(1, batches + 1)])
+        db.session.commit()
+        batch_ids = dict(db.session.execute(db.select(BatchInfo.batch_number, BatchInfo.id)).all())
+
+        rows = []
+        written = 0
+        for batch in range(1, batches + 1):
+            for item in range(1, per_batch + 1):
+                serial = serial_number(batch, item)
+                rows.append({
+                    "ocr_detected_text": f"S/N {serial}", "serial_number_extracted": serial,
+                    "verified_sn": serial, "ocr_timestamp": epoch + timedelta(seconds=written + len(rows)),
+                    "uploaded_by": f"operator{rng.randint(1, 20)}", "ocr_status": "confirmed",
+                    "is_verified": rng.random() < 0.5, "batch_id": batch_number(batch),
+                    "batch_quantity": per_batch, "batch_item_no": item, "part_id": PART_NUMBER,
+                    "batch_type": "Production", "batch_info_id": batch_ids[batch_number(batch)],
+                    "testing_selected": rng.random() < 0.05, "recorded_sn": rng.random() < 0.7,
+                    "voided": rng.random() < 0.01, "is_deleted": False, "sn_status_id": "NewScan",
+                })
+                if len(rows) == chunk:
+                    db.session.execute(insert(SerialNumberRecord.__table__), rows)
+                    db.session.commit()
+                    written += len(rows)
+                    rows = []
+                    if written % (chunk * 50) == 0:
+                        log(f"  {written} serials, {written / (time.perf_counter() - started):.0f} rows/s")
+        if rows:
+            db.session.execute(insert(SerialNumberRecord.__table__), rows)
+            db.session.commit()
+            written += len(rows)
+        recount(db.session, list(batch_ids.values()))
+        db.session.commit()
+    log(f"Seeded {batches} batches and {written} serials in {time.perf_counter() - started:.1f} s")
+    return per_batch
+
+
+def main():
+    args = parse_args()
+    seed(args.database_uri, args.batches, args.serials, args.chunk)
+
+
+if __name__ == '__main__':
+    main()
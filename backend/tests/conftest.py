@@ -0,0 +1,23 @@
+import pytest
+
+from api import create_app
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """
+    An app with every feature on, backed by files in tmp_path.
+    """
+    monkeypatch.setenv('SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'db.sqlite'}")
+    monkeypatch.setenv('METRICS_PATH', str(tmp_path / 'metrics.sqlite'))
+    monkeypatch.setenv('REPORT_CACHE_DIR', str(tmp_path / 'reports'))
+    monkeypatch.setenv('FEATURES', 'ocr,reports,exports')
+    monkeypatch.setenv('OCR_ENGINE', 'google')
+    monkeypatch.setenv('OCR_CACHE_SIZE', '0')
+    monkeypatch.delenv('OCR_CACHE_PATH', raising=False)
+    return create_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
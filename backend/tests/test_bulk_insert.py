@@ -0,0 +1,30 @@
+def record(serial, **values):
+    return {"ocr_detected_text": "Bulk Added", "verified_sn": serial, "part_id": "P1", **values}
+
+
+def test_invalid_and_repeated_records_are_reported(client):
+    response = client.post('/serial_numbers/bulk', json=[
+        record("S1"),
+        record("S2", batch_quantity="many"),
+        record("S1"),
+        record("S3", is_verified=True, sn_status_id="Complete"),
+    ])
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert body['created'] == 2
+    assert body['errors'] == {
+        "1": {"batch_quantity": ["Not a valid integer."]},
+        "2": {"verified_sn": ["Duplicate of item 0."]},
+    }
+
+
+def test_missing_fields_get_the_schema_defaults(client):
+    response = client.post('/serial_numbers/bulk', json=[record("S1")])
+    assert response.status_code == 201
+
+    row = client.get('/serial_numbers/query_v2', query_string={"verified_sn": "S1"}).get_json()['data'][0]
+    assert row['sn_status_id'] == "NewScan"
+    assert row['ocr_status'] == "pending"
+    assert row['is_verified'] is False
+    assert row['ocr_timestamp'] is not None
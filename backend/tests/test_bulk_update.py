@@ -0,0 +1,50 @@
+def seed(client, batch_id, count):
+    rows = [
+        {"ocr_detected_text": "Bulk Added", "verified_sn": f"{batch_id}-{number:05d}", "part_id": "P1",
+         "sn_status_id": "NewScan", "batch_id": batch_id}
+        for number in range(count)
+    ]
+    response = client.post('/serial_numbers/bulk', json=rows)
+    assert response.status_code == 201, response.get_json()
+
+
+def verified(client, batch_id):
+    response = client.get('/serial_numbers/query_v2', query_string={"batch_id": batch_id, "is_verified": "true", "per_page": 1})
+    return [row for row in response.get_json()['data'] if row['batch_id'] == batch_id]
+
+
+def test_filter_matches_batch_exactly(client):
+    seed(client, 'B1', 3)
+    seed(client, 'B10', 5)
+
+    response = client.patch('/serial_numbers', json={"filter": {"batch_id": "B1"}, "updates": {"is_verified": True}})
+
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == 3
+    assert verified(client, 'B10') == []
+
+
+def test_filter_must_be_an_object(client):
+    response = client.patch('/serial_numbers', json={"filter": ["B1"], "updates": {"is_verified": True}})
+
+    assert response.status_code == 400
+
+
+def test_ids_are_updated_in_chunks(app, client):
+    seed(client, 'B2', 5)
+    app.config['BULK_CHUNK_SIZE'] = 2
+
+    response = client.patch('/serial_numbers', json={"ids": [1, 2, 3, 4, 5, 99], "updates": {"is_verified": True}})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['updated'] == 5
+    assert body['failures'] == {"99": "Record not found"}
+
+
+def test_bool_ids_are_rejected(client):
+    seed(client, 'B3', 1)
+
+    response = client.patch('/serial_numbers', json={"ids": [True], "updates": {"is_verified": True}})
+
+    assert response.status_code == 400
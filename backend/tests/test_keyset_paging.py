@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import update
+
+from api.extensions import db
+from api.models import SerialNumberRecord
+
+
+def seed(app, client, flags):
+    rows = [
+        {"ocr_detected_text": "Bulk Added", "verified_sn": f"K{number:05d}", "part_id": "P1",
+         "sn_status_id": "NewScan", "testing_passed": bool(flag)}
+        for number, flag in enumerate(flags)
+    ]
+    response = client.post('/serial_numbers/bulk', json=rows)
+    assert response.status_code == 201, response.get_json()
+    # The API does not accept null flags, but older records have them
+    with app.app_context():
+        unset = [row["verified_sn"] for row, flag in zip(rows, flags) if flag is None]
+        db.session.execute(update(SerialNumberRecord)
+                           .where(SerialNumberRecord.verified_sn.in_(unset))
+                           .values(testing_passed=None))
+        db.session.commit()
+
+
+def all_pages(client, **params):
+    pages = []
+    cursor = ''
+    while cursor is not None:
+        response = client.get('/serial_numbers/query_v2', query_string={**params, "cursor": cursor, "per_page": 2})
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        pages.append([row['verified_sn'] for row in body['data']])
+        cursor = body['next_cursor']
+    return pages
+
+
+@pytest.mark.parametrize('sort_order', ['asc', 'desc'])
+def test_pages_over_boolean_sort(app, client, sort_order):
+    flags = [True, False, None, True, False, None, True]
+    seed(app, client, flags)
+
+    pages = all_pages(client, sort_by='testing_passed', sort_order=sort_order)
+
+    seen = [serial for page in pages for serial in page]
+    assert sorted(seen) == [f"K{number:05d}" for number in range(len(flags))]
+    assert len(pages) == 4
+    # Nulls come last in either direction
+    order = [False, True] if sort_order == 'asc' else [True, False]
+    expected = sorted(flags, key=lambda flag: 2 if flag is None else order.index(flag))
+    assert [flags[int(serial[1:])] for serial in seen] == expected
@@ -0,0 +1,27 @@
+import io
+
+import pytest
+
+pytest.importorskip('reportlab')
+
+from api.label_report import write_label_zpl
+
+
+def zpl(app, serials):
+    output = io.BytesIO()
+    with app.app_context():
+        write_label_zpl(serials, output, "Labels")
+    return output.getvalue().decode('utf-8')
+
+
+def test_non_ascii_serial(app):
+    label = zpl(app, ["ÄÖ-é"])
+
+    assert label.startswith("^XA^CI28")
+    assert "^FH^FDÄÖ-é^FS" in label
+
+
+def test_commands_and_control_characters_are_escaped(app):
+    label = zpl(app, ["A^B~C_D\tE\x85"])
+
+    assert "^FDA_5EB_7EC_5FD_09E_C2_85^FS" in label
@@ -0,0 +1,143 @@
+import io
+import time
+from types import SimpleNamespace
+
+import pytest
+
+vision = pytest.importorskip('google.cloud.vision')
+cv2 = pytest.importorskip('cv2')
+np = pytest.importorskip('numpy')
+
+from api.ocr_routes import MAX_BATCH_FILES
+
+
+class FakeVisionClient:
+    """
+    Stands in for ImageAnnotatorClient. Answers each image with the text
+    registered for its bytes, or with an error for the bytes in errors.
+    """
+
+    def __init__(self, texts, errors=()):
+        self.texts = texts
+        self.errors = set(errors)
+        self.batch_sizes = []
+
+    def batch_annotate_images(self, requests):
+        self.batch_sizes.append(len(requests))
+        return SimpleNamespace(responses=[self._response(request.image.content) for request in requests])
+
+    def _response(self, content):
+        if content in self.errors:
+            return SimpleNamespace(error=SimpleNamespace(message='Bad image data'))
+        text = self.texts[content]
+        return SimpleNamespace(
+            error=SimpleNamespace(message=''),
+            text_annotations=[SimpleNamespace(description=text, locale='en')],
+            full_text_annotation=SimpleNamespace(pages=[SimpleNamespace(blocks=[SimpleNamespace(confidence=0.95)])]),
+        )
+
+
+def png(number):
+    """
+    A small PNG whose bytes differ for every number.
+    """
+    image = np.full((40, 120), 255, dtype=np.uint8)
+    image[0, :4] = [(number >> shift) & 0xff for shift in (0, 8, 16, 24)]
+    return cv2.imencode('.png', image)[1].tobytes()
+
+
+def serial(number):
+    return f"CV{number:07d}"
+
+
+def install(app, client):
+    app.extensions['ocr_engine']._client = client
+
+
+def finished_job(client, response, timeout=30):
+    assert response.status_code == 202
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(response.get_json()['status_url'], query_string={'wait': 1}).get_json()
+        if job['status'] in ('done', 'failed'):
+            return job
+    raise AssertionError("OCR job did not finish")
+
+
+@pytest.fixture
+def images():
+    return [png(number) for number in range(40)]
+
+
+@pytest.fixture
+def fake(app, images):
+    fake = FakeVisionClient({content: f"S/N {serial(number)}" for number, content in enumerate(images)})
+    install(app, fake)
+    return fake
+
+
+@pytest.fixture
+def app(app):
+    # Hand the uploads to the engine unchanged, so the fake can tell them apart
+    app.config['OCR_EQUALIZE'] = False
+    return app
+
+
+def test_detect_text_batch_chunks_requests(app, images, fake):
+    engine = app.extensions['ocr_engine']
+
+    results = engine.detect_text_batch([None] * len(images), images)
+
+    assert fake.batch_sizes == [16, 16, 8]
+    assert [result.text for result in results] == [f"S/N {serial(number)}" for number in range(40)]
+
+
+def test_detect_text_batch_returns_errors_in_place(app, images, fake):
+    fake.errors.add(images[5])
+    engine = app.extensions['ocr_engine']
+
+    results = engine.detect_text_batch([None] * len(images), images)
+
+    assert isinstance(results[5], RuntimeError)
+    assert str(results[5]) == 'Bad image data'
+    assert [result.text for index, result in enumerate(results) if index != 5] == \
+        [f"S/N {serial(number)}" for number in range(40) if number != 5]
+
+
+def test_upload_batch_keeps_input_order(client, images, fake):
+    files = [(io.BytesIO(content), f"label{number}.png") for number, content in enumerate(images)]
+
+    job = finished_job(client, client.post('/upload/batch', data={'files': files}))
+
+    assert job['status'] == 'done'
+    assert fake.batch_sizes == [16, 16, 8]
+    assert [result['image_file_name'] for result in job['result']] == [f"label{number}.png" for number in range(40)]
+    assert [result['serial_number_extracted'] for result in job['result']] == [serial(number) for number in range(40)]
+
+
+def test_upload_batch_reports_bad_files_per_file(client, images, fake):
+    fake.errors.add(images[20])
+    files = [(io.BytesIO(content), f"label{number}.png") for number, content in enumerate(images[:30])]
+    files.insert(3, (io.BytesIO(b'not an image'), 'broken.png'))
+
+    job = finished_job(client, client.post('/upload/batch', data={'files': files}))
+
+    assert job['status'] == 'done'
+    results = job['result']
+    assert len(results) == 31
+    assert results[3]['image_file_name'] == 'broken.png' and 'error' in results[3]
+    assert results[21] == {"image_file_name": 'label20.png', "error": 'Bad image data'}
+    # The unreadable file never reaches Vision
+    assert fake.batch_sizes == [16, 14]
+    good = [result for index, result in enumerate(results) if index not in (3, 21)]
+    assert [result['serial_number_extracted'] for result in good] == [serial(number) for number in range(30) if number != 20]
+
+
+def test_upload_batch_rejects_too_many_files(client, fake):
+    files = [(io.BytesIO(png(number)), f"label{number}.png") for number in range(MAX_BATCH_FILES + 1)]
+
+    response = client.post('/upload/batch', data={'files': files})
+
+    assert response.status_code == 400
+    assert str(MAX_BATCH_FILES) in response.get_json()['error']
+    assert fake.batch_sizes == []
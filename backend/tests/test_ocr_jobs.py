@@ -0,0 +1,27 @@
+from sqlalchemy.exc import OperationalError
+
+from api.ocr_jobs import OcrJobQueue
+
+
+def test_worker_survives_a_database_error(app):
+    jobs = OcrJobQueue()
+    jobs.workers = 1
+    update = jobs._update
+    calls = []
+
+    def flaky_update(job_id, **values):
+        calls.append(job_id)
+        if len(calls) == 1:
+            raise OperationalError("UPDATE ocr_job", {}, Exception("database is locked"))
+        update(job_id, **values)
+
+    jobs._update = flaky_update
+    with app.app_context():
+        lost = jobs.submit(lambda: {"serial": "A1"})
+        job = jobs.submit(lambda: {"serial": "A2"})
+        job = jobs.get(job.id, wait=10)
+
+        assert job.status == 'done'
+        assert job.result == '{"serial": "A2"}'
+        assert jobs.get(lost.id).status == 'queued'
+        assert jobs.metrics()['failed'] == 1
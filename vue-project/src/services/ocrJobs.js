@@ -0,0 +1,33 @@
+import api from './api';
+
+// Each poll may wait this long on the server; it holds a worker meanwhile
+const POLL_WAIT_SECONDS = 1;
+// Pause between polls, growing from the first to the last value
+const POLL_BACKOFF_MS = [250, 500, 1000, 2000];
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Queue an image for OCR and wait for the result.
+// /upload answers right away with a job id; the result is collected by
+// polling /ocr_jobs/<id> with short waits and a growing pause in between,
+// so no request holds a server worker for the whole OCR run.
+export async function uploadForOcr(formData, timeoutSeconds = 120) {
+  const { data: job } = await api.post('/upload', formData);
+  if (job.status === 'done') {
+    // Answered from the server's OCR cache
+    return job.result;
+  }
+  const deadline = Date.now() + timeoutSeconds * 1000;
+
+  for (let attempt = 0; Date.now() < deadline; attempt++) {
+    const { data } = await api.get(`/ocr_jobs/${job.job_id}`, { params: { wait: POLL_WAIT_SECONDS } });
+    if (data.status === 'done') {
+      return data.result;
+    }
+    if (data.status === 'failed') {
+      throw new Error(data.error || 'OCR failed');
+    }
+    await sleep(POLL_BACKOFF_MS[Math.min(attempt, POLL_BACKOFF_MS.length - 1)]);
+  }
+  throw new Error('Timed out waiting for OCR result');
+}
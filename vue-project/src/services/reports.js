@@ -0,0 +1,23 @@
+import api from './api';
+
+// Download a batch's label report as a Blob.
+// layout and format pick the label layout and output (pdf, zpl or csv);
+// the server's defaults are used when they are left out.
+// The server answers 202 while a large report is still being generated;
+// the same URL is polled until the finished report comes back.
+export async function fetchReport(batchNumber, { layout, format, timeoutSeconds = 300 } = {}) {
+  const deadline = Date.now() + timeoutSeconds * 1000;
+
+  while (Date.now() < deadline) {
+    const response = await api.get('/serial_numbers/report', {
+      params: { batch_id: batchNumber, layout, format },
+      responseType: 'blob',
+    });
+    if (response.status !== 202) {
+      return new Blob([response.data], { type: response.headers['content-type'] || 'application/pdf' });
+    }
+    const retryAfter = Number(response.headers['retry-after']) || 2;
+    await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000));
+  }
+  throw new Error('Timed out waiting for the report');
+}